@@ -0,0 +1,120 @@
+"""
+Fingerprinting benchmark, compares entries/s and number of error groups of the previous grouping key
+(uncompiled re.sub collapsing stack frames + MD5) and of nes.fingerprint on a NES/OpenCart log:
+the key computation alone and the whole parse_log_file.
+
+Usage:
+    python benchmarks/fingerprint.py [--log example/error_log] [--repeat 20]
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+DIR_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIR_ROOT)
+
+import nes.apache_php_log_parser as parser
+import nes.fingerprint as fingerprint
+from nes.fingerprint import Fingerprinter
+
+
+class LegacyFingerprinter(object):
+
+    def fingerprint(self, error_type: str, message_and_trace: str) -> tuple:
+        return legacy_fingerprint(error_type, message_and_trace)
+
+
+def legacy_fingerprint(error_type: str, message_and_trace: str) -> tuple:
+    # Grouping key of parse_log_entry before nes.fingerprint
+    if 'Stack trace:' in message_and_trace:
+        parts = message_and_trace.split('Stack trace:', 1)
+        error_message = parts[0].strip()
+        stack_trace = 'Stack trace:' + parts[1].strip()
+    else:
+        error_message = message_and_trace
+        stack_trace = None
+
+    normalized_trace = re.sub(r'#\d+\s+.*?\(\d+\)', '#N file(line)', stack_trace) if stack_trace else ''
+    unique_key = hashlib.md5(f"{error_type}|{error_message}|{normalized_trace}".encode('utf-8')).hexdigest()
+    return unique_key, error_type, error_message, stack_trace
+
+
+def measure(create_fingerprints: list, entries: list, repeat: int) -> list:
+    """
+    Passes of the key functions alternate, so load of the host affects all of them alike, and CPU time is measured.
+
+    Args:
+        create_fingerprints (list): Functions returning the key function for a pass.
+
+    Returns:
+        list: (entries per second of the best pass, number of distinct keys) of every key function.
+    """
+    best_seconds = [None] * len(create_fingerprints)
+    keys = [set() for _ in create_fingerprints]
+    for _ in range(repeat):
+        for idx, create_fingerprint in enumerate(create_fingerprints):
+            fingerprint = create_fingerprint()
+            keys[idx] = set()
+            started_at = time.process_time()
+            for error_type, message_and_trace in entries:
+                keys[idx].add(fingerprint(error_type, message_and_trace)[0])
+            seconds = time.process_time() - started_at
+            best_seconds[idx] = seconds if best_seconds[idx] is None else min(best_seconds[idx], seconds)
+
+    return [(len(entries) / seconds, len(keys[idx])) for idx, seconds in enumerate(best_seconds)]
+
+
+def measure_parser(log_file: str, entries_count: int, repeat: int) -> tuple:
+    """
+    Returns:
+        tuple: Entries per second of parse_log_file with the legacy key and with nes.fingerprint, passes alternate
+            and every pass starts with a new fingerprinter (empty caches).
+    """
+    best_seconds = [None, None]
+    for _ in range(repeat):
+        for idx, is_legacy in enumerate([True, False]):
+            fingerprint._default_fingerprinter = None
+            parser.get_fingerprinter = (lambda: LegacyFingerprinter()) if is_legacy else fingerprint.get_fingerprinter
+            started_at = time.process_time()
+            parser.parse_log_file(log_file)
+            seconds = time.process_time() - started_at
+            best_seconds[idx] = seconds if best_seconds[idx] is None else min(best_seconds[idx], seconds)
+
+    parser.get_fingerprinter = fingerprint.get_fingerprinter
+    return entries_count / best_seconds[0], entries_count / best_seconds[1]
+
+
+def main():
+    args = argparse.ArgumentParser(description='Compare grouping key computation of NES/OpenCart log entries')
+    args.add_argument('--log', type=str, dest='log_file', default=os.path.join(DIR_ROOT, 'example', 'error_log'), help='NES/OpenCart log file')
+    args.add_argument('--repeat', type=int, dest='repeat', default=20, help='Number of passes over the log entries')
+    args = args.parse_args()
+
+    # Header regex is the same for both, only the key computation is measured
+    entries = []
+    with open(args.log_file, encoding='utf-8') as f:
+        for entry_text in parser.iter_log_entries(f):
+            match = parser.LOG_ENTRY_REGEX.match(entry_text)
+            if match:
+                entries.append((match.group(2).strip(), match.group(3).strip()))
+
+    # A new fingerprinter fills its caches during the pass, it is the cost of a single run over the log
+    warm_fingerprinter = Fingerprinter()
+    (legacy_rate, legacy_groups), (rate, groups), (warm_rate, _) = measure(
+        [lambda: legacy_fingerprint, lambda: Fingerprinter().fingerprint, lambda: warm_fingerprinter.fingerprint], entries, args.repeat)
+
+    print(f"{len(entries)} entries of {args.log_file}, best of {args.repeat} passes")
+    print(f"legacy re.sub + md5:      {legacy_rate:12.0f} entries/s, {legacy_groups} groups")
+    print(f"fingerprint:              {rate:12.0f} entries/s, {groups} groups ({rate / legacy_rate:.2f}x)")
+    print(f"fingerprint, warm cache:  {warm_rate:12.0f} entries/s ({warm_rate / legacy_rate:.1f}x)")
+
+    legacy_parser_rate, parser_rate = measure_parser(args.log_file, len(entries), args.repeat)
+    print(f"parse_log_file, legacy:   {legacy_parser_rate:12.0f} entries/s")
+    print(f"parse_log_file:           {parser_rate:12.0f} entries/s ({parser_rate / legacy_parser_rate:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Synthetic log generator for benchmarks: NES/OpenCart (PHP) error logs and generic application logs
+of the given size and duplication ratio.
+
+Duplication ratio is the share of errors that repeat one of a small pool of known errors, the rest are
+distinct errors (new classes and functions), so 0.99 is a typical production log and 0 is the worst case
+of the grouping. NES errors of the pool occur in several stores with different paths and IDs, so they are
+grouped only by path and ID normalization.
+
+Usage:
+    python benchmarks/generate_logs.py --format nes --size 100M --duplication 0.95 --output /tmp/error_log
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+# Entries are written in blocks to keep the generator fast for 10G logs
+WRITE_BLOCK_SIZE = 4 * 1024 * 1024
+
+NES_ERROR_TYPES = ['PHP Fatal error', 'PHP Warning', 'PHP Warning', 'PHP Notice', 'PHP Notice', 'PHP Notice', 'PHP Deprecated']
+
+NES_MESSAGES = [
+    'Uncaught TypeError: flock(): Argument #1 ($stream) must be of type resource, bool given in {path}/system/library/Cache/File.php:57',
+    'Uncaught Exception: Error: Could not load model {name}! in {path}/system/engine/loader.php:{line}',
+    'Undefined array key "{name}" in {path}/catalog/controller/product/{name}.php on line {line}',
+    'Trying to access array offset on value of type null in {path}/catalog/model/catalog/product.php on line {line}',
+    'unlink({path}/storage/cache/cache.product.{id}): No such file or directory in {path}/system/library/Cache/File.php on line 21',
+    'Allowed memory size of 268435456 bytes exhausted (tried to allocate {id} bytes) in {path}/system/library/db/mysqli.php on line {line}',
+    'Creation of dynamic property Controller{Name}::$registry is deprecated in {path}/system/engine/controller.php on line {line}',
+]
+
+GENERIC_LEVELS = ['INFO', 'INFO', 'INFO', 'INFO', 'DEBUG', 'WARNING', 'ERROR', 'ERROR', 'CRITICAL']
+
+GENERIC_MESSAGES = [
+    'DatabaseConnectionError: Failed to connect to database \'{name}_db\' at 10.0.{line}.5:5432. Reason: Connection refused.',
+    'ApplicationError: Could not retrieve {name} data due to database connection failure. User ID: {id}',
+    'TimeoutError: Request to /api/{name}/{id} took longer than 30000 ms',
+    'OutOfMemoryError: Java heap space in {Name}Service',
+    'Low disk space detected on /var/log. Current free space: {line}%',
+]
+
+NAME_SYLLABLES = ['cart', 'order', 'product', 'customer', 'coupon', 'review', 'stock', 'price', 'tax', 'seo', 'blog', 'menu', 'feed', 'sync', 'export']
+
+
+def parse_size(size: str) -> int:
+    """
+    Converts "500K", "100M", "10G" or a number of bytes to bytes.
+    """
+    size = size.strip().upper()
+    multipliers = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if size and size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def get_random_name(rnd: random.Random) -> str:
+    return '_'.join(rnd.choice(NAME_SYLLABLES) for _ in range(rnd.randint(2, 4))) + str(rnd.randint(1, 999))
+
+
+class NesErrorFactory(object):
+    """
+    Creates entries of NES/OpenCart error log: a pool of known errors with stack traces and distinct errors.
+    """
+
+    def __init__(self, rnd: random.Random, pool_size: int = 50, stores_count: int = 40):
+        self.rnd = rnd
+        self.stores = [f"/home/store{idx}/public_html" for idx in range(stores_count)]
+        self.pool = [self.create_error(get_random_name(rnd)) for _ in range(pool_size)]
+
+    def create_error(self, name: str) -> tuple:
+        error_type = self.rnd.choice(NES_ERROR_TYPES)
+        message = self.rnd.choice(NES_MESSAGES)
+        frames = []
+        if error_type == 'PHP Fatal error':
+            for idx in range(self.rnd.randint(3, 25)):
+                file_name = self.rnd.choice(['system/library/Action.php', 'system/library/Loader.php', f"catalog/controller/{name}.php", 'system/library/Proxy.php'])
+                frames.append((file_name, self.rnd.randint(10, 400), f"Controller{name.title().replace('_', '')}->{self.rnd.choice(NAME_SYLLABLES)}{idx}()"))
+        return error_type, message, name, self.rnd.randint(10, 900), frames
+
+    def format_entry(self, timestamp: str, error: tuple) -> str:
+        error_type, message, name, line, frames = error
+        path = self.rnd.choice(self.stores)
+        text = f"[{timestamp}] {error_type}:  " + message.format(path=path, name=name, Name=name.title().replace('_', ''), line=line, id=self.rnd.randint(10 ** 9, 2 * 10 ** 9))
+        if not frames:
+            return text + "\n"
+
+        lines = [text, "Stack trace:"]
+        for idx, (file_name, frame_line, call) in enumerate(frames):
+            lines.append(f"#{idx} {path}/{file_name}({frame_line}): {call}")
+        lines.append(f"#{len(frames)} {{main}}")
+        lines.append(f"  thrown in {path}/system/library/Cache/File.php on line 57")
+        return "\n".join(lines) + "\n"
+
+    def create_entry(self, timestamp: datetime, duplication: float) -> str:
+        error = self.rnd.choice(self.pool) if self.rnd.random() < duplication else self.create_error(get_random_name(self.rnd))
+        return self.format_entry(timestamp.strftime('%d-%b-%Y %H:%M:%S UTC'), error)
+
+
+class GenericLineFactory(object):
+    """
+    Creates lines of a generic application log, only WARNING/ERROR/CRITICAL lines are errors.
+    """
+
+    def __init__(self, rnd: random.Random, pool_size: int = 50):
+        self.rnd = rnd
+        self.pool = [self.create_message() for _ in range(pool_size)]
+
+    def create_message(self) -> str:
+        name = get_random_name(self.rnd)
+        return self.rnd.choice(GENERIC_MESSAGES).format(name=name, Name=name.title().replace('_', ''), line=self.rnd.randint(1, 99), id=self.rnd.randint(1000, 99999))
+
+    def create_entry(self, timestamp: datetime, duplication: float) -> str:
+        level = self.rnd.choice(GENERIC_LEVELS)
+        if level in ('INFO', 'DEBUG'):
+            message = f"User '{get_random_name(self.rnd)}' opened /catalog/{self.rnd.randint(1, 5000)}"
+        else:
+            message = self.rnd.choice(self.pool) if self.rnd.random() < duplication else self.create_message()
+        return f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')}.{self.rnd.randint(0, 999):03d} [{level}] {message}\n"
+
+
+def generate_log(file_path: str, log_format: str, size_bytes: int, duplication: float = 0.95, seed: int = 1) -> int:
+    """
+    Writes a synthetic log of about size_bytes (the last entry is complete).
+
+    Args:
+        file_path (str): Path of the generated log.
+        log_format (str): "nes" (NES/OpenCart PHP error log) or "generic".
+        size_bytes (int): Size of the log.
+        duplication (float): Share of errors that repeat a known error, from 0 to 1.
+        seed (int): Seed of the generator, the same arguments produce the same log.
+
+    Returns:
+        int: Number of generated entries.
+    """
+    rnd = random.Random(seed)
+    factory = NesErrorFactory(rnd) if log_format == 'nes' else GenericLineFactory(rnd)
+    timestamp = datetime(2025, 6, 29, 0, 0, 0)
+
+    entries_count = 0
+    written_bytes = 0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        block = []
+        block_size = 0
+        while written_bytes + block_size < size_bytes:
+            timestamp += timedelta(seconds=rnd.randint(0, 3))
+            entry = factory.create_entry(timestamp, duplication)
+            block.append(entry)
+            block_size += len(entry)
+            entries_count += 1
+            if block_size >= WRITE_BLOCK_SIZE:
+                f.write(''.join(block))
+                written_bytes += block_size
+                block = []
+                block_size = 0
+
+        f.write(''.join(block))
+
+    return entries_count
+
+
+def main():
+    args = argparse.ArgumentParser(description='Generate synthetic NES/OpenCart or generic log for benchmarks')
+    args.add_argument('--format', type=str, dest='log_format', choices=['nes', 'generic'], default='nes', help='Log format')
+    args.add_argument('--size', type=str, dest='size', default='100M', help='Size of the log, e.g. 500K, 100M, 10G')
+    args.add_argument('--duplication', type=float, dest='duplication', default=0.95, help='Share of errors that repeat a known error, from 0 to 1')
+    args.add_argument('--seed', type=int, dest='seed', default=1, help='Seed of the generator')
+    args.add_argument('--output', type=str, dest='output', required=True, help='Path of the generated log')
+    args = args.parse_args()
+
+    entries_count = generate_log(args.output, args.log_format, parse_size(args.size), args.duplication, args.seed)
+    print(f"Generated {entries_count} entries in {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Startup import-time benchmark, guards against heavy modules imported at startup.
+
+Runs "python -X importtime" for main.py --help and for the nes modules main.py always imports,
+prints the slowest imports and fails if a heavy backend is loaded or the startup exceeds the budget.
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 500] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+DIR_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Backends that must be imported only by the run paths that use them
+FORBIDDEN_MODULES = ['langchain_core', 'torch', 'nvidia_smi', 'langchain_openai', 'langchain_ollama', 'fastembed', 'qdrant_client', 'numpy']
+
+STARTUP_MODULES = [
+    'nes.functions',
+    'nes.apache_php_log_parser',
+    'nes.log_ai_processor',
+    'nes.llm_cache',
+    'nes.log_filter',
+    'nes.log_templates',
+    'nes.log_checkpoint',
+]
+
+
+def measure_imports(command: list, env: dict) -> dict:
+    """
+    Runs command with -X importtime.
+
+    Returns:
+        dict: Top-level module name -> cumulative import time in microseconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command, cwd=DIR_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Command {command} failed:\n{result.stderr[-2000:]}")
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time:       self [us] |  cumulative | imported package", nesting is the indentation of the name
+        _, cumulative_us, name = line.split('|', 2)
+        imports[name[1:].rstrip()] = int(cumulative_us)
+
+    return imports
+
+
+def get_total_ms(imports: dict) -> float:
+    # Only not nested imports (without indentation) are summed
+    return sum(cumulative_us for name, cumulative_us in imports.items() if not name.startswith(' ')) / 1000
+
+
+def main() -> int:
+    args = argparse.ArgumentParser()
+    args.add_argument('--budget-ms', type=float, dest='budget_ms', default=500, help='Maximum startup import time of main.py --help in milliseconds')
+    args.add_argument('--top', type=int, dest='top', default=15, help='How many slowest imports to print')
+    args = args.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DIR_ROOT', DIR_ROOT + '/')
+    env['DIR_LOGS'] = tempfile.mkdtemp(prefix='nes-import-time-') + '/'
+
+    checks = [('main.py --help', ['main.py', '--help'])]
+    checks += [(module, ['-c', f'import {module}']) for module in STARTUP_MODULES]
+
+    is_failed = False
+    for title, command in checks:
+        imports = measure_imports(command, env)
+        total_ms = get_total_ms(imports)
+        loaded_forbidden = sorted({name.strip().split('.')[0] for name in imports} & set(FORBIDDEN_MODULES))
+        print(f"{title}: {total_ms:.1f} ms")
+        if loaded_forbidden:
+            is_failed = True
+            print(f"  FAIL heavy modules imported: {', '.join(loaded_forbidden)}")
+
+        if title == 'main.py --help':
+            for name, cumulative_us in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+                print(f"  {cumulative_us / 1000:8.1f} ms {name}")
+            if total_ms > args.budget_ms:
+                is_failed = True
+                print(f"  FAIL startup exceeds the budget of {args.budget_ms:.0f} ms")
+
+    return 1 if is_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
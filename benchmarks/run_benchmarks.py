@@ -0,0 +1,261 @@
+"""
+Benchmark suite of the parser and processor paths on synthetic logs (see generate_logs.py).
+
+Cases, every case runs in its own process, so its peak RSS is measured separately:
+    parse             parse_log_file of NES/OpenCart log
+    parse_streaming   parse_log_file_streaming of NES/OpenCart log
+    detect            simple_error_detector on every line of generic log
+    filter            ErrorLineMatcher.scan_file of generic log
+    processor         LogAiProcessor end-to-end on parsed NES/OpenCart errors with the fake LLM (nes/fake_llm.py)
+
+Results (entries/s, peak RSS, LLM calls/s) are written to a JSON file for regression tracking,
+with --baseline the run fails if throughput of a case dropped by more than --max-regression.
+
+Usage:
+    python benchmarks/run_benchmarks.py --size 100M --duplication 0.95 --latency 0.2 --concurrency 4
+    python benchmarks/run_benchmarks.py --size 1G --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DIR_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIR_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_logs import generate_log, parse_size
+
+CASES = ['parse', 'parse_streaming', 'detect', 'filter', 'processor']
+
+# Log format of every case
+CASE_LOG_FORMATS = {
+    'parse': 'nes',
+    'parse_streaming': 'nes',
+    'detect': 'generic',
+    'filter': 'generic',
+    'processor': 'nes',
+}
+
+
+def get_peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def get_log_path(workdir: str, log_format: str, size_bytes: int, duplication: float, seed: int) -> str:
+    """
+    Generates the log once, logs of the same parameters are reused by the following runs.
+    """
+    file_path = os.path.join(workdir, f"{log_format}-{size_bytes}-{duplication}-{seed}.log")
+    if not os.path.isfile(file_path):
+        print(f"Generating {log_format} log of {size_bytes} bytes in {file_path}")
+        tmp_path = f"{file_path}.tmp"
+        generate_log(tmp_path, log_format, size_bytes, duplication, seed)
+        os.replace(tmp_path, file_path)
+    return file_path
+
+
+def run_parse(log_file: str, is_streaming: bool) -> dict:
+    import nes.apache_php_log_parser as parser
+
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        parsed_data = parser.parse_log_file_streaming(log_file) if is_streaming else parser.parse_log_file(log_file)
+    seconds = time.perf_counter() - started_at
+
+    entries_count = sum(error_group['count'] for error_group in parsed_data.values())
+    return {'seconds': round(seconds, 3), 'entries': entries_count, 'groups': len(parsed_data), 'entries_per_second': round(entries_count / seconds, 1)}
+
+
+def run_detect(log_file: str) -> dict:
+    from nes.functions import simple_error_detector
+
+    lines_count = 0
+    errors_count = 0
+    started_at = time.perf_counter()
+    with open(log_file, encoding='utf-8') as f:
+        for line in f:
+            lines_count += 1
+            if simple_error_detector(line):
+                errors_count += 1
+    seconds = time.perf_counter() - started_at
+    return {'seconds': round(seconds, 3), 'entries': lines_count, 'errors': errors_count, 'entries_per_second': round(lines_count / seconds, 1)}
+
+
+def run_filter(log_file: str) -> dict:
+    from nes.log_filter import ErrorLineMatcher
+
+    matcher = ErrorLineMatcher()
+    errors_count = 0
+    started_at = time.perf_counter()
+    for _ in matcher.scan_file(log_file):
+        errors_count += 1
+    seconds = time.perf_counter() - started_at
+
+    # Lines are counted separately, so counting is not a part of the measured time
+    with open(log_file, 'rb') as f:
+        lines_count = sum(block.count(b'\n') for block in iter(lambda: f.read(1024 * 1024), b''))
+    return {'seconds': round(seconds, 3), 'entries': lines_count, 'errors': errors_count, 'entries_per_second': round(lines_count / seconds, 1)}
+
+
+def run_processor(log_file: str, latency: float, tokens_per_second: float, concurrency: int, max_errors: int, is_streaming: bool) -> dict:
+    import nes.apache_php_log_parser as parser
+    from nes.fake_llm import FakeChatModel
+    from nes.log_ai_processor import LogAiProcessor
+    from nes.scheduler import ErrorScheduler
+
+    os.environ.setdefault('DIR_ROOT', DIR_ROOT + '/')
+    # Prompts are read relative to the project directory
+    os.chdir(DIR_ROOT)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        parsed_data = parser.parse_log_file(log_file)
+    if max_errors > 0:
+        parsed_data = dict(list(ErrorScheduler().order(parsed_data).items())[:max_errors])
+
+    outputs_dir = tempfile.mkdtemp(prefix='nes-benchmark-outputs-')
+    processor_args = argparse.Namespace(is_nes_parsing=True, language='en', parser_workers=1, top=0, top_order='count')
+    llm = FakeChatModel(latency_seconds=latency, tokens_per_second=tokens_per_second)
+    processor = LogAiProcessor(llm, parsed_data, processor_args, outputs_dir, os.path.join(outputs_dir, 'run.json'),
+                               max_concurrency=concurrency, model_name='fake', is_streaming=is_streaming)
+
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        processor.process_opencart_logs()
+        processor.output_sink.close()
+    seconds = time.perf_counter() - started_at
+
+    summary = processor.metrics.get_summary()
+    return {
+        'seconds': round(seconds, 3),
+        'entries': len(parsed_data),
+        'entries_per_second': round(len(parsed_data) / seconds, 2),
+        'calls': summary['calls'],
+        'failed_calls': summary['failed_calls'],
+        'calls_per_second': round(summary['calls'] / seconds, 2),
+        'latency_p50_seconds': summary['latency_seconds']['p50'],
+        'latency_p99_seconds': summary['latency_seconds']['p99'],
+    }
+
+
+def run_case(args) -> dict:
+    if args.case in ('parse', 'parse_streaming'):
+        result = run_parse(args.log_file, args.case == 'parse_streaming')
+    elif args.case == 'detect':
+        result = run_detect(args.log_file)
+    elif args.case == 'filter':
+        result = run_filter(args.log_file)
+    else:
+        result = run_processor(args.log_file, args.latency, args.tokens_per_second, args.concurrency, args.max_errors, args.is_streaming)
+
+    result['peak_rss_mb'] = get_peak_rss_mb()
+    return result
+
+
+def run_case_process(case: str, log_file: str, args) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), '--run-case', case, '--log', log_file,
+               '--latency', str(args.latency), '--tokens-per-second', str(args.tokens_per_second),
+               '--concurrency', str(args.concurrency), '--max-errors', str(args.max_errors)]
+    if args.is_streaming:
+        command.append('--stream-tokens')
+
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Benchmark {case} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare_with_baseline(results: dict, baseline_path: str, max_regression: float) -> list:
+    """
+    Returns descriptions of cases which throughput dropped by more than max_regression (0.2 is 20%).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for case, result in results['cases'].items():
+        baseline_result = baseline.get('cases', {}).get(case)
+        if not baseline_result or not baseline_result.get('entries_per_second'):
+            continue
+
+        ratio = result['entries_per_second'] / baseline_result['entries_per_second']
+        print(f"  {case}: {ratio:.2f}x of baseline, peak RSS {result['peak_rss_mb']} MB (baseline {baseline_result['peak_rss_mb']} MB)")
+        if ratio < 1 - max_regression:
+            regressions.append(f"{case} {ratio:.2f}x")
+
+    return regressions
+
+
+def main() -> int:
+    args = argparse.ArgumentParser(description='Benchmarks of NES log parser and processor on synthetic logs')
+    args.add_argument('--size', type=str, dest='size', default='100M', help='Size of generated logs, e.g. 100M, 1G, 10G')
+    args.add_argument('--duplication', type=float, dest='duplication', default=0.95, help='Share of errors that repeat a known error, from 0 to 1')
+    args.add_argument('--seed', type=int, dest='seed', default=1, help='Seed of the log generator')
+    args.add_argument('--cases', type=str, dest='cases', default=','.join(CASES), help=f"Comma-separated cases: {', '.join(CASES)}")
+    args.add_argument('--latency', type=float, dest='latency', default=0.2, help='Time to the first token of the fake LLM in seconds')
+    args.add_argument('--tokens-per-second', type=float, dest='tokens_per_second', default=0, help='Generation speed of the fake LLM, 0 means instant')
+    args.add_argument('--concurrency', type=int, dest='concurrency', default=4, help='Parallel LLM requests of the processor case')
+    args.add_argument('--max-errors', type=int, dest='max_errors', default=200, help='Errors sent to the fake LLM by the processor case, 0 means all')
+    args.add_argument('--stream-tokens', dest='is_streaming', action='store_true', help='Stream fake LLM answers in the processor case')
+    args.add_argument('--workdir', type=str, dest='workdir', default=os.path.join(tempfile.gettempdir(), 'nes-benchmarks'), help='Directory of generated logs, reused by the following runs')
+    args.add_argument('--output', type=str, dest='output', default=os.path.join(DIR_ROOT, 'benchmarks', 'results', 'latest.json'), help='JSON file with results')
+    args.add_argument('--baseline', type=str, dest='baseline', default='', help='Results of a previous run to compare with')
+    args.add_argument('--max-regression', type=float, dest='max_regression', default=0.2, help='Allowed drop of entries/s compared with the baseline')
+    args.add_argument('--run-case', type=str, dest='case', default='', help=argparse.SUPPRESS)
+    args.add_argument('--log', type=str, dest='log_file', default='', help=argparse.SUPPRESS)
+    args = args.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args)))
+        return 0
+
+    cases = [case.strip() for case in args.cases.split(',') if case.strip()]
+    unknown_cases = set(cases) - set(CASES)
+    if unknown_cases:
+        raise Exception(f"Unknown benchmark cases {', '.join(sorted(unknown_cases))}, available: {', '.join(CASES)}")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    size_bytes = parse_size(args.size)
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {'size_bytes': size_bytes, 'duplication': args.duplication, 'seed': args.seed, 'latency': args.latency,
+                   'tokens_per_second': args.tokens_per_second, 'concurrency': args.concurrency, 'max_errors': args.max_errors,
+                   'is_streaming': args.is_streaming},
+        'cases': {},
+    }
+
+    for case in cases:
+        log_file = get_log_path(args.workdir, CASE_LOG_FORMATS[case], size_bytes, args.duplication, args.seed)
+        result = run_case_process(case, log_file, args)
+        results['cases'][case] = result
+        calls = f", {result['calls_per_second']} calls/s" if 'calls_per_second' in result else ''
+        print(f"{case}: {result['entries_per_second']} entries/s{calls}, {result['seconds']}s, peak RSS {result['peak_rss_mb']} MB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print(f"FAIL throughput regression: {', '.join(regressions)}")
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import argparse
+import os
+from nes.output_sink import iter_outputs, read_output, save_output_files
+
+args = argparse.ArgumentParser(description='Export AI analyses of outputs.jsonl, outputs.jsonl.zst or outputs.sqlite to <key>.json and <key>.txt files')
+args.add_argument('--input', type=str, dest='input_file', required=True, help='Path to outputs.jsonl, outputs.jsonl.zst or outputs.sqlite of the run')
+args.add_argument('--output-dir', type=str, dest='output_dir', default='', required=False, help='Directory for exported files, the directory of the input file by default')
+args.add_argument('--key', type=str, dest='keys', action='append', default=[], required=False, help='Export only this error key, can be repeated')
+args = args.parse_args()
+
+if not os.path.isfile(args.input_file):
+    raise FileNotFoundError(f"Provided outputs file {args.input_file} not found")
+
+output_dir = args.output_dir or os.path.dirname(os.path.abspath(args.input_file))
+os.makedirs(output_dir, exist_ok=True)
+
+exported_count = 0
+if args.keys:
+    for output_key in args.keys:
+        response_dict = read_output(args.input_file, output_key)
+        if response_dict is None:
+            print(f"Error key {output_key} not found")
+            continue
+        save_output_files(output_dir, output_key, response_dict)
+        exported_count += 1
+else:
+    for output_key, response_dict in iter_outputs(args.input_file):
+        save_output_files(output_dir, output_key, response_dict)
+        exported_count += 1
+
+print(f"Exported {exported_count} analyses to {output_dir}")
@@ -3,13 +3,25 @@ import argparse
 import os
 import logging
 import dotenv
-from langchain_core.prompts import PromptTemplate
-from tqdm import tqdm
-from nes.apache_php_log_parser import format_error_item_to_str, save_json_file
-from nes.langchain_helpers import ollama_response_to_dict
-from nes.functions import init_llm, torch_info, simple_error_detector
+from nes.functions import init_llm_backend, get_configured_llm_model, calibrate_ollama, LLM_BACKENDS
 import nes.apache_php_log_parser as parser
 from nes.log_ai_processor import LogAiProcessor
+from nes.llm_cache import LlmResponseCache
+from nes.token_counter import TokenCounter
+from nes.prompt_compactor import PromptCompactor, DEFAULT_VENDOR_FRAMES_REGEX
+from nes.log_filter import ErrorLineMatcher
+from nes.log_templates import LogTemplateMiner
+from nes.metrics import LlmMetrics
+from nes.output_sink import OUTPUT_SINK_TYPES, create_output_sink
+from nes.scheduler import ErrorScheduler, RunBudget
+from nes.report import HISTOGRAM_BUCKETS, REPORT_FORMATS, TOP_ORDERS
+from nes.log_sources import resolve_log_paths, get_log_source_name, is_compressed_log
+from nes.log_checkpoint import LogCheckpoint, mark_groups_analyzed, parse_new_log_entries, select_groups_to_analyze
+from nes.run_journal import RunJournal, JOURNAL_FILE_NAME
+import time
+
+# Run time budget covers the whole run, parsing included
+run_started_at = time.monotonic()
 
 dotenv.load_dotenv()
 
@@ -17,8 +29,6 @@ DIR_CURRENT = os.getenv("DIR_ROOT")
 DIR_LOGS = os.environ.get('DIR_LOGS')
 os.makedirs(DIR_LOGS, exist_ok=True)
 
-torch_info()
-
 current_log_level = logging.INFO
 IS_DEBUG = False
 if bool(os.environ.get("IS_DEBUG")):
@@ -36,27 +46,94 @@ logging.basicConfig(level=current_log_level,
                     )
 
 args = argparse.ArgumentParser()
-args.add_argument('--log', type=str, dest='log_file', required=True, help='Path to log file to process with AI')
+args.add_argument('--log', type=str, dest='log_file', required=False, help='Path to log file, directory with log files or glob pattern (e.g. "/var/www/*/error_log*") to process with AI, .gz and .bz2 files are read transparently')
 args.add_argument('--lang', type=str, dest='language', default="en", required=False, help='Current processing language, available: uk, en')
 args.add_argument('--model', type=str, dest='model', default="", required=False, help='LLM Model for log processing')
 args.add_argument('--oc', type=bool, dest='is_nes_parsing', default=False, required=False, help='Parse with economical NES/OpenCart log processing, use it for NES/Opencart logs')
+args.add_argument('--stream', dest='is_streaming_parser', action='store_true', help='Use constant-memory streaming parser for large NES/Opencart log files, keeps only first/last timestamps and a bounded sample per error')
+args.add_argument('--workers', type=int, dest='parser_workers', default=int(os.environ.get('LOG_PARSER_WORKERS') or 1), required=False, help='Number of processes to parse NES/Opencart log file in parallel, 0 means all CPU cores')
+args.add_argument('--concurrency', type=int, dest='concurrency', default=int(os.environ.get('LLM_MAX_CONCURRENCY') or 1), required=False, help='Maximum number of parallel LLM requests, 1 means sequential processing')
+args.add_argument('--pack-tokens', type=int, dest='pack_token_budget', default=int(os.environ.get('LLM_PACK_TOKEN_BUDGET') or 0), required=False, help='Pack several NES/Opencart errors into one LLM request up to this prompt size in tokens, 0 disables packing')
+args.add_argument('--compact', dest='is_prompt_compaction', action='store_true', help='Shorten stack traces of NES/Opencart errors in prompts: common path prefix, repeated frames, and only the top and store code frames of errors over PROMPT_ITEM_TOKEN_BUDGET tokens')
+args.add_argument('--cluster', dest='is_log_clustering', action='store_true', help='For not NES/Opencart logs group similar error lines into templates and send one line per template to AI')
+args.add_argument('--semantic-merge', dest='is_semantic_merge', action='store_true', help='Merge semantically similar NES/Opencart errors with fastembed embeddings and send one error per group to AI')
+args.add_argument('--knowledge-base', dest='is_knowledge_base', action='store_true', help='Store NES/Opencart analyses in Qdrant and reuse or add to prompt past analyses of similar errors')
+args.add_argument('--follow', dest='is_follow', action='store_true', help='Incremental mode for NES/Opencart logs: process only log entries appended since the last run and send only new or escalated errors to AI')
+args.add_argument('--follow-interval', type=int, dest='follow_interval', default=0, required=False, help='With --follow keep running and check the log file every N seconds, 0 means single pass (for cron)')
+args.add_argument('--predict-gpu-layers', dest='is_predict_ai_layers', action='store_true', help='Probe GPU and offload to it as many Ollama model layers as fit its free memory')
+args.add_argument('--calibrate', dest='is_calibrate', action='store_true', help='Measure tokens/sec of the Ollama model with several num_thread/num_batch values and keep the best ones for next runs')
+args.add_argument('--metrics-prom', type=str, dest='metrics_prometheus_path', default=os.environ.get('METRICS_PROMETHEUS_PATH') or '', required=False, help='Also write LLM metrics of the run in Prometheus text format to this file')
+args.add_argument('--sink', type=str, dest='output_sink', default=os.environ.get('OUTPUT_SINK') or 'files', choices=OUTPUT_SINK_TYPES, required=False, help='Where to save AI analyses: files (<key>.json and <key>.txt), jsonl, jsonl.zst or sqlite (single file per run, see export_outputs.py)')
+args.add_argument('--stream-tokens', dest='is_llm_streaming', action='store_true', help='Stream LLM answers to outputs and stop generations exceeding LLM_STREAM_MAX_TOKENS, LLM_STREAM_MAX_SECONDS or repeating themselves')
+args.add_argument('--time-budget', type=float, dest='time_budget', default=float(os.environ.get('RUN_TIME_BUDGET_SECONDS') or 0), required=False, help='Stop sending errors to AI after this number of seconds from the start of the run, the most important errors are sent first, 0 means unlimited')
+args.add_argument('--max-calls', type=int, dest='max_calls', default=int(os.environ.get('RUN_MAX_LLM_CALLS') or 0), required=False, help='Maximum number of AI requests of the run, the most important errors are sent first, 0 means unlimited')
+args.add_argument('--llm-backend', type=str, dest='llm_backend', default=os.environ.get('LLM_BACKEND') or 'live', choices=LLM_BACKENDS, required=False, help='live uses the configured model, record also saves its prompts and responses to --llm-recordings, replay answers with saved responses without a model, synthetic answers with generated text after a simulated latency (load tests)')
+args.add_argument('--llm-recordings', type=str, dest='llm_recordings', default='', required=False, help='JSONL file of recorded prompts and responses for record and replay backends, LLM_RECORDINGS_PATH by default')
+args.add_argument('--top', type=int, dest='top', default=int(os.environ.get('REPORT_TOP') or 0), required=False, help='Print only this number of the most important NES/Opencart errors in the summary, 0 means all errors')
+args.add_argument('--top-by', type=str, dest='top_order', default=os.environ.get('REPORT_TOP_BY') or 'count', choices=TOP_ORDERS, required=False, help='Order of errors in the summary: count (the most frequent first) or severity (the most severe first)')
+args.add_argument('--histogram', type=str, dest='histogram_bucket', default=os.environ.get('REPORT_HISTOGRAM') or '', choices=[''] + list(HISTOGRAM_BUCKETS), required=False, help='Count NES/Opencart errors per minute or hour while parsing, histograms are saved to the run JSON and peaks are printed in the summary')
+args.add_argument('--report-format', type=str, dest='report_format', default=os.environ.get('REPORT_FORMAT') or 'json', choices=REPORT_FORMATS, required=False, help='Format of the run file with parsed errors: json or jsonl (one error group per line)')
+args.add_argument('--resume', type=str, dest='resume', default='', required=False, help='Continue the interrupted run with the same --log: run id (e.g. 20250629-100500) or its outputs directory, only errors not done in the run journal are sent to AI')
+args.add_argument('--no-cache', dest='is_cache_disabled', action='store_true', help='Do not read or write persistent LLM response cache')
+args.add_argument('--refresh', dest='is_cache_refresh', action='store_true', help='Ignore cached LLM responses and overwrite them with new ones')
 args = args.parse_args()
 
-log_file_path = args.log_file
-if not os.path.isfile(log_file_path):
-    raise FileNotFoundError(f"Provided log file {log_file_path} not found")
+if args.is_calibrate:
+    calibration = calibrate_ollama(args.model)
+    print(f"Best Ollama settings: num_thread={calibration['num_thread']} num_batch={calibration['num_batch']} ({calibration['tokens_per_second']} tokens/s)")
+    raise SystemExit(0)
+
+if not args.log_file:
+    raise Exception("Provide path to log file with --log")
+log_file_paths = resolve_log_paths(args.log_file)
+if not log_file_paths:
+    raise FileNotFoundError(f"Provided log file {args.log_file} not found")
+log_file_path = log_file_paths[0]
+
+if args.is_follow and not args.is_nes_parsing:
+    raise Exception("Incremental --follow mode is available only for NES/Opencart log files, use it with --oc True")
+if args.is_follow and (len(log_file_paths) > 1 or is_compressed_log(log_file_path)):
+    raise Exception("Incremental --follow mode is available only for a single not compressed log file")
+if args.is_follow and args.resume:
+    raise Exception("Incremental --follow mode continues from its checkpoint, it can't be used with --resume")
 
-log_path, log_file_name = os.path.split(log_file_path)
+log_file_name = get_log_source_name(args.log_file)
 
-json_file_name = DIR_CURRENT + f"/outputs/{now.strftime(format=f"{log_file_name}-%Y%m%d-%H%M%S")}.json"
-DIR_OUTPUTS = os.path.dirname(json_file_name) + f"/{log_file_name}/{now.strftime(format=f"%Y%m%d-%H%M%S")}/"
-os.makedirs(DIR_OUTPUTS, exist_ok=True)
+def get_output_paths(run_time: datetime, is_created: bool = True):
+    run_json_file_name = DIR_CURRENT + f"/outputs/{run_time.strftime(format=f'{log_file_name}-%Y%m%d-%H%M%S')}.{args.report_format}"
+    run_outputs_dir = os.path.dirname(run_json_file_name) + f"/{log_file_name}/{run_time.strftime(format='%Y%m%d-%H%M%S')}/"
+    if is_created:
+        os.makedirs(run_outputs_dir, exist_ok=True)
+    return run_json_file_name, run_outputs_dir
 
+def get_resumed_run_time(run: str) -> datetime:
+    # Run id is the name of the run outputs directory
+    run_id = os.path.basename(os.path.normpath(run))
+    try:
+        return datetime.strptime(run_id, '%Y%m%d-%H%M%S')
+    except ValueError:
+        raise Exception(f"Unknown run {run}, provide run id (e.g. 20250629-100500) or run outputs directory")
+
+run_time = get_resumed_run_time(args.resume) if args.resume else now
+# Outputs directory of the resumed run already exists with its journal, follow passes create it only for selected errors
+json_file_name, DIR_OUTPUTS = get_output_paths(run_time, is_created=not args.resume and not args.is_follow)
+journal_file_path = os.path.join(DIR_OUTPUTS, JOURNAL_FILE_NAME)
+if args.resume and not os.path.isfile(journal_file_path):
+    raise FileNotFoundError(f"Run journal {journal_file_path} not found, check --resume and --log of the run")
+
+timestamps_sample_size = int(os.environ.get('LOG_STREAM_TIMESTAMPS_SAMPLE_SIZE') or 0)
 parsed_data = None
-if args.is_nes_parsing:
-    parsed_data = parser.parse_log_file(log_file_path)
+if args.is_nes_parsing and not args.is_follow:
+    if len(log_file_paths) > 1:
+        parsed_data = parser.parse_log_files(log_file_paths, args.parser_workers or None, args.is_streaming_parser, timestamps_sample_size, args.histogram_bucket)
+    elif args.parser_workers != 1:
+        parsed_data = parser.parse_log_file_parallel(log_file_path, args.parser_workers or None, args.is_streaming_parser, timestamps_sample_size, args.histogram_bucket)
+    elif args.is_streaming_parser:
+        parsed_data = parser.parse_log_file_streaming(log_file_path, timestamps_sample_size, histogram_bucket=args.histogram_bucket)
+    else:
+        parsed_data = parser.parse_log_file(log_file_path, args.histogram_bucket)
     if not parsed_data:
-        raise Exception(f"Provided log file {log_file_path} do not contains NES/Opencart structure")
+        raise Exception(f"Provided log file {args.log_file} do not contains NES/Opencart structure")
 
 CURRENT_LLM_MODEL = os.environ.get('LOCAL_OLLAMA_MODEL_CODER')
 CURRENT_LLM_NUM_CTX = int(os.environ.get('LOCAL_OLLAMA_MODEL_CODER_NUM_CTX'))
@@ -64,14 +141,148 @@ if args.model != "":
     CURRENT_LLM_MODEL = args.model
     CURRENT_LLM_NUM_CTX = int(os.environ.get('LOCAL_OLLAMA_MODEL_DEFAULT_NUM_CTX'))
 
-llm = init_llm(CURRENT_LLM_MODEL, CURRENT_LLM_NUM_CTX)
+# LLM client is created by processor on the first request, cached runs never import LLM backends
+def create_llm():
+    return init_llm_backend(args.llm_backend, CURRENT_LLM_MODEL, CURRENT_LLM_NUM_CTX, is_predict_ai_layers=args.is_predict_ai_layers,
+                            recordings_path=args.llm_recordings)
+
+# Synthetic answers must not be mixed with answers of the real model in the cache
+LLM_MODEL_NAME = 'synthetic' if args.llm_backend == 'synthetic' else get_configured_llm_model(args.model)
+
+llm_cache = None
+if not args.is_cache_disabled:
+    llm_cache = LlmResponseCache(os.environ.get('LLM_CACHE_PATH') or f"{DIR_CURRENT}/cache/llm-cache.sqlite",
+                                 ttl_seconds=int(os.environ.get('LLM_CACHE_TTL_SECONDS') or 7 * 24 * 3600),
+                                 max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES') or 100000),
+                                 is_refresh=args.is_cache_refresh)
+
+token_counter = None
+if args.pack_token_budget > 0 or args.is_prompt_compaction:
+    token_counter = TokenCounter(os.environ.get('TOKENIZER_NAME') or '')
+
+prompt_compactor = None
+if args.is_prompt_compaction:
+    prompt_compactor = PromptCompactor(token_counter,
+                                       item_token_budget=int(os.environ.get('PROMPT_ITEM_TOKEN_BUDGET') or 0),
+                                       head_frames=int(os.environ.get('PROMPT_TRACE_HEAD_FRAMES') or 3),
+                                       app_frames=int(os.environ.get('PROMPT_TRACE_APP_FRAMES') or 5),
+                                       vendor_frames_regex=os.environ.get('PROMPT_VENDOR_FRAMES_REGEX') or DEFAULT_VENDOR_FRAMES_REGEX)
+
+error_line_matcher = ErrorLineMatcher.from_config(os.environ.get('LOG_ERROR_MARKERS') or '', bool(os.environ.get('LOG_ERROR_MARKERS_CASE_INSENSITIVE')))
+
+template_miner = None
+if args.is_log_clustering:
+    template_miner = LogTemplateMiner(float(os.environ.get('LOG_CLUSTER_SIMILARITY') or 0.5), int(os.environ.get('LOG_CLUSTER_PREFIX_DEPTH') or 2))
+
+semantic_grouper = None
+if args.is_semantic_merge:
+    from nes.qdrant.semantic_grouping import SemanticErrorGrouper
+    semantic_grouper = SemanticErrorGrouper(os.environ.get('QDRANT_EMB_DENSE_MODEL_NAME') or '', float(os.environ.get('SEMANTIC_MERGE_THRESHOLD') or 0.92))
+
+knowledge_base = None
+if args.is_knowledge_base:
+    # Qdrant modules read embedding model names from environment on import, so they are imported after dotenv
+    from qdrant_client import QdrantClient
+    from nes.qdrant.analysis_store import AnalysisKnowledgeBase
+    qdrant_client = QdrantClient(url=os.environ.get('QDRANT_URL')) if os.environ.get('QDRANT_URL') else QdrantClient(path=os.environ.get('QDRANT_PATH') or f"{DIR_CURRENT}/qdrant_data")
+    knowledge_base = AnalysisKnowledgeBase(qdrant_client, f"{os.environ.get('QDRANT_ANALYSES_COLLECTION') or 'nes-log-analyses'}-{args.language}",
+                                           reuse_threshold=float(os.environ.get('QDRANT_REUSE_THRESHOLD') or 0.97),
+                                           context_limit=int(os.environ.get('QDRANT_CONTEXT_LIMIT') or 3))
+
+error_scheduler = ErrorScheduler.from_config(os.environ.get('SCHEDULER_WEIGHTS') or '')
+
+# Every follow pass has its own budget
+def create_processor(data, outputs_dir: str, run_json_file_name: str, journal: RunJournal | None = None,
+                     started_at: float | None = None) -> LogAiProcessor:
+    return LogAiProcessor(llm=None, parsed_data=data, args=args, outputs_dir=outputs_dir, json_file_name=run_json_file_name,
+                          max_concurrency=args.concurrency,
+                          max_retries=int(os.environ.get('LLM_MAX_RETRIES') or 3),
+                          retry_backoff_seconds=float(os.environ.get('LLM_RETRY_BACKOFF_SECONDS') or 1.0),
+                          cache=llm_cache,
+                          pack_token_budget=args.pack_token_budget,
+                          pack_max_errors=int(os.environ.get('LLM_PACK_MAX_ERRORS') or 20),
+                          token_counter=token_counter,
+                          error_line_matcher=error_line_matcher,
+                          template_miner=template_miner,
+                          semantic_grouper=semantic_grouper,
+                          knowledge_base=knowledge_base,
+                          llm_factory=create_llm,
+                          model_name=LLM_MODEL_NAME,
+                          metrics=LlmMetrics(LLM_MODEL_NAME),
+                          output_sink=create_output_sink(args.output_sink, outputs_dir),
+                          is_streaming=args.is_llm_streaming,
+                          stream_max_tokens=int(os.environ.get('LLM_STREAM_MAX_TOKENS') or 4096),
+                          stream_max_seconds=float(os.environ.get('LLM_STREAM_MAX_SECONDS') or 300),
+                          is_repetition_checked=not bool(os.environ.get('LLM_STREAM_REPETITION_CHECK_DISABLED')),
+                          scheduler=error_scheduler,
+                          run_budget=RunBudget(args.time_budget, args.max_calls, started_at),
+                          journal=journal,
+                          failed_retries=int(os.environ.get('RUN_FAILED_RETRIES') or 1),
+                          prompt_compactor=prompt_compactor)
+
+def save_run_metrics(run_processor: LogAiProcessor, run_json_file_name: str):
+    metrics = run_processor.metrics
+    metrics.skipped_by_budget = run_processor.run_budget.skipped
+    metrics.save_summary(os.path.splitext(run_json_file_name)[0] + "-metrics.json")
+    if args.metrics_prometheus_path:
+        metrics.save_prometheus(args.metrics_prometheus_path)
+
+def run_follow_pass(pass_time: datetime, started_at: float):
+    checkpoint = LogCheckpoint(log_file_path, os.environ.get('FOLLOW_CHECKPOINTS_DIR') or f"{DIR_CURRENT}/checkpoints/")
+    window_errors = parse_new_log_entries(checkpoint, timestamps_sample_size, int(os.environ.get('FOLLOW_PENDING_FLUSH_SECONDS') or 60))
+    selected_errors = select_groups_to_analyze(checkpoint, window_errors, float(os.environ.get('FOLLOW_ESCALATION_FACTOR') or 2.0))
+    logging.info(f"Follow pass of {log_file_path}: {len(window_errors)} error groups in new entries, {len(selected_errors)} new or escalated")
+
+    if selected_errors:
+        run_json_file_name, outputs_dir = get_output_paths(pass_time)
+        follow_processor = create_processor(selected_errors, outputs_dir, run_json_file_name, started_at=started_at)
+        follow_processor.process_opencart_logs()
+        follow_processor.output_sink.close()
+        save_run_metrics(follow_processor, run_json_file_name)
+
+        analyzed_count = mark_groups_analyzed(checkpoint, follow_processor.saved_keys)
+        if analyzed_count < len(selected_errors):
+            logging.info(f"Follow pass: {len(selected_errors) - analyzed_count} error groups not analyzed, they stay pending")
+
+    # Checkpoint is saved only after successful processing, so failed pass is repeated next time
+    checkpoint.save()
+
+#Incremental processing for NES/Opencart log files
+if args.is_follow:
+    run_follow_pass(run_time, run_started_at)
+    while args.follow_interval > 0:
+        time.sleep(args.follow_interval)
+        run_follow_pass(datetime.now(), time.monotonic())
+else:
+    # Follow passes are journaled by the checkpoint, other runs by the run journal, so an interrupted run can be resumed
+    run_journal = RunJournal(journal_file_path,
+                             fsync_batch_size=int(os.environ.get('RUN_JOURNAL_FSYNC_BATCH') or 64),
+                             fsync_interval_seconds=float(os.environ.get('RUN_JOURNAL_FSYNC_SECONDS') or 1.0))
+
+    processor = create_processor(parsed_data, DIR_OUTPUTS, json_file_name, run_journal, run_started_at)
+
+    try:
+        #Processing for NES/Opencart log files
+        if parsed_data and args.is_nes_parsing:
+            processor.process_opencart_logs()
+
+        #Processing for any log type
+        if not args.is_nes_parsing:
+            processor.process_logs(log_file_paths)
+    finally:
+        # Outputs are written before the journal is closed, so the errors journaled as done have their outputs
+        processor.output_sink.close()
+        run_journal.close()
+        unfinished_count = run_journal.get_unfinished_count()
+        if unfinished_count:
+            run_id = run_time.strftime(format='%Y%m%d-%H%M%S')
+            print(f"Run {run_id} has {unfinished_count} unfinished errors, continue it with --resume {run_id}")
 
-processor = LogAiProcessor(llm=llm, parsed_data=parsed_data, args=args, outputs_dir=DIR_OUTPUTS, json_file_name=json_file_name)
+    if parsed_data or not args.is_nes_parsing:
+        save_run_metrics(processor, json_file_name)
 
-#Processing for NES/Opencart log files
-if parsed_data and args.is_nes_parsing:
-    processor.process_opencart_logs()
+if llm_cache:
+    llm_cache.close()
 
-#Processing for any log type
-if not args.is_nes_parsing:
-    processor.process_logs(log_file_path=log_file_path)
\ No newline at end of file
+if knowledge_base:
+    knowledge_base.close()
\ No newline at end of file
@@ -0,0 +1,518 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import socketserver
+import stat
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import nes.apache_php_log_parser as parser
+from nes.apache_php_log_parser import format_error_item_to_str, save_json_file
+from nes.error_renderer import get_renderer
+from nes.langchain_helpers import invoke_with_retry, ollama_response_to_dict
+from nes.llm_cache import LlmResponseCache
+from nes.log_filter import ErrorLineMatcher
+from nes.log_sources import GLOB_CHARS, resolve_log_paths
+from nes.metrics import LlmMetrics
+from nes.output_sink import create_output_sink
+from nes.scheduler import ErrorScheduler
+
+JOB_STATUSES = ['queued', 'running', 'done', 'failed']
+
+# Calls kept by the metrics of a long-running server, a new window is started when it is full
+METRICS_WINDOW_CALLS = 100000
+
+# Maximum size of POST /jobs body, raw entries of a single request
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# Longest wait of GET /jobs/<id>?wait=seconds, every waiting client holds a server thread
+MAX_WAIT_SECONDS = 300
+
+
+class AnalysisJob(object):
+    """
+    Log file or raw log entries submitted for analysis, its status and analyses of its errors.
+    """
+
+    def __init__(self, job_id: str, source: dict, language: str, is_nes_parsing: bool, outputs_dir: str):
+        self.id = job_id
+        self.source = source
+        self.language = language
+        self.is_nes_parsing = is_nes_parsing
+        self.outputs_dir = outputs_dir
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.groups_total = 0
+        self.cached = 0
+        self.coalesced = 0
+        self.analyzed = 0
+        self.failed = {}
+        self.results = {}
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_result(self, output_key, response_dict: dict, origin: str):
+        with self._lock:
+            self.results[output_key] = response_dict
+            if origin == 'cached':
+                self.cached += 1
+            elif origin == 'coalesced':
+                self.coalesced += 1
+            else:
+                self.analyzed += 1
+
+    def add_failure(self, output_key, error: BaseException):
+        with self._lock:
+            self.failed[output_key] = f"{type(error).__name__}: {error}"
+
+    def get_results(self) -> dict:
+        with self._lock:
+            return {'id': self.id, 'status': self.status, 'results': dict(self.results), 'failed': dict(self.failed)}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'error': self.error,
+                'language': self.language,
+                'is_nes_parsing': self.is_nes_parsing,
+                'source': {key: value for key, value in self.source.items() if key != 'entries'},
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'groups_total': self.groups_total,
+                'groups_done': len(self.results) + len(self.failed),
+                'cached': self.cached,
+                'coalesced': self.coalesced,
+                'analyzed': self.analyzed,
+                'failed': len(self.failed),
+                'outputs_dir': self.outputs_dir,
+            }
+
+
+class AnalysisService(object):
+    """
+    Long-running analyzer shared by many stores: keeps the LLM client, prompt templates, translations
+    and the response cache warm, runs submitted jobs from a queue and sends every error to the LLM at most once
+    at a time, jobs with the same error in flight wait for the same analysis.
+    """
+
+    def __init__(self, llm, model_name: str, outputs_dir: str, cache: LlmResponseCache | None = None,
+                 max_concurrency: int = 1, job_workers: int = 1, max_retries: int = 3, retry_backoff_seconds: float = 1.0,
+                 default_language: str = 'en', is_nes_parsing: bool = True, output_sink: str = 'files',
+                 error_line_matcher: ErrorLineMatcher | None = None, scheduler: ErrorScheduler | None = None,
+                 log_roots: list | None = None, max_finished_jobs: int = 1000, parser_workers: int = 1):
+        """
+        Args:
+            llm: LLM client shared by all jobs.
+            model_name (str): Model name of cache keys and metrics.
+            outputs_dir (str): Outputs of every job are saved to its own subdirectory.
+            cache (LlmResponseCache): Shared response cache, None disables caching (in-flight requests are still coalesced).
+            max_concurrency (int): Parallel LLM requests of all jobs together.
+            job_workers (int): Jobs parsed and processed at the same time.
+            log_roots (list): Directories submitted log files must be in, None or empty denies log paths
+                (only raw entries are accepted), "/" allows any path.
+            max_finished_jobs (int): Finished jobs kept for status requests, the oldest are forgotten.
+        """
+        self.llm = llm
+        self.model_name = model_name
+        self.outputs_dir = outputs_dir
+        self.cache = cache
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.default_language = default_language
+        self.is_nes_parsing = is_nes_parsing
+        self.output_sink = output_sink
+        self.error_line_matcher = error_line_matcher or ErrorLineMatcher()
+        self.scheduler = scheduler
+        self.log_roots = [os.path.realpath(log_root) for log_root in (log_roots or [])]
+        self.max_finished_jobs = max_finished_jobs
+        self.parser_workers = parser_workers
+        self.metrics = LlmMetrics(model_name)
+        self.coalesced_requests = 0
+
+        self.jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._prompts = {}
+        self._llm_executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix='llm')
+        self._workers = [threading.Thread(target=self._run_worker, name=f"job-worker-{idx}", daemon=True) for idx in range(max(1, job_workers))]
+
+    def start(self, languages: list):
+        """
+        Loads prompt templates and translations of the languages and starts job workers.
+        """
+        for language in languages:
+            get_renderer(language)
+            for template_name in ('anal-logs-nes', 'anal-logs-not-nes'):
+                self.get_prompt(template_name, language)
+
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._llm_executor.shutdown(wait=True)
+
+    def get_prompt(self, template_name: str, language: str) -> tuple:
+        """
+        Returns:
+            tuple: (base template text, PromptTemplate), read from prompts/ once.
+        """
+        prompt_key = f"{template_name}-{language}"
+        prompt = self._prompts.get(prompt_key)
+        if prompt is None:
+            with open(f"prompts/{prompt_key}.prompt") as f:
+                base_template = f.read()
+
+            from langchain_core.prompts import PromptTemplate
+            prompt = (base_template, PromptTemplate(input_variables=["error_details"], template=base_template))
+            self._prompts[prompt_key] = prompt
+
+        return prompt
+
+    def submit(self, request: dict) -> AnalysisJob:
+        """
+        Queues a job of POST /jobs request: {"log": file, directory or glob} or {"entries": raw log text},
+        optional "language" and "oc" (NES/OpenCart parsing).
+        """
+        language = request.get('language') or self.default_language
+        if not os.path.isfile(f"prompts/anal-logs-nes-{language}.prompt"):
+            raise ValueError(f"Unknown language {language}")
+
+        if request.get('log'):
+            source = {'log': str(request['log'])}
+            self.check_log_path(source['log'])
+        elif request.get('entries'):
+            source = {'entries': str(request['entries'])}
+        else:
+            raise ValueError("Request must contain \"log\" (path to log file, directory or glob) or \"entries\" (raw log text)")
+
+        is_nes_parsing = bool(request['oc']) if 'oc' in request else self.is_nes_parsing
+        job_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        job = AnalysisJob(job_id, source, language, is_nes_parsing, os.path.join(self.outputs_dir, job_id))
+
+        with self._jobs_lock:
+            self.jobs[job_id] = job
+            self.forget_finished_jobs()
+        self._queue.put(job)
+        logging.info(f"Job {job_id} queued: {source.get('log') or str(len(source['entries'])) + ' characters of entries'}")
+        return job
+
+    def check_log_path(self, log_path: str):
+        if not self.log_roots:
+            raise ValueError("Log paths are not allowed, set SERVER_LOG_ROOTS to directories of log files or submit \"entries\"")
+
+        # Only the part before the first glob character is known before the files are resolved
+        glob_position = min([log_path.find(char) for char in GLOB_CHARS if char in log_path] or [len(log_path)])
+        if not self.is_allowed_log_path(log_path[:glob_position] or '.'):
+            raise ValueError(f"Log path {log_path} is outside of allowed directories")
+
+    def is_allowed_log_path(self, log_path: str) -> bool:
+        real_path = os.path.realpath(log_path)
+        return any(real_path == log_root or real_path.startswith(log_root.rstrip(os.sep) + os.sep) for log_root in self.log_roots)
+
+    def resolve_job_log_paths(self, log_path: str) -> list:
+        log_file_paths = resolve_log_paths(log_path)
+        if not log_file_paths:
+            raise FileNotFoundError(f"No log files found at {log_path}")
+
+        # Glob patterns may lead outside of allowed directories with ".." or symlinks
+        denied_paths = [path for path in log_file_paths if not self.is_allowed_log_path(path)]
+        if denied_paths:
+            raise PermissionError(f"Log files outside of allowed directories: {', '.join(denied_paths[:5])}")
+        return log_file_paths
+
+    def forget_finished_jobs(self):
+        finished_ids = [job_id for job_id, job in self.jobs.items() if job.finished.is_set()]
+        for job_id in finished_ids[:max(0, len(finished_ids) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def list_jobs(self) -> list:
+        with self._jobs_lock:
+            return list(self.jobs.values())
+
+    def get_job(self, job_id: str) -> AnalysisJob | None:
+        with self._jobs_lock:
+            return self.jobs.get(job_id)
+
+    def get_status(self) -> dict:
+        with self._jobs_lock:
+            statuses = [job.status for job in self.jobs.values()]
+        with self._in_flight_lock:
+            in_flight = len(self._in_flight)
+
+        return {
+            'status': 'ok',
+            'model': self.model_name,
+            'jobs': {status: statuses.count(status) for status in JOB_STATUSES},
+            'llm_requests_in_flight': in_flight,
+            'coalesced_requests': self.coalesced_requests,
+        }
+
+    def _run_worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                self.run_job(job)
+                job.status = 'done'
+            except Exception as e:
+                logging.exception(f"Job {job.id} failed")
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                job.finished.set()
+
+    def run_job(self, job: AnalysisJob):
+        os.makedirs(job.outputs_dir, exist_ok=True)
+        groups, details = self.parse_job_source(job)
+        job.groups_total = len(groups)
+        save_json_file(groups, os.path.join(job.outputs_dir, 'parsed.json'))
+        if self.scheduler is not None:
+            groups = self.scheduler.order(groups)
+
+        base_template, prompt_template = self.get_prompt('anal-logs-nes' if job.is_nes_parsing else 'anal-logs-not-nes', job.language)
+        sink = create_output_sink(self.output_sink, job.outputs_dir)
+        try:
+            futures = []
+            for output_key in groups:
+                cache_key = LlmResponseCache.make_key(output_key, self.model_name, base_template, job.language)
+                cached_response = self.cache.get(cache_key) if self.cache is not None else None
+                if cached_response is not None:
+                    self.metrics.record_cache(1, 0)
+                    sink.write(output_key, cached_response)
+                    job.add_result(output_key, cached_response, 'cached')
+                    continue
+
+                if self.cache is not None:
+                    self.metrics.record_cache(0, 1)
+                future, is_coalesced = self.request_analysis(cache_key, output_key, prompt_template.format_prompt(error_details=details(output_key)))
+                futures.append((output_key, future, 'coalesced' if is_coalesced else 'analyzed'))
+
+            for output_key, future, origin in futures:
+                try:
+                    response_dict = future.result()
+                except Exception as e:
+                    logging.error(f"Job {job.id}: LLM processing failed for {output_key}: {type(e).__name__}: {e}")
+                    job.add_failure(output_key, e)
+                    continue
+
+                sink.write(output_key, response_dict)
+                job.add_result(output_key, response_dict, origin)
+        finally:
+            sink.close()
+
+        logging.info(f"Job {job.id} finished: {job.groups_total} errors, {job.cached} cached, {job.coalesced} coalesced, "
+                     f"{job.analyzed} analyzed, {len(job.failed)} failed")
+
+    def parse_job_source(self, job: AnalysisJob) -> tuple:
+        """
+        Groups errors of the job source.
+
+        Returns:
+            tuple: (error groups by fingerprint, function returning error details of the prompt by fingerprint).
+        """
+        if job.is_nes_parsing:
+            if 'log' in job.source:
+                groups = parser.parse_log_files(self.resolve_job_log_paths(job.source['log']), self.parser_workers)
+            else:
+                groups = parse_log_entries(job.source['entries'])
+            return groups, lambda output_key: format_error_item_to_str(output_key, groups[output_key], job.language)
+
+        if 'log' in job.source:
+            log_file_paths = self.resolve_job_log_paths(job.source['log'])
+            lines = ((line, severity) for _, _, line, severity in self.error_line_matcher.scan_files(log_file_paths, self.parser_workers))
+        else:
+            lines = self.iter_error_lines(job.source['entries'])
+
+        # The same error line is analyzed once, like the processor does for several log files
+        groups = {}
+        for line, severity in lines:
+            fingerprint = hashlib.md5(line.strip().encode('utf-8')).hexdigest()
+            group = groups.get(fingerprint)
+            if group is None:
+                groups[fingerprint] = {'line': line, 'severity': severity, 'count': 1}
+            else:
+                group['count'] += 1
+        return groups, lambda output_key: groups[output_key]['line']
+
+    def iter_error_lines(self, text: str):
+        for line in text.splitlines(keepends=True):
+            severity = self.error_line_matcher.get_severity(line.encode('utf-8'))
+            if severity is not None:
+                yield line, severity
+
+    def request_analysis(self, cache_key: str, output_key, prompt) -> tuple:
+        """
+        Sends the prompt to the LLM unless the same error (cache key) is already being analyzed for another job.
+
+        Returns:
+            tuple: (Future of the response dict, True if the request joined the one in flight).
+        """
+        with self._in_flight_lock:
+            future = self._in_flight.get(cache_key)
+            if future is not None:
+                self.coalesced_requests += 1
+                return future, True
+
+            future = self._llm_executor.submit(self.analyze, cache_key, output_key, prompt, time.perf_counter())
+            self._in_flight[cache_key] = future
+
+        future.add_done_callback(lambda done_future: self.remove_in_flight(cache_key, done_future))
+        return future, False
+
+    def remove_in_flight(self, cache_key: str, future):
+        with self._in_flight_lock:
+            if self._in_flight.get(cache_key) is future:
+                del self._in_flight[cache_key]
+
+    def analyze(self, cache_key: str, output_key, prompt, enqueued_at: float) -> dict:
+        started_at = time.perf_counter()
+        try:
+            response = invoke_with_retry(self.llm, prompt, self.max_retries, self.retry_backoff_seconds)
+        except Exception as e:
+            self.record_call(output_key, None, enqueued_at, started_at, e)
+            raise
+
+        self.record_call(output_key, response, enqueued_at, started_at)
+        response_dict = ollama_response_to_dict(response)
+        if self.cache is not None:
+            self.cache.set(cache_key, response_dict)
+        return response_dict
+
+    def record_call(self, output_key, response, enqueued_at: float, started_at: float, error: BaseException | None = None):
+        metrics = self.metrics
+        metrics.record_call(output_key, response, enqueued_at, started_at, time.perf_counter(), error=error)
+        if len(metrics.calls) >= METRICS_WINDOW_CALLS:
+            self.metrics = LlmMetrics(self.model_name)
+
+
+def parse_log_entries(text: str) -> dict:
+    """
+    Groups raw NES/OpenCart log entries like parse_log_file.
+    """
+    aggregated_errors = {}
+    for entry_text in parser.iter_log_entries(text.splitlines(keepends=True)):
+        parsed_entry = parser.parse_log_entry(entry_text, parser.LOG_ENTRY_REGEX)
+        if parsed_entry:
+            parser.process_parsed_entry(parsed_entry, aggregated_errors)
+    return aggregated_errors
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of AnalysisService:
+        GET  /health                    service status, jobs by status, LLM requests in flight
+        GET  /metrics                   LLM metrics summary
+        POST /jobs                      {"log": path} or {"entries": text}, optional "language" and "oc"
+        GET  /jobs                      statuses of all jobs
+        GET  /jobs/<id>[?wait=seconds]  job status, waits for the job to finish up to the given seconds (MAX_WAIT_SECONDS at most)
+        GET  /jobs/<id>/results         analyses of the job errors by error key
+    """
+
+    server_version = 'NesLogAi'
+
+    @property
+    def service(self) -> AnalysisService:
+        return self.server.service
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['health']:
+            return self.send_json(200, self.service.get_status())
+        if parts == ['metrics']:
+            return self.send_json(200, self.service.metrics.get_summary())
+        if parts == ['jobs']:
+            return self.send_json(200, [job.to_dict() for job in self.service.list_jobs()])
+
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.get_job(parts[1])
+            if job is None:
+                return self.send_json(404, {'error': f"Job {parts[1]} not found"})
+            if len(parts) == 2:
+                try:
+                    wait_seconds = float(parse_qs(url.query).get('wait', ['0'])[0] or 0)
+                except ValueError:
+                    return self.send_json(400, {'error': "Parameter wait must be a number of seconds"})
+                if wait_seconds > 0:
+                    job.finished.wait(min(wait_seconds, MAX_WAIT_SECONDS))
+                return self.send_json(200, job.to_dict())
+            if parts[2] == 'results':
+                return self.send_json(200, job.get_results())
+
+        self.send_json(404, {'error': f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip('/') != '/jobs':
+            return self.send_json(404, {'error': f"Unknown path {self.path}"})
+
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if content_length > MAX_REQUEST_BYTES:
+            return self.send_json(413, {'error': f"Request is larger than {MAX_REQUEST_BYTES} bytes"})
+
+        try:
+            request = json.loads(self.rfile.read(content_length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            job = self.service.submit(request)
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+
+        self.send_json(202, job.to_dict())
+
+    def send_json(self, status_code: int, content):
+        body = json.dumps(content, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Clients of Unix socket have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+
+class UnixThreadingHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_http_server(service: AnalysisService, host: str = '127.0.0.1', port: int = 8089, socket_path: str = ''):
+    """
+    Creates HTTP server of the service on host:port or on Unix socket if socket_path is set.
+    """
+    if socket_path:
+        # Socket of the previous server is left after a crash, other files are never removed
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.remove(socket_path)
+        server = UnixThreadingHTTPServer(socket_path, AnalysisRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+
+    server.service = service
+    return server
@@ -1,44 +1,63 @@
 import re
 import os
-import hashlib
+import sys
 import json
-from nes.i18n.language import Language
-
-def parse_log_file(file_path):
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from nes.error_renderer import get_renderer, get_first_timestamp, get_last_timestamp
+from nes.log_sources import open_log_file, is_compressed_log
+from nes.scheduler import parse_timestamp
+from nes.fingerprint import get_fingerprinter
+from nes.report import get_time_bucketer, merge_histograms, write_json_dict, write_jsonl
+
+# A regular expression to detect a line with a new error. It captures the date, error type, and main message.
+LOG_ENTRY_REGEX = re.compile(
+    r'\[(.*?)\]\s+'  # 1. Timestamp
+    r'(PHP (?:Fatal error|Warning|Notice|Parse error|Core error|Core warning|Compile error|Compile warning|User error|User warning|User notice|Strict Standards|Deprecated|User deprecated)):\s+'  # 2. Error type (PHP Fatal error)
+    r'(.*)',  # Error message
+    re.DOTALL
+)
+
+# Size of the byte blocks read by the streaming parser
+STREAM_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Files smaller than this are not worth splitting between processes
+PARALLEL_MIN_SHARD_SIZE = 4 * 1024 * 1024
+
+def parse_log_file(file_path, histogram_bucket: str = ''):
     """
     Parses the log file, groups errors, and collects statistics.
 
     Args:
         file_path (str): Path to log file.
+        histogram_bucket (str): Count entries of every group per "minute" or "hour", empty means no histograms.
 
     Returns:
         dict: Dictionary with aggregated error information.
     """
-    # A regular expression to detect a line with a new error. It captures the date, error type, and main message.
-    log_entry_regex = re.compile(
-        r'\[(.*?)\]\s+'  # 1. Timestamp
-        r'(PHP (?:Fatal error|Warning|Notice|Parse error|Core error|Core warning|Compile error|Compile warning|User error|User warning|User notice|Strict Standards|Deprecated|User deprecated)):\s+'  # 2. Error type (PHP Fatal error)
-        r'(.*)',  # Error message
-        re.DOTALL
-    )
+    log_entry_regex = LOG_ENTRY_REGEX
+    bucketer = get_time_bucketer(histogram_bucket)
 
     aggregated_errors = {}
     current_entry_lines = []
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with open_log_file(file_path, 'r', encoding='utf-8', errors='replace') as f:
             for line in f:
                 # Checking whether the current line is the beginning of a new record in the vine
                 if log_entry_regex.match(line) and current_entry_lines:
                     # If so, we process the previous record
-                    process_log_entry(current_entry_lines, log_entry_regex, aggregated_errors)
+                    process_log_entry(current_entry_lines, log_entry_regex, aggregated_errors, bucketer)
                     current_entry_lines = []
 
                 current_entry_lines.append(line)
 
             # Processing the last record in the file
             if current_entry_lines:
-                process_log_entry(current_entry_lines, log_entry_regex, aggregated_errors)
+                process_log_entry(current_entry_lines, log_entry_regex, aggregated_errors, bucketer)
+
+        if bucketer is not None:
+            bucketer.log_unparsed(file_path)
 
     except FileNotFoundError:
         print(f"Error: File not found at path '{file_path}'")
@@ -50,7 +69,429 @@ def parse_log_file(file_path):
     return aggregated_errors
 
 
-def process_log_entry(lines, regex, aggregated_errors):
+def parse_log_file_streaming(file_path, timestamps_sample_size: int = 0, chunk_size: int = STREAM_CHUNK_SIZE, histogram_bucket: str = ''):
+    """
+    Parses the log file with constant memory per unique error, see stream_log_groups.
+
+    Args:
+        file_path (str): Path to log file.
+        timestamps_sample_size (int): How many latest timestamps to keep per error group.
+        chunk_size (int): Size of the byte blocks read from the file.
+        histogram_bucket (str): Count entries of every group per "minute" or "hour", empty means no histograms.
+
+    Returns:
+        dict: Dictionary with aggregated error information.
+    """
+    try:
+        return dict(stream_log_groups(file_path, timestamps_sample_size, chunk_size, histogram_bucket))
+    except FileNotFoundError:
+        print(f"Error: File not found at path '{file_path}'")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return None
+
+
+def stream_log_groups(file_path, timestamps_sample_size: int = 0, chunk_size: int = STREAM_CHUNK_SIZE, histogram_bucket: str = ''):
+    """
+    Reads the log file in large byte blocks and yields aggregated error groups.
+
+    Unlike parse_log_file, every group keeps only its count, first and last timestamps
+    and a bounded sample of the latest timestamps, so memory depends on the number of unique errors only.
+
+    Args:
+        file_path (str): Path to log file.
+        timestamps_sample_size (int): How many latest timestamps to keep per error group.
+        chunk_size (int): Size of the byte blocks read from the file.
+        histogram_bucket (str): Count entries of every group per "minute" or "hour", empty means no histograms.
+
+    Yields:
+        tuple: (unique_key, error group dict) in order of the first appearance.
+    """
+    aggregated_errors = {}
+    bucketer = get_time_bucketer(histogram_bucket)
+    for entry_text in iter_log_entries(iter_log_lines(file_path, chunk_size)):
+        parsed_entry = parse_log_entry(entry_text, LOG_ENTRY_REGEX)
+        if parsed_entry:
+            add_entry_to_group(aggregated_errors, parsed_entry, timestamps_sample_size, bucketer)
+
+    if bucketer is not None:
+        bucketer.log_unparsed(file_path)
+    for unique_key, error_group in aggregated_errors.items():
+        error_group['timestamps'] = list(error_group['timestamps'])
+        yield unique_key, error_group
+
+
+def iter_log_lines(file_path, chunk_size: int = STREAM_CHUNK_SIZE, start: int = 0, end: int = None):
+    """
+    Yields decoded lines of the file reading it with large byte blocks.
+
+    Args:
+        file_path (str): Path to log file.
+        chunk_size (int): Size of the byte blocks read from the file.
+        start (int): Byte offset to start reading from, must be a beginning of a line.
+        end (int): Byte offset to stop reading at, None means the end of the file.
+    """
+    if is_compressed_log(file_path):
+        if start or end is not None:
+            raise Exception(f"Compressed log file {file_path} can't be read by byte ranges")
+        f = open_log_file(file_path, 'rb')
+    else:
+        f = open(file_path, 'rb', buffering=0)
+
+    with f:
+        f.seek(start)
+        bytes_left = end - start if end is not None else None
+        tail = b''
+        while bytes_left is None or bytes_left > 0:
+            chunk = f.read(chunk_size if bytes_left is None else min(chunk_size, bytes_left))
+            if not chunk:
+                break
+
+            if bytes_left is not None:
+                bytes_left -= len(chunk)
+
+            # Decode only complete lines, so multibyte characters are never split between blocks.
+            # Lines end with \n, \r\n or \r like in text mode, \r at the end of the block may be the first half of \r\n
+            data = tail + chunk
+            cut = max(data.rfind(b'\n'), data.rfind(b'\r', 0, len(data) - 1)) + 1
+            tail = data[cut:]
+            if not cut:
+                continue
+
+            lines = decode_log_text(data[:cut]).split('\n')
+            lines.pop()
+            for line in lines:
+                yield line + '\n'
+
+        if tail:
+            yield decode_log_text(tail)
+
+
+def decode_log_text(data: bytes) -> str:
+    # Line breaks are translated like universal newlines of text mode files
+    text = data.decode('utf-8', errors='replace')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def iter_log_entries(lines, regex=LOG_ENTRY_REGEX):
+    """
+    Groups lines into log entries, entry starts with a line that matches the regex.
+
+    Args:
+        lines (iterable): Log file lines.
+        regex (re.Pattern): Compiled regular expression of the entry header.
+
+    Yields:
+        str: Full (possibly multi-line) entry text.
+    """
+    current_entry_lines = []
+    for line in lines:
+        # Every header starts with a timestamp, cheap check before running the regex
+        if current_entry_lines and line.startswith('[') and regex.match(line):
+            yield "".join(current_entry_lines)
+            current_entry_lines = []
+
+        current_entry_lines.append(line)
+
+    if current_entry_lines:
+        yield "".join(current_entry_lines)
+
+
+def parse_log_entry(full_entry_text, regex=LOG_ENTRY_REGEX):
+    """
+    Splits a single log entry into its parts and computes the grouping key.
+
+    Args:
+        full_entry_text (str): Full (possibly multi-line) entry text.
+        regex (re.Pattern): Compiled regular expression for parsing.
+
+    Returns:
+        tuple: (unique_key, timestamp, error_type, error_message, stack_trace) or None if entry doesn't match.
+    """
+    match = regex.match(full_entry_text)
+
+    if not match:
+        return None
+
+    timestamp = match.group(1).strip()
+    # Errors are considered the same if their type, normalized message and normalized stack trace match
+    unique_key, error_type, error_message, stack_trace = get_fingerprinter().fingerprint(match.group(2).strip(), match.group(3).strip())
+
+    return unique_key, timestamp, error_type, error_message, stack_trace
+
+
+def add_entry_to_group(aggregated_errors, parsed_entry, timestamps_sample_size: int = 0, bucketer=None):
+    """
+    Updates the bounded statistics of the error group used by the streaming parser.
+
+    Args:
+        aggregated_errors (dict): Dictionary for storing results.
+        parsed_entry (tuple): Result of parse_log_entry.
+        timestamps_sample_size (int): How many latest timestamps to keep per error group.
+        bucketer (TimeBucketer): Counts the entry in the histogram of the group, None means no histograms.
+    """
+    unique_key, timestamp, error_type, error_message, stack_trace = parsed_entry
+
+    error_group = aggregated_errors.get(unique_key)
+    if error_group is None:
+        error_group = aggregated_errors[unique_key] = {
+            'type': error_type,
+            'message': error_message,
+            'count': 0,
+            'first_timestamp': timestamp,
+            'last_timestamp': timestamp,
+            'timestamps': deque(maxlen=timestamps_sample_size),
+            'stack_trace': stack_trace
+        }
+
+    error_group['count'] += 1
+    error_group['last_timestamp'] = timestamp
+    if timestamps_sample_size:
+        error_group['timestamps'].append(timestamp)
+    if bucketer is not None:
+        bucketer.add(error_group, timestamp)
+
+
+def parse_log_file_parallel(file_path, workers: int = None, is_streaming: bool = False, timestamps_sample_size: int = 0, histogram_bucket: str = ''):
+    """
+    Parses the log file in parallel processes, each process parses its own byte range of the file.
+
+    Shards are aligned on entry headers and merged in file order, so the result is identical
+    to parse_log_file (or parse_log_file_streaming when is_streaming is True).
+
+    Args:
+        file_path (str): Path to log file.
+        workers (int): Number of processes, None means the number of CPUs.
+        is_streaming (bool): Keep bounded statistics per group like the streaming parser.
+        timestamps_sample_size (int): How many latest timestamps to keep per error group in streaming mode.
+        histogram_bucket (str): Count entries of every group per "minute" or "hour", empty means no histograms.
+
+    Returns:
+        dict: Dictionary with aggregated error information.
+    """
+    try:
+        workers = workers or os.cpu_count() or 1
+        file_size = os.path.getsize(file_path)
+        # Compressed files can't be split by byte offsets
+        shards_count = 1 if is_compressed_log(file_path) else min(workers, max(1, file_size // PARALLEL_MIN_SHARD_SIZE))
+        offsets = find_shard_offsets(file_path, shards_count)
+        shards = [(file_path, start, end, is_streaming, timestamps_sample_size, histogram_bucket) for start, end in zip(offsets, offsets[1:])]
+
+        if len(shards) <= 1:
+            if is_streaming:
+                return parse_log_file_streaming(file_path, timestamps_sample_size, histogram_bucket=histogram_bucket)
+            return parse_log_file(file_path, histogram_bucket)
+
+        aggregated_errors = {}
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            # map() keeps the order of shards, so groups keep the order of their first appearance
+            for shard_errors in executor.map(parse_log_shard, shards):
+                merge_aggregated_errors(aggregated_errors, shard_errors, timestamps_sample_size)
+
+    except FileNotFoundError:
+        print(f"Error: File not found at path '{file_path}'")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return None
+
+    return aggregated_errors
+
+
+def parse_log_files(file_paths: list, workers: int = None, is_streaming: bool = False, timestamps_sample_size: int = 0, histogram_bucket: str = ''):
+    """
+    Parses several log files (e.g. error_log of every store, rotated and compressed logs) in parallel processes,
+    one file per task, and merges the same errors of all files into one group with per-file counts.
+
+    Args:
+        file_paths (list): Paths to log files, plain, .gz or .bz2.
+        workers (int): Number of processes, None means the number of CPUs.
+        is_streaming (bool): Keep bounded statistics per group like the streaming parser.
+        timestamps_sample_size (int): How many latest timestamps to keep per error group in streaming mode.
+        histogram_bucket (str): Count entries of every group per "minute" or "hour", empty means no histograms.
+
+    Returns:
+        dict: Dictionary with aggregated error information, every group has "files": {file path: count}.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(file_paths))
+    tasks = [(file_path, is_streaming, timestamps_sample_size, histogram_bucket) for file_path in file_paths]
+
+    aggregated_errors = {}
+    if workers <= 1:
+        results = map(parse_log_file_task, tasks)
+        for file_path, file_errors in zip(file_paths, results):
+            merge_file_errors(aggregated_errors, file_errors, file_path, timestamps_sample_size)
+        return aggregated_errors
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_path, file_errors in zip(file_paths, executor.map(parse_log_file_task, tasks)):
+            merge_file_errors(aggregated_errors, file_errors, file_path, timestamps_sample_size)
+
+    return aggregated_errors
+
+
+def parse_log_file_task(task):
+    """
+    Parses a single log file, used as a process pool task.
+
+    Args:
+        task (tuple): (file_path, is_streaming, timestamps_sample_size, histogram_bucket).
+    """
+    file_path, is_streaming, timestamps_sample_size, histogram_bucket = task
+    if is_streaming:
+        return parse_log_file_streaming(file_path, timestamps_sample_size, histogram_bucket=histogram_bucket) or {}
+    return parse_log_file(file_path, histogram_bucket) or {}
+
+
+def merge_file_errors(aggregated_errors, file_errors, file_path, timestamps_sample_size: int = 0):
+    """
+    Merges error groups of one log file into the accumulated result of other files.
+    Files of different stores overlap in time, so the first and the last appearance are compared by time
+    and the timestamps are sorted by time before the latest timestamps_sample_size of them are kept.
+    """
+    # The same timestamps repeat in many groups, every one is parsed once
+    parsed_timestamps = {}
+
+    def get_sort_time(timestamp) -> float:
+        if timestamp not in parsed_timestamps:
+            parsed = parse_timestamp(timestamp)
+            parsed_timestamps[timestamp] = float('-inf') if parsed is None else parsed
+        return parsed_timestamps[timestamp]
+
+    for unique_key, file_group in file_errors.items():
+        file_group['first_timestamp'] = get_first_timestamp(file_group)
+        file_group['last_timestamp'] = get_last_timestamp(file_group)
+
+        error_group = aggregated_errors.get(unique_key)
+        if error_group is None:
+            file_group['files'] = {file_path: file_group['count']}
+            aggregated_errors[unique_key] = file_group
+            continue
+
+        error_group['files'][file_path] = error_group['files'].get(file_path, 0) + file_group['count']
+        error_group['count'] += file_group['count']
+        error_group['timestamps'].extend(file_group['timestamps'])
+        error_group['timestamps'].sort(key=get_sort_time)
+        if timestamps_sample_size:
+            error_group['timestamps'] = error_group['timestamps'][-timestamps_sample_size:]
+        merge_histograms(error_group, file_group)
+
+        if is_earlier_timestamp(file_group['first_timestamp'], error_group['first_timestamp']):
+            error_group['first_timestamp'] = file_group['first_timestamp']
+        if is_earlier_timestamp(error_group['last_timestamp'], file_group['last_timestamp']):
+            error_group['last_timestamp'] = file_group['last_timestamp']
+
+
+def is_earlier_timestamp(timestamp, other_timestamp) -> bool:
+    parsed, other_parsed = parse_timestamp(timestamp), parse_timestamp(other_timestamp)
+    if parsed is None or other_parsed is None:
+        return other_timestamp is None and timestamp is not None
+    return parsed < other_parsed
+
+
+def find_shard_offsets(file_path, shards_count: int):
+    """
+    Splits the file into byte ranges that start with a log entry header.
+
+    Args:
+        file_path (str): Path to log file.
+        shards_count (int): Desired number of byte ranges.
+
+    Returns:
+        list: Sorted byte offsets, starting with 0 and ending with the file size.
+    """
+    file_size = os.path.getsize(file_path)
+    offsets = [0]
+
+    with open(file_path, 'rb') as f:
+        for shard_idx in range(1, shards_count):
+            target = max(file_size * shard_idx // shards_count, offsets[-1])
+            # Move to the beginning of the next line
+            f.seek(max(target - 1, 0))
+            if target > 0:
+                f.readline()
+
+            while True:
+                position = f.tell()
+                line = f.readline()
+                if not line:
+                    position = file_size
+                    break
+
+                if line.startswith(b'[') and LOG_ENTRY_REGEX.match(decode_log_text(line)):
+                    break
+
+            if offsets[-1] < position < file_size:
+                offsets.append(position)
+
+    offsets.append(file_size)
+    return offsets
+
+
+def parse_log_shard(shard):
+    """
+    Parses a single byte range of the log file, used as a process pool task.
+
+    Args:
+        shard (tuple): (file_path, start, end, is_streaming, timestamps_sample_size, histogram_bucket).
+
+    Returns:
+        dict: Dictionary with aggregated error information of the shard.
+    """
+    file_path, start, end, is_streaming, timestamps_sample_size, histogram_bucket = shard
+    bucketer = get_time_bucketer(histogram_bucket)
+    aggregated_errors = {}
+
+    for entry_text in iter_log_entries(iter_log_lines(file_path, STREAM_CHUNK_SIZE, start, end)):
+        parsed_entry = parse_log_entry(entry_text, LOG_ENTRY_REGEX)
+        if not parsed_entry:
+            continue
+
+        if is_streaming:
+            add_entry_to_group(aggregated_errors, parsed_entry, timestamps_sample_size, bucketer)
+        else:
+            process_parsed_entry(parsed_entry, aggregated_errors, bucketer)
+
+    if bucketer is not None:
+        bucketer.log_unparsed(f"{file_path} [{start}:{end}]")
+    if is_streaming:
+        for error_group in aggregated_errors.values():
+            error_group['timestamps'] = list(error_group['timestamps'])
+
+    return aggregated_errors
+
+
+def merge_aggregated_errors(aggregated_errors, shard_errors, timestamps_sample_size: int = 0):
+    """
+    Merges error groups of a later shard into the accumulated result.
+
+    Args:
+        aggregated_errors (dict): Accumulated results of the previous shards.
+        shard_errors (dict): Results of the next shard.
+        timestamps_sample_size (int): How many latest timestamps to keep per group in streaming mode.
+    """
+    for unique_key, shard_group in shard_errors.items():
+        error_group = aggregated_errors.get(unique_key)
+        if error_group is None:
+            aggregated_errors[unique_key] = shard_group
+            continue
+
+        error_group['count'] += shard_group['count']
+        error_group['timestamps'].extend(shard_group['timestamps'])
+        merge_histograms(error_group, shard_group)
+        if 'last_timestamp' in shard_group:
+            # The first appearance belongs to the earlier shard, the last one to the later shard
+            error_group['last_timestamp'] = shard_group['last_timestamp']
+            if timestamps_sample_size:
+                error_group['timestamps'] = error_group['timestamps'][-timestamps_sample_size:]
+            else:
+                error_group['timestamps'] = []
+
+
+def process_log_entry(lines, regex, aggregated_errors, bucketer=None):
     """
     Processes a single log entry (which may be multi-line).
 
@@ -58,35 +499,26 @@ def process_log_entry(lines, regex, aggregated_errors):
         lines (list): List of rows belonging to a single record.
         regex (re.Pattern): Compiled regular expression for parsing.
         aggregated_errors (dict): Dictionary for storing results.
+        bucketer (TimeBucketer): Counts the entry in the histogram of the group, None means no histograms.
     """
-    full_entry_text = "".join(lines)
-    match = regex.match(full_entry_text)
+    parsed_entry = parse_log_entry("".join(lines), regex)
 
-    if not match:
+    if not parsed_entry:
         return
 
-    timestamp = match.group(1).strip()
-    error_type = match.group(2).strip()
-    # Message and Stack Trace
-    message_and_trace = match.group(3).strip()
-
-    # Split message and Stack Trace
-    if 'Stack trace:' in message_and_trace:
-        parts = message_and_trace.split('Stack trace:', 1)
-        error_message = parts[0].strip()
-        stack_trace = 'Stack trace:' + parts[1].strip()
-    else:
-        error_message = message_and_trace
-        stack_trace = None
+    process_parsed_entry(parsed_entry, aggregated_errors, bucketer)
 
-    # Create a unique grouping key.
-    # Errors are considered the same if their type, message, and stack trace match.
-    # File paths in the stack trace can contain dynamic parts, so we normalize them.
-    normalized_trace = re.sub(r'#\d+\s+.*?\(\d+\)', '#N file(line)', stack_trace) if stack_trace else ''
-    unique_key_string = f"{error_type}|{error_message}|{normalized_trace}"
 
-    # We use hash as a key for efficiency
-    unique_key = hashlib.md5(unique_key_string.encode('utf-8')).hexdigest()
+def process_parsed_entry(parsed_entry, aggregated_errors, bucketer=None):
+    """
+    Adds a parsed log entry to its error group keeping all timestamps.
+
+    Args:
+        parsed_entry (tuple): Result of parse_log_entry.
+        aggregated_errors (dict): Dictionary for storing results.
+        bucketer (TimeBucketer): Counts the entry in the histogram of the group, None means no histograms.
+    """
+    unique_key, timestamp, error_type, error_message, stack_trace = parsed_entry
 
     if unique_key not in aggregated_errors:
         aggregated_errors[unique_key] = {
@@ -100,57 +532,42 @@ def process_log_entry(lines, regex, aggregated_errors):
     # Update statistics
     aggregated_errors[unique_key]['count'] += 1
     aggregated_errors[unique_key]['timestamps'].append(timestamp)
+    if bucketer is not None:
+        bucketer.add(aggregated_errors[unique_key], timestamp)
 
 
-def print_summary(aggregated_errors, language_iso2: str = 'en'):
+def print_summary(aggregated_errors, language_iso2: str = 'en', top: int = 0, top_order: str = 'count'):
     """
-    Outputs a report of analyzed errors in a readable format.
+    Outputs a report of analyzed errors in a readable format, the whole report is written at once.
 
     Args:
         :param aggregated_errors: Dictionary with aggregated information.
         :param language_iso2: the language ISO2 code in which the function output will be
+        :param top: Number of the most important errors to output, 0 means all errors
+        :param top_order: "count" or "severity", see get_top_groups
     """
-    translations = Language(language_iso2=language_iso2)
-    translations.load('print-summary')
-    if not aggregated_errors:
-        print(translations.get('text_empty_errors'))
-        return
-
-    print("=" * 80)
-    print(translations.get('text_anal_finished_results'))
-    print("=" * 80)
-
-    # Сортуємо помилки за кількістю повторень (від найбільшої до найменшої)
-    sorted_errors = sorted(aggregated_errors.values(), key=lambda x: x['count'], reverse=True)
-
-    total_unique_errors = len(sorted_errors)
-    total_errors = sum(item['count'] for item in sorted_errors)
-
-    print(f"{translations.get('text_errors_total')} {total_errors}")
-    print(f"{translations.get('text_unique_errors_count')} {total_unique_errors}\n")
-
-    for i, error_data in enumerate(sorted_errors, 1):
-        print("-" * 80)
-        print(format_error_item_to_str(i, error_data, language_iso2))
+    sys.stdout.write(get_renderer(language_iso2).render_summary(aggregated_errors, top, top_order))
 
 def format_error_item_to_str(index, error_data, language):
-    with open(f"{os.environ.get('DIR_ROOT')}nes/i18n/{language}/format-error-item-to-str.json") as f:
-        translations = json.load(f)
-
-    result = f"{index} | {translations['text_error_type']}: {error_data['type']}\n"
-    result += f"{translations['text_count']}: {error_data['count']}\n"
-    result += f"{translations['text_message']}: {error_data['message']}\n"
-    if error_data['timestamps']:
-        result += f"{translations['text_first_timestamp']}: {error_data['timestamps'][0]}\n"
-        result += f"{translations['text_last_timestamp']}: {error_data['timestamps'][-1]}\n"
+    return get_renderer(language).render_error_item(index, error_data)
 
-    if error_data['stack_trace']:
-        result += "<StackTrace>\n"
-        result += error_data['stack_trace']
-        result += "\n</StackTrace>\n"
-
-    return result
+def format_past_analyses_to_str(payloads: list, language: str) -> str:
+    """
+    Formats past analyses of similar errors as a context block appended to the LLM prompt.
+    """
+    return get_renderer(language).render_past_analyses(payloads)
 
 def save_json_file(content, file_path):
+    """
+    Saves the content to a JSON file, dicts are written item by item without building the whole document in memory,
+    to a JSONL file (one item per line) if the file path ends with .jsonl.
+    """
+    if isinstance(content, dict):
+        if file_path.endswith('.jsonl'):
+            write_jsonl(content, file_path)
+        else:
+            write_json_dict(content, file_path)
+        return
+
     with open(file_path, 'w', encoding='utf-8') as f:
         f.write(json.dumps(content, indent=4))
\ No newline at end of file
@@ -0,0 +1,130 @@
+import threading
+from typing import Dict
+from nes.i18n.language import get_translations
+from nes.report import get_histogram_peak, get_top_groups
+
+# Renderers by language, created once per process
+_renderers: Dict[str, 'ErrorRenderer'] = {}
+_renderers_lock = threading.Lock()
+
+
+class ErrorRenderer(object):
+    """
+    Renders error items, log clusters, past analyses and the summary report of one language.
+
+    Labels are joined with their separators once in the constructor, rendering only concatenates
+    the prepared parts with the values, so the renderer is immutable and safe to share between threads.
+    """
+
+    def __init__(self, language: str):
+        self.language = language
+        item = get_translations(language, 'format-error-item-to-str')
+        summary = get_translations(language, 'print-summary')
+
+        self.error_type_prefix = f" | {item['text_error_type']}: "
+        self.count_prefix = f"{item['text_count']}: "
+        self.message_prefix = f"{item['text_message']}: "
+        self.first_timestamp_prefix = f"{item['text_first_timestamp']}: "
+        self.last_timestamp_prefix = f"{item['text_last_timestamp']}: "
+        self.files_prefix = f"{item['text_files']}: "
+        self.past_analyses_header = f"\n{item['text_past_analyses']}:\n"
+
+        # Summary keys fall back to the key itself like Language.get
+        self.empty_errors_line = summary.get('text_empty_errors', 'text_empty_errors') + "\n"
+        self.summary_header = "\n".join(["=" * 80, summary.get('text_anal_finished_results', 'text_anal_finished_results'), "=" * 80]) + "\n"
+        self.errors_total_prefix = summary.get('text_errors_total', 'text_errors_total') + " "
+        self.unique_errors_prefix = summary.get('text_unique_errors_count', 'text_unique_errors_count') + " "
+        self.top_shown_prefix = summary.get('text_top_shown', 'text_top_shown') + " "
+        self.histogram_peak_prefix = summary.get('text_histogram_peak', 'text_histogram_peak') + ": "
+        self.item_separator = "-" * 80 + "\n"
+
+    def render_error_item(self, index, error_data: dict) -> str:
+        parts = [
+            str(index), self.error_type_prefix, error_data['type'], "\n",
+            self.count_prefix, str(error_data['count']), "\n",
+            self.message_prefix, error_data['message'], "\n",
+        ]
+        first_timestamp = get_first_timestamp(error_data)
+        if first_timestamp:
+            parts += [self.first_timestamp_prefix, first_timestamp, "\n",
+                      self.last_timestamp_prefix, get_last_timestamp(error_data), "\n"]
+        if len(error_data.get('files') or {}) > 1:
+            parts += [self.files_prefix, str(len(error_data['files'])), "\n"]
+
+        if error_data['stack_trace']:
+            parts += ["<StackTrace>\n", error_data['stack_trace'], "\n</StackTrace>\n"]
+
+        return ''.join(parts)
+
+    def render_past_analyses(self, payloads: list) -> str:
+        parts = [self.past_analyses_header]
+        for payload in payloads:
+            parts += ["<PastAnalysis>\n", payload['error_text'], "\n---\n", payload['analysis'], "\n</PastAnalysis>\n"]
+
+        return ''.join(parts)
+
+    def render_log_cluster(self, cluster: dict) -> str:
+        parts = [cluster['line'].rstrip('\n'), "\n"]
+        if cluster['count'] > 1:
+            parts += [self.count_prefix, str(cluster['count']), "\n", self.message_prefix, cluster['template'], "\n"]
+            if cluster['first_timestamp']:
+                parts += [self.first_timestamp_prefix, cluster['first_timestamp'], "\n",
+                          self.last_timestamp_prefix, cluster['last_timestamp'], "\n"]
+
+        return ''.join(parts)
+
+    def render_summary(self, aggregated_errors: dict, top: int = 0, top_order: str = 'count') -> str:
+        """
+        Renders the whole report of print_summary, the most frequent (or severe, see get_top_groups) errors first.
+
+        Args:
+            aggregated_errors (dict): Error groups by their key.
+            top (int): Number of errors to render, 0 means all errors.
+            top_order (str): "count" or "severity".
+        """
+        if not aggregated_errors:
+            return self.empty_errors_line
+
+        total_errors = sum(item['count'] for item in aggregated_errors.values())
+        top_errors = get_top_groups(aggregated_errors, top, top_order)
+
+        parts = [
+            self.summary_header,
+            self.errors_total_prefix, str(total_errors), "\n",
+            self.unique_errors_prefix, str(len(aggregated_errors)), "\n\n",
+        ]
+        if len(top_errors) < len(aggregated_errors):
+            parts += [self.top_shown_prefix, str(len(top_errors)), "\n\n"]
+
+        for i, error_data in enumerate(top_errors, 1):
+            parts += [self.item_separator, self.render_error_item(i, error_data)]
+            if error_data.get('histogram'):
+                bucket, count = get_histogram_peak(error_data['histogram'])
+                parts += [self.histogram_peak_prefix, bucket, " (", str(count), ")\n"]
+            parts.append("\n")
+
+        return ''.join(parts)
+
+
+def get_renderer(language: str) -> ErrorRenderer:
+    renderer = _renderers.get(language)
+    if renderer is not None:
+        return renderer
+
+    with _renderers_lock:
+        if language not in _renderers:
+            _renderers[language] = ErrorRenderer(language)
+        return _renderers[language]
+
+
+def get_first_timestamp(error_data):
+    # Streaming parser keeps explicit first/last timestamps, classic parser keeps all of them
+    if error_data.get('first_timestamp'):
+        return error_data['first_timestamp']
+    return error_data['timestamps'][0] if error_data['timestamps'] else None
+
+
+def get_last_timestamp(error_data):
+    if error_data.get('last_timestamp'):
+        return error_data['last_timestamp']
+    return error_data['timestamps'][-1] if error_data['timestamps'] else None
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Errors of packed prompts, the prompt template itself contains <error id="..."> as an example
+ERROR_ID_REGEX = re.compile(r'<error id="([^"]+)">')
+
+LATENCY_DISTRIBUTIONS = ['fixed', 'uniform', 'exponential', 'lognormal']
+
+RESPONSE_WORDS = ['The', 'error', 'is', 'caused', 'by', 'an', 'unavailable', 'resource,', 'check', 'the', 'file',
+                  'permissions', 'and', 'the', 'configuration', 'of', 'the', 'module.']
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in of Ollama/OpenAI chat model for benchmarks and load tests: answers after a configurable latency
+    with a deterministic text of response_tokens words, streams them at tokens_per_second and reports
+    token usage like Ollama, so the whole processing path runs without a model.
+
+    Latency of a prompt is drawn from latency_distribution with a generator seeded by the prompt,
+    so the same prompt gets the same latency in every run regardless of the order of requests.
+    """
+
+    model: str = 'fake'
+    # Time to the first token, the median for lognormal distribution and the mean for the others
+    latency_seconds: float = 0.0
+    # One of LATENCY_DISTRIBUTIONS
+    latency_distribution: str = 'fixed'
+    # Relative spread of uniform distribution (latency * [1 - jitter, 1 + jitter]), sigma of lognormal distribution
+    latency_jitter: float = 0.5
+    # Generation speed, 0 means the whole response is generated at once
+    tokens_per_second: float = 0.0
+    response_tokens: int = 64
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat-model'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {'model': self.model, 'latency_seconds': self.latency_seconds, 'tokens_per_second': self.tokens_per_second}
+
+    def get_response_tokens(self, prompt: str) -> list:
+        # Packed prompts get one <analysis> section per error, so the processor splits the answer as usual
+        error_ids = [error_id for error_id in ERROR_ID_REGEX.findall(prompt) if error_id != '...']
+        digest = hashlib.md5(prompt.encode('utf-8')).hexdigest()[:8]
+        words = [RESPONSE_WORDS[idx % len(RESPONSE_WORDS)] for idx in range(self.response_tokens)]
+        if not error_ids:
+            return [f"[{digest}]"] + words
+
+        tokens = []
+        for error_id in error_ids:
+            tokens += [f'<analysis id="{error_id}">', f"[{digest}]"] + words + ['</analysis>\n']
+        return tokens
+
+    def get_latency(self, prompt: str) -> float:
+        if self.latency_seconds <= 0 or self.latency_distribution == 'fixed':
+            return max(self.latency_seconds, 0.0)
+
+        rnd = random.Random(f"{self.seed}|{prompt}")
+        if self.latency_distribution == 'uniform':
+            return self.latency_seconds * rnd.uniform(max(0.0, 1 - self.latency_jitter), 1 + self.latency_jitter)
+        if self.latency_distribution == 'exponential':
+            return rnd.expovariate(1 / self.latency_seconds)
+        if self.latency_distribution == 'lognormal':
+            return self.latency_seconds * rnd.lognormvariate(0, self.latency_jitter)
+
+        raise Exception(f"Unknown latency distribution {self.latency_distribution}, available: {', '.join(LATENCY_DISTRIBUTIONS)}")
+
+    def get_generation_seconds(self, tokens_count: int) -> float:
+        return tokens_count / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def create_message(self, prompt: str, tokens: list, latency: float) -> AIMessage:
+        return AIMessage(content=' '.join(tokens), usage_metadata=get_usage(prompt, tokens), response_metadata=self.get_response_metadata(tokens, latency))
+
+    def get_response_metadata(self, tokens: list, latency: float) -> dict:
+        # Ollama reports durations in nanoseconds
+        return {
+            'model': self.model,
+            'load_duration': 0,
+            'prompt_eval_duration': int(latency * 1e9),
+            'eval_duration': int(self.get_generation_seconds(len(tokens)) * 1e9),
+            'done_reason': 'stop',
+        }
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        prompt = get_prompt_text(messages)
+        tokens = self.get_response_tokens(prompt)
+        latency = self.get_latency(prompt)
+        time.sleep(latency + self.get_generation_seconds(len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=self.create_message(prompt, tokens, latency))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        prompt = get_prompt_text(messages)
+        tokens = self.get_response_tokens(prompt)
+        latency = self.get_latency(prompt)
+        await asyncio.sleep(latency + self.get_generation_seconds(len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=self.create_message(prompt, tokens, latency))])
+
+    def _stream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt = get_prompt_text(messages)
+        tokens = self.get_response_tokens(prompt)
+        latency = self.get_latency(prompt)
+        time.sleep(latency)
+        for chunk in iter_message_chunks(self.create_message(prompt, tokens, latency)):
+            time.sleep(self.get_generation_seconds(1))
+            yield chunk
+
+    async def _astream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                       run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        prompt = get_prompt_text(messages)
+        tokens = self.get_response_tokens(prompt)
+        latency = self.get_latency(prompt)
+        await asyncio.sleep(latency)
+        for chunk in iter_message_chunks(self.create_message(prompt, tokens, latency)):
+            await asyncio.sleep(self.get_generation_seconds(1))
+            yield chunk
+
+
+def iter_message_chunks(message: AIMessage) -> Iterator[ChatGenerationChunk]:
+    """
+    Splits the complete message into word chunks, usage and metadata come with the last chunk like in Ollama streams.
+    """
+    words = message.content.split(' ')
+    for idx, word in enumerate(words):
+        is_last = idx == len(words) - 1
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content=word if is_last else word + ' ',
+            usage_metadata=message.usage_metadata if is_last else None,
+            response_metadata=message.response_metadata if is_last else {},
+        ))
+
+
+def get_prompt_text(messages: list[BaseMessage]) -> str:
+    return "\n".join(message.content if isinstance(message.content, str) else str(message.content) for message in messages)
+
+
+def get_usage(prompt: str, tokens: list) -> dict:
+    # About 4 characters per token of the prompt, one token per generated word
+    input_tokens = max(1, len(prompt) // 4)
+    return {'input_tokens': input_tokens, 'output_tokens': len(tokens), 'total_tokens': input_tokens + len(tokens)}
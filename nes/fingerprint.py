@@ -0,0 +1,270 @@
+import operator
+import os
+import re
+import sys
+import xxhash
+
+# Absolute file path (not a part of URL or of a relative path) with the optional line number:
+# File.php(57) of stack frames, File.php:57 and "File.php on line 57" of messages.
+# The pattern starts with the slash, so the regex engine quickly skips to the next slash
+PATH_PATTERN = r"/(?<![\w:/.]/)(?P<path>[^\s:()'\"]+)(?P<line>\(\d+\)|:\d+\b| on line \d+)?"
+
+HEX_CHARS = '0123456789abcdefABCDEF'
+
+# Masks of IDs: name -> (first character, pattern of the rest, replacement), every ID is a whole word.
+# The first character is matched separately, so the regex engine tries only positions starting with it
+ID_MASKS = {
+    'uuid': (f'[{HEX_CHARS}]', f'[{HEX_CHARS}]{{7}}-[{HEX_CHARS}]{{4}}-[{HEX_CHARS}]{{4}}-[{HEX_CHARS}]{{4}}-[{HEX_CHARS}]{{12}}', '<UUID>'),
+    'ip': ('[0-9]', r'\d{0,2}(?:\.\d{1,3}){3}', '<IP>'),
+    'hex': (f'[{HEX_CHARS}]', f'(?<=0)x[{HEX_CHARS}]{{16,}}|[{HEX_CHARS}]{{15,}}', '<HEX>'),
+    'number': ('[0-9]', r'\d{2,}', '<N>'),
+}
+
+# Names of normalization rules that can be disabled: site-specific part of paths, line numbers and ID masks
+FINGERPRINT_RULES = ['path', 'line'] + list(ID_MASKS)
+
+DEFAULT_PATH_DEPTH = 3
+
+# Paths, IDs and line numbers can't contain spaces, text is normalized the same in parts split at this separator
+LOCATION_SEPARATOR = ' in /'
+
+# Entries, stack traces, messages and file paths of a log repeat a lot, their fingerprints and normalized texts
+# are reused until their cache is full
+FINGERPRINT_CACHE_SIZE = 65536
+
+# Text is checked for IDs starting with a letter only if it has a run of hex characters as long as the shortest of them
+LETTER_ID_MIN_LENGTH = 8
+HEX_RUN_TABLE = bytes.maketrans(HEX_CHARS.encode('ascii'), b'h' * len(HEX_CHARS))
+
+# Normalization treats all digits alike (except "0" of "0x" hex numbers) and keeps or drops whole numbers, so messages
+# differing only in digits have the same normalized text if it has no digits, and messages differing only
+# in numbers of 3 or more digits have the same normalized text if it has no such numbers.
+# The shape of a message is its UTF-8 bytes with every digit replaced by 0, the values of shorter numbers
+# are added to it if they are kept
+DIGITS = b'0123456789'
+DIGIT_SHAPE_TABLE = bytes.maketrans(DIGITS, b'0' * len(DIGITS))
+SHORT_NUMBER_REGEX = re.compile(rb'0(?<!00)0?(?!0)')
+DIGIT_REGEX = re.compile('[0-9]')
+LONG_NUMBER_REGEX = re.compile('[0-9]{3}')
+
+_default_fingerprinter = None
+
+
+class Fingerprinter(object):
+    """
+    Computes grouping keys of NES/OpenCart (PHP) errors.
+
+    Line numbers and the site-specific part of file paths are removed and IDs are masked, but stack frames keep
+    their file and called function, so the same error of several stores (or after a deploy) has the same key
+    while different errors with similar traces are not merged.
+    """
+
+    def __init__(self, path_depth: int = DEFAULT_PATH_DEPTH, disabled_rules: list = None):
+        """
+        Args:
+            path_depth (int): How many last components of file paths are kept, 0 keeps the whole path.
+            disabled_rules (list): Names of FINGERPRINT_RULES that are not applied.
+        """
+        disabled_rules = set(disabled_rules or [])
+        unknown_rules = disabled_rules - set(FINGERPRINT_RULES)
+        if unknown_rules:
+            raise Exception(f"Unknown fingerprint rules {', '.join(sorted(unknown_rules))}, available: {', '.join(FINGERPRINT_RULES)}")
+
+        self.path_depth = path_depth if 'path' not in disabled_rules else 0
+        self.is_line_kept = 'line' in disabled_rules
+        is_path_normalized = self.path_depth > 0 or not self.is_line_kept
+        self.path_regex = re.compile(PATH_PATTERN) if is_path_normalized else None
+
+        # Paths, IDs starting with a letter and IDs starting with a digit are replaced in separate passes,
+        # a pass starting with a character class is much faster than a single pass over alternatives.
+        # IDs starting with a letter go first, IDs starting with a digit can't start inside them
+        masks = [name for name in ID_MASKS if name not in disabled_rules]
+        self.mask_replacements = {name: ID_MASKS[name][2] for name in masks}
+        self.letter_id_regex = self.compile_id_regex('[a-fA-F]', [name for name in masks if ID_MASKS[name][0] != '[0-9]'])
+        digit_alternatives = []
+        if 'number' in masks:
+            # Most IDs are plain numbers, a run of 3-15 digits which is not followed by "." or "-"
+            # can't be an IP, UUID or a long hex number
+            digit_alternatives.append(r'(?P<plain_number>\d{2,14}\b(?![.-]))')
+            self.mask_replacements['plain_number'] = ID_MASKS['number'][2]
+        self.digit_id_regex = self.compile_id_regex('[0-9]', masks, digit_alternatives)
+
+        self._cache = {}
+        self._text_cache = {}
+        self._path_cache = {}
+        self._shape_cache = {}
+        self._key_cache = {}
+
+    @staticmethod
+    def compile_id_regex(first_char: str, masks: list, alternatives: list = None) -> re.Pattern | None:
+        alternatives = list(alternatives or []) + [f'(?P<{name}>(?:{ID_MASKS[name][1]})\\b)' for name in masks]
+        if not alternatives:
+            return None
+        # The lookbehind makes the first character the start of a word
+        return re.compile(f'{first_char}(?<!\\w{first_char})(?:' + '|'.join(alternatives) + ')')
+
+    @classmethod
+    def from_env(cls):
+        """
+        Creates fingerprinter from FINGERPRINT_PATH_DEPTH and FINGERPRINT_DISABLED_RULES (comma-separated names).
+        """
+        path_depth = os.environ.get('FINGERPRINT_PATH_DEPTH')
+        disabled_rules = [name.strip() for name in (os.environ.get('FINGERPRINT_DISABLED_RULES') or '').split(',') if name.strip()]
+        return cls(int(path_depth) if path_depth else DEFAULT_PATH_DEPTH, disabled_rules)
+
+    def replace_path(self, match: re.Match) -> str:
+        # Frames of different traces and messages of different entries point to the same files
+        path = self._path_cache.get(match.group(0))
+        if path is not None:
+            return path
+
+        path = '/' + match.group('path')
+        if self.path_depth > 0:
+            path = '/'.join(path.rsplit('/', self.path_depth)[1:])
+        if self.is_line_kept and match.group('line'):
+            path += match.group('line')
+
+        if len(self._path_cache) >= FINGERPRINT_CACHE_SIZE:
+            self._path_cache.clear()
+        self._path_cache[match.group(0)] = path
+        return path
+
+    def replace_id(self, match: re.Match) -> str:
+        return self.mask_replacements[match.lastgroup]
+
+    def normalize(self, text: str) -> str:
+        # Traces of the same error repeat with different messages and frames repeat in different traces,
+        # every distinct trace, frame and error location is normalized once
+        normalized_text = self._text_cache.get(text)
+        if normalized_text is not None:
+            return normalized_text
+
+        if '\n' in text:
+            normalized_text = self.normalize_lines(text.split('\n'))
+        else:
+            # Messages end with the location of the error, usually the same for messages with different IDs
+            # or differing in the line number only
+            head, separator, location = text.rpartition(LOCATION_SEPARATOR)
+            if separator:
+                normalized_text = self.apply_rules(head) + ' in ' + self.normalize_message('/' + location)
+            else:
+                normalized_text = self.apply_rules(text)
+
+        if len(self._text_cache) >= FINGERPRINT_CACHE_SIZE:
+            self._text_cache.clear()
+        self._text_cache[text] = normalized_text
+        return normalized_text
+
+    def normalize_lines(self, lines: list) -> str:
+        # Lines are looked up before the regex passes, the passes run once over all new lines
+        normalized_lines = [self._text_cache.get(line) for line in lines]
+        new_lines = [line for line, normalized_line in zip(lines, normalized_lines) if normalized_line is None]
+        if new_lines:
+            if len(self._text_cache) + len(new_lines) >= FINGERPRINT_CACHE_SIZE:
+                self._text_cache.clear()
+            new_normalized_lines = self.apply_rules('\n'.join(new_lines)).split('\n')
+            self._text_cache.update(zip(new_lines, new_normalized_lines))
+            new_normalized_lines = iter(new_normalized_lines)
+            normalized_lines = [normalized_line if normalized_line is not None else next(new_normalized_lines) for normalized_line in normalized_lines]
+        return '\n'.join(normalized_lines)
+
+    def normalize_message(self, text: str) -> str:
+        # Most messages are unique because of IDs, they are looked up by the shape before the regex passes.
+        # The shape cache maps the digit shape to the normalized text or, if short numbers are kept in it,
+        # to the getter of their values, and the digit shape with the values to the normalized text
+        data = text.encode('utf-8', 'surrogatepass')
+        digits_shape = data.translate(DIGIT_SHAPE_TABLE)
+        cached = self._shape_cache.get(digits_shape)
+        if isinstance(cached, str):
+            return cached
+        get_short_numbers = cached
+        if get_short_numbers is not None:
+            normalized_text = self._shape_cache.get((digits_shape, get_short_numbers(data)))
+            if normalized_text is not None:
+                return normalized_text
+
+        normalized_text = self.normalize(text)
+        if len(self._shape_cache) >= FINGERPRINT_CACHE_SIZE:
+            self._shape_cache.clear()
+            get_short_numbers = None
+        if b'0x' not in digits_shape and not DIGIT_REGEX.search(normalized_text):
+            self._shape_cache[digits_shape] = normalized_text
+        elif not LONG_NUMBER_REGEX.search(normalized_text):
+            if get_short_numbers is None:
+                positions = [slice(*match.span()) for match in SHORT_NUMBER_REGEX.finditer(digits_shape)]
+                get_short_numbers = operator.itemgetter(*positions or [slice(0, 0)])
+                self._shape_cache[digits_shape] = get_short_numbers
+            self._shape_cache[(digits_shape, get_short_numbers(data))] = normalized_text
+        return normalized_text
+
+    def apply_rules(self, text: str) -> str:
+        normalized_text = text
+        if self.path_regex is not None and '/' in normalized_text:
+            normalized_text = self.path_regex.sub(self.replace_path, normalized_text)
+        # Translating to bytes and searching a run of hex characters is much cheaper than the letter ID pass
+        if self.letter_id_regex is not None and b'h' * LETTER_ID_MIN_LENGTH in normalized_text.encode('utf-8', 'replace').translate(HEX_RUN_TABLE):
+            normalized_text = self.letter_id_regex.sub(self.replace_id, normalized_text)
+        if self.digit_id_regex is not None:
+            normalized_text = self.digit_id_regex.sub(self.replace_id, normalized_text)
+        return normalized_text
+
+    def fingerprint(self, error_type: str, message_and_trace: str) -> tuple:
+        """
+        Args:
+            error_type (str): Error type, e.g. "PHP Fatal error".
+            message_and_trace (str): Stripped error message with the optional "Stack trace:" part.
+
+        Returns:
+            tuple: (unique_key, error_type, error_message, stack_trace), strings of repeated errors are shared.
+        """
+        cache_key = (error_type, message_and_trace)
+        result = self._cache.get(cache_key)
+        if result is not None:
+            return result
+
+        error_message, separator, stack_trace = message_and_trace.partition('Stack trace:')
+        if separator:
+            error_message = error_message.strip()
+            stack_trace = separator + stack_trace.strip()
+        else:
+            stack_trace = None
+
+        # Normalized texts are cached objects with cached hashes, looking up the key is cheaper than hashing them
+        normalized_error = (error_type, self.normalize_message(error_message), self.normalize(stack_trace) if stack_trace else '')
+        unique_key = self._key_cache.get(normalized_error)
+        if unique_key is None:
+            unique_key = sys.intern(hash_text('|'.join(normalized_error)))
+            if len(self._key_cache) >= FINGERPRINT_CACHE_SIZE:
+                self._key_cache.clear()
+            self._key_cache[normalized_error] = unique_key
+
+        # Messages are mostly unique, only the key and the type are shared by the groups
+        result = (unique_key, sys.intern(error_type), error_message, stack_trace)
+        if len(self._cache) >= FINGERPRINT_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[cache_key] = result
+        return result
+
+
+    def get_trace_key(self, stack_trace: str | None) -> str:
+        """
+        Returns hash of the normalized stack trace (the trace part of the fingerprint), empty string for errors without trace.
+        """
+        return hash_text(self.normalize(stack_trace)) if stack_trace else ''
+
+
+def hash_text(text: str) -> str:
+    """
+    128-bit xxh3 hex digest of the text, keys are the same in every environment (checkpoints, journals and caches keep them).
+    """
+    return xxhash.xxh3_128_hexdigest(text.encode('utf-8'))
+
+
+def get_fingerprinter() -> Fingerprinter:
+    """
+    Fingerprinter of the parser, configured from environment on the first use (also in parser processes).
+    """
+    global _default_fingerprinter
+    if _default_fingerprinter is None:
+        _default_fingerprinter = Fingerprinter.from_env()
+    return _default_fingerprinter
@@ -1,12 +1,17 @@
 import logging
-import torch
 import os
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
-import nvidia_smi
 import math
+import re
+from typing import TYPE_CHECKING
+from nes.hardware import load_hardware_profile, save_hardware_profile, derive_ollama_params, calibrate_ollama_params, get_gpus
+
+# Heavy backends (torch, NVML, LLM clients) are imported only by functions that need them, to keep startup fast
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+    from langchain_ollama import ChatOllama
 
 def torch_info():
+    import torch
     logging.info(f"PyTorch version: {torch.__version__}")
     logging.info(f"CUDA available: {torch.cuda.is_available()}")
     if torch.cuda.is_available():
@@ -16,6 +21,7 @@ def torch_info():
 
 
 def get_cuda_devices_for_llm_inference() -> None | int:
+    import torch
     if torch.cuda.is_available():
         return torch.cuda.device_count()
 
@@ -24,37 +30,50 @@ def get_cuda_devices_for_llm_inference() -> None | int:
 def bytes_to_megabytes(bytes):
     return bytes / 1024 / 1024
 
-def get_nvidia_free_gpu_memory_bytes(gpu_idx = 0):
-    nvidia_smi.nvmlInit()
-
-    handle = nvidia_smi.nvmlDeviceGetHandleByIndex(gpu_idx)
-
-    info = nvidia_smi.nvmlDeviceGetMemoryInfo(handle)
-    free_mem = info.free
-    nvidia_smi.nvmlShutdown()
-
-    return free_mem
-
 def get_logical_cpu_cores() -> int:
     cpu_logical_cores_count = os.cpu_count()
     logging.debug(f'CPU logical cores count: {cpu_logical_cores_count}')
     return cpu_logical_cores_count
 
-def get_max_available_physical_cpu_cores() -> None | int:
-    cpu_logical_cores_count = get_logical_cpu_cores()
-    if cpu_logical_cores_count:
-        cpu_cores_count = round(cpu_logical_cores_count / 2) - 1
-        logging.debug(f'CPU cores count: {cpu_cores_count}')
-        return cpu_cores_count
+def get_hardware_profile_path() -> str:
+    return os.environ.get("HARDWARE_PROFILE_PATH") or f"{os.environ.get('DIR_ROOT')}/cache/hardware-profile.json"
 
-    return None
+def get_hardware_profile(is_refresh: bool = False) -> dict:
+    return load_hardware_profile(get_hardware_profile_path(),
+                                 ttl_seconds=int(os.environ.get("HARDWARE_PROFILE_TTL_SECONDS") or 24 * 3600),
+                                 is_refresh=is_refresh)
+
+def get_configured_llm_model(override_llm_model: str = '') -> str:
+    """
+    Returns the name of the model init_llm will use, without importing LLM clients.
+    """
+    if len(override_llm_model) > 0:
+        return override_llm_model
+
+    if bool(os.environ.get("IS_LOCAL_OLLAMA_PREFERRED")):
+        return os.environ.get("LOCAL_OLLAMA_MODEL_CODER") or ''
+
+    return os.environ.get("OPENAI_MODEL") or ''
+
+def calibrate_ollama(override_llm_model: str = '') -> dict:
+    """
+    Probes the host again and measures tokens/sec of the configured Ollama model with several num_thread/num_batch values,
+    the best values are stored in the hardware profile and used by init_llm.
+    """
+    from langchain_ollama import ChatOllama
 
-def get_approximated_ai_layers_count(default_ai_layer_size = 1200):
-    free_mem = bytes_to_megabytes(get_nvidia_free_gpu_memory_bytes())
-    apx_ai_layer_size = math.floor(free_mem / default_ai_layer_size)
-    return apx_ai_layer_size
+    model = get_configured_llm_model(override_llm_model)
+    hardware_profile = get_hardware_profile(is_refresh=True)
+    num_ctx = derive_ollama_params(hardware_profile, model, int(os.environ.get("LOCAL_OLLAMA_MODEL_CODER_NUM_CTX") or 16000))['num_ctx']
 
-def init_llm(override_llm_model: str = '', override_max_tokens: int = 0, is_predict_ai_layers: bool = False) -> ChatOllama | ChatOpenAI:
+    def create_llm(num_thread: int, num_batch: int):
+        return ChatOllama(model=model, temperature=0, num_ctx=num_ctx, num_predict=128, num_thread=num_thread, num_batch=num_batch)
+
+    result = calibrate_ollama_params(hardware_profile, model, create_llm)
+    save_hardware_profile(hardware_profile, get_hardware_profile_path())
+    return result
+
+def init_llm(override_llm_model: str = '', override_max_tokens: int = 0, is_predict_ai_layers: bool = False) -> 'ChatOllama | ChatOpenAI':
     llm = None
     is_local_ollama_preferred = False
     if bool(os.environ.get("IS_LOCAL_OLLAMA_PREFERRED")):
@@ -62,9 +81,8 @@ def init_llm(override_llm_model: str = '', override_max_tokens: int = 0, is_pred
 
     if is_local_ollama_preferred and os.environ.get("LOCAL_OLLAMA_MODEL_CODER"):
         model = os.environ.get("LOCAL_OLLAMA_MODEL_CODER")
-        num_ctx = (os.environ.get("LOCAL_OLLAMA_MODEL_CODER_NUM_CTX") or 16000)
+        num_ctx = int(os.environ.get("LOCAL_OLLAMA_MODEL_CODER_NUM_CTX") or 16000)
         num_predict = (os.environ.get("LOCAL_OLLAMA_NUM_PREDICT") or -1)
-        max_cpu_cores = get_logical_cpu_cores() - 4 if bool(os.environ.get("IS_LOCAL_OLLAMA_MAX_PERFORMANCE")) else get_logical_cpu_cores() / 2
 
         if len(override_llm_model) > 0:
             model = override_llm_model
@@ -72,21 +90,29 @@ def init_llm(override_llm_model: str = '', override_max_tokens: int = 0, is_pred
         if override_max_tokens != 0:
             num_predict = override_max_tokens
 
+        hardware_profile = get_hardware_profile()
+        if is_predict_ai_layers:
+            torch_info()
+            # Free GPU memory changes between runs, so it is read again (single NVML initialization for all GPUs)
+            hardware_profile['gpus'] = get_gpus()
+
+        # num_thread, num_ctx, num_batch and num_gpu are derived from the cached hardware profile and the model size,
+        # calibrated values (main.py --calibrate) win over the derived ones
+        tuned_params = derive_ollama_params(hardware_profile, model, num_ctx,
+                                            is_max_performance=bool(os.environ.get("IS_LOCAL_OLLAMA_MAX_PERFORMANCE")),
+                                            is_gpu_offload=is_predict_ai_layers)
+        save_hardware_profile(hardware_profile, get_hardware_profile_path())
+
         ollama_params = {
             "model": model,
             "temperature": 0,
-            "num_ctx": num_ctx,
             "num_predict": num_predict,
-            "num_thread": max_cpu_cores,
+            **tuned_params,
         }
 
-        if is_predict_ai_layers:
-            # num_gpu = get_cuda_devices_for_llm_inference()
-            num_gpu = get_approximated_ai_layers_count()
-            ollama_params["num_gpu"] = num_gpu
-
         logging.info(f"Current Ollama settings: {str(ollama_params)}", )
 
+        from langchain_ollama import ChatOllama
         llm = ChatOllama(**ollama_params)
 
     openai_api_key = os.environ.get("OPENAI_API_KEY")
@@ -105,6 +131,7 @@ def init_llm(override_llm_model: str = '', override_max_tokens: int = 0, is_pred
         #     openai_params['max_tokens'] = override_max_tokens
 
         logging.info(f"Current OpenAI settings: {str(openai_params)}", )
+        from langchain_openai import ChatOpenAI
         llm = ChatOpenAI(**openai_params)
 
     if llm is None:
@@ -112,19 +139,58 @@ def init_llm(override_llm_model: str = '', override_max_tokens: int = 0, is_pred
 
     return llm
 
-def simple_error_detector(line: str) -> bool:
-    error_markers = [
-        'WARNING',
-        'ERROR',
-        'CRITICAL',
-        'EMERGENCY',
-    ]
+# live is the configured Ollama/OpenAI model, record saves its prompts and responses, replay answers with saved responses
+# without a model, synthetic answers with generated text after a simulated latency
+LLM_BACKENDS = ['live', 'record', 'replay', 'synthetic']
+
+def get_llm_recordings_path() -> str:
+    return os.environ.get("LLM_RECORDINGS_PATH") or f"{os.environ.get('DIR_ROOT')}/cache/llm-recordings.jsonl"
+
+def init_llm_backend(backend: str = 'live', override_llm_model: str = '', override_max_tokens: int = 0,
+                     is_predict_ai_layers: bool = False, recordings_path: str = ''):
+    """
+    Creates the LLM of one of LLM_BACKENDS, test backends import only langchain_core.
+    """
+    if backend in ('', 'live'):
+        return init_llm(override_llm_model, override_max_tokens, is_predict_ai_layers)
+
+    recordings_path = recordings_path or get_llm_recordings_path()
+    if backend == 'record':
+        from nes.llm_backends import RecordingChatModel
+        os.makedirs(os.path.dirname(os.path.abspath(recordings_path)), exist_ok=True)
+        llm = init_llm(override_llm_model, override_max_tokens, is_predict_ai_layers)
+        logging.info(f"Recording LLM prompts and responses to {recordings_path}")
+        return RecordingChatModel(llm=llm, recordings_path=recordings_path, model=get_configured_llm_model(override_llm_model))
+
+    if backend == 'replay':
+        from nes.llm_backends import ReplayChatModel
+        return ReplayChatModel.from_file(recordings_path, speed=float(os.environ.get("LLM_REPLAY_SPEED") or 0))
+
+    if backend == 'synthetic':
+        from nes.fake_llm import FakeChatModel
+        synthetic_params = {
+            "model": 'synthetic',
+            "latency_seconds": float(os.environ.get("LLM_SYNTHETIC_LATENCY_SECONDS") or 0.2),
+            "latency_distribution": os.environ.get("LLM_SYNTHETIC_LATENCY_DISTRIBUTION") or 'lognormal',
+            "latency_jitter": float(os.environ.get("LLM_SYNTHETIC_LATENCY_JITTER") or 0.5),
+            "tokens_per_second": float(os.environ.get("LLM_SYNTHETIC_TOKENS_PER_SECOND") or 0),
+            "response_tokens": int(os.environ.get("LLM_SYNTHETIC_RESPONSE_TOKENS") or 64),
+            "seed": int(os.environ.get("LLM_SYNTHETIC_SEED") or 0),
+        }
+        logging.info(f"Current synthetic LLM settings: {str(synthetic_params)}")
+        return FakeChatModel(**synthetic_params)
 
-    for marker in error_markers:
-        if line.find(marker) >= 0:
-            return True
+    raise Exception(f"Unknown LLM backend {backend}, available: {', '.join(LLM_BACKENDS)}")
 
-        if line.find(marker.lower()) >= 0:
-            return True
+ERROR_MARKERS = [
+    'WARNING',
+    'ERROR',
+    'CRITICAL',
+    'EMERGENCY',
+]
 
-    return False
\ No newline at end of file
+# Upper and lower case variants of the error markers in one precompiled expression
+ERROR_MARKERS_REGEX = re.compile('|'.join(ERROR_MARKERS + [marker.lower() for marker in ERROR_MARKERS]))
+
+def simple_error_detector(line: str) -> bool:
+    return ERROR_MARKERS_REGEX.search(line) is not None
\ No newline at end of file
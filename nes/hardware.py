@@ -0,0 +1,400 @@
+import glob
+import json
+import logging
+import math
+import os
+import socket
+import time
+
+# Version of the cached profile structure, profiles of other versions are probed again
+HARDWARE_PROFILE_VERSION = 1
+
+# Used when Ollama does not report model layers, the old fixed estimate of a quantized 30B model layer
+DEFAULT_AI_LAYER_SIZE_MB = 1200
+
+# VRAM kept free on every GPU for CUDA context and compute buffers
+GPU_RESERVED_MB = 768
+
+# Approximate KV cache size of one context token, f16 cache of a 30B model with grouped query attention
+KV_CACHE_BYTES_PER_TOKEN = 128 * 1024
+
+MIN_NUM_CTX = 2048
+
+DEFAULT_OLLAMA_HOST = 'http://localhost:11434'
+
+CALIBRATION_PROMPT = "Explain in three sentences what a PHP Fatal error \"Allowed memory size exhausted\" means."
+
+
+def read_text_file(file_path: str) -> str | None:
+    try:
+        with open(file_path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def get_physical_cpu_cores() -> int | None:
+    """
+    Counts unique (physical id, core id) pairs of /proc/cpuinfo, hyper-threads share a core.
+    """
+    cpuinfo = read_text_file('/proc/cpuinfo')
+    if not cpuinfo:
+        return None
+
+    cores = set()
+    for processor in cpuinfo.split('\n\n'):
+        fields = {}
+        for line in processor.splitlines():
+            name, _, value = line.partition(':')
+            fields[name.strip()] = value.strip()
+        if 'core id' in fields:
+            cores.add((fields.get('physical id', '0'), fields['core id']))
+
+    return len(cores) or None
+
+
+def get_cgroup_cpu_limit() -> float | None:
+    """
+    Returns the container CPU quota in cores (cgroup v2 cpu.max or v1 cfs quota), None if not limited.
+    """
+    cpu_max = read_text_file('/sys/fs/cgroup/cpu.max')
+    if cpu_max:
+        quota, _, period = cpu_max.strip().partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+
+    quota = read_text_file('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period = read_text_file('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+
+    return None
+
+
+def get_affinity_cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_numa_nodes_count() -> int:
+    return len(glob.glob('/sys/devices/system/node/node[0-9]*')) or 1
+
+
+def get_memory_mb() -> tuple:
+    """
+    Returns:
+        tuple: (total, available) memory in megabytes, limited by the cgroup memory limit.
+    """
+    meminfo = {}
+    for line in (read_text_file('/proc/meminfo') or '').splitlines():
+        name, _, value = line.partition(':')
+        meminfo[name] = int(value.split()[0]) / 1024 if value.split() else 0
+
+    total_mb = meminfo.get('MemTotal', 0)
+    available_mb = meminfo.get('MemAvailable', total_mb)
+
+    memory_limit = (read_text_file('/sys/fs/cgroup/memory.max') or read_text_file('/sys/fs/cgroup/memory/memory.limit_in_bytes') or '').strip()
+    if memory_limit.isdigit():
+        limit_mb = int(memory_limit) / 1024 / 1024
+        # cgroup v1 reports a huge number when not limited
+        if limit_mb < total_mb:
+            total_mb = limit_mb
+            available_mb = min(available_mb, limit_mb)
+
+    return round(total_mb), round(available_mb)
+
+
+def get_gpus() -> list:
+    """
+    Lists NVIDIA GPUs with a single NVML initialization, empty list on CPU-only hosts.
+    """
+    try:
+        import nvidia_smi
+        nvidia_smi.nvmlInit()
+    except Exception as e:
+        logging.debug(f"NVML is not available, CPU-only profile: {e}")
+        return []
+
+    gpus = []
+    try:
+        for gpu_idx in range(nvidia_smi.nvmlDeviceGetCount()):
+            handle = nvidia_smi.nvmlDeviceGetHandleByIndex(gpu_idx)
+            info = nvidia_smi.nvmlDeviceGetMemoryInfo(handle)
+            name = nvidia_smi.nvmlDeviceGetName(handle)
+            gpus.append({
+                'index': gpu_idx,
+                'name': name.decode('utf-8') if isinstance(name, bytes) else str(name),
+                'total_mb': round(info.total / 1024 / 1024),
+                'free_mb': round(info.free / 1024 / 1024),
+            })
+    except Exception as e:
+        logging.warning(f"Failed to read GPU info: {e}")
+    finally:
+        nvidia_smi.nvmlShutdown()
+
+    return gpus
+
+
+def get_host_fingerprint() -> dict:
+    """
+    Cheap facts that invalidate the cached profile when the process runs on another host or with other container limits.
+    """
+    return {
+        'hostname': socket.gethostname(),
+        'logical_cores': os.cpu_count(),
+        'affinity_cores': get_affinity_cpu_count(),
+        'cgroup_cpu_limit': get_cgroup_cpu_limit(),
+    }
+
+
+def probe_hardware() -> dict:
+    fingerprint = get_host_fingerprint()
+    total_memory_mb, available_memory_mb = get_memory_mb()
+    return {
+        'version': HARDWARE_PROFILE_VERSION,
+        'probed_at': time.time(),
+        'fingerprint': fingerprint,
+        'physical_cores': get_physical_cpu_cores() or fingerprint['logical_cores'],
+        'numa_nodes': get_numa_nodes_count(),
+        'total_memory_mb': total_memory_mb,
+        'available_memory_mb': available_memory_mb,
+        'gpus': get_gpus(),
+        'models': {},
+        'calibration': {},
+    }
+
+
+def load_hardware_profile(profile_path: str, ttl_seconds: int = 24 * 3600, is_refresh: bool = False) -> dict:
+    """
+    Loads the cached hardware profile or probes the host and caches the new profile.
+
+    Args:
+        profile_path (str): Path to the JSON profile.
+        ttl_seconds (int): How long the probed profile is valid, calibration results are kept on re-probe.
+        is_refresh (bool): Probe the host even if the cached profile is valid.
+
+    Returns:
+        dict: Hardware profile.
+    """
+    cached_profile = None
+    profile_text = read_text_file(profile_path)
+    if profile_text:
+        try:
+            cached_profile = json.loads(profile_text)
+        except ValueError:
+            logging.warning(f"Hardware profile {profile_path} is corrupted, probing again")
+
+    if cached_profile and not is_refresh and cached_profile.get('version') == HARDWARE_PROFILE_VERSION \
+            and cached_profile.get('fingerprint') == get_host_fingerprint() \
+            and time.time() - cached_profile.get('probed_at', 0) < ttl_seconds:
+        return cached_profile
+
+    profile = probe_hardware()
+    if cached_profile and cached_profile.get('fingerprint') == profile['fingerprint']:
+        profile['models'] = cached_profile.get('models', {})
+        profile['calibration'] = cached_profile.get('calibration', {})
+
+    logging.info(f"Hardware profile: {profile['physical_cores']} physical cores, {profile['fingerprint']['affinity_cores']} CPUs available, "
+                 f"CPU limit {profile['fingerprint']['cgroup_cpu_limit']}, {profile['total_memory_mb']} MB RAM, {len(profile['gpus'])} GPUs")
+    save_hardware_profile(profile, profile_path)
+    return profile
+
+
+def save_hardware_profile(profile: dict, profile_path: str):
+    profile_dir = os.path.dirname(profile_path)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    tmp_path = f"{profile_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, profile_path)
+
+
+def get_available_physical_cores(profile: dict) -> int:
+    """
+    Physical cores the process may really use: limited by CPU affinity and cgroup quota.
+    Ollama runs best with one thread per physical core, hyper-threads only add contention.
+    """
+    threads_per_core = max(1, round(profile['fingerprint']['logical_cores'] / max(1, profile['physical_cores'])))
+    return max(1, get_available_logical_cores(profile) // threads_per_core)
+
+
+def get_available_logical_cores(profile: dict) -> int:
+    """
+    Logical cores the process may use: limited by CPU affinity and cgroup quota.
+    """
+    fingerprint = profile['fingerprint']
+    cpu_budget = fingerprint['affinity_cores']
+    if fingerprint['cgroup_cpu_limit']:
+        cpu_budget = min(cpu_budget, math.floor(fingerprint['cgroup_cpu_limit']))
+
+    return max(1, cpu_budget)
+
+
+def get_ollama_model_info(model: str, ollama_host: str = '', timeout: float = 3.0) -> dict | None:
+    """
+    Asks Ollama for the model size and number of layers.
+
+    Returns:
+        dict: {'size_mb', 'layers'}, None if Ollama is not reachable or the model is not pulled.
+    """
+    import urllib.request
+
+    base_url = (ollama_host or os.environ.get('OLLAMA_HOST') or DEFAULT_OLLAMA_HOST).rstrip('/')
+    if not base_url.startswith('http'):
+        base_url = f"http://{base_url}"
+
+    try:
+        with urllib.request.urlopen(f"{base_url}/api/tags", timeout=timeout) as response:
+            models = json.load(response).get('models', [])
+        size = next((item['size'] for item in models if item.get('name') == model or item.get('model') == model), None)
+
+        request = urllib.request.Request(f"{base_url}/api/show", data=json.dumps({'model': model}).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            model_info = json.load(response).get('model_info', {})
+        layers = next((value for name, value in model_info.items() if name.endswith('.block_count')), None)
+    except Exception as e:
+        logging.debug(f"Ollama model info of {model} is not available: {e}")
+        return None
+
+    if not size or not layers:
+        return None
+
+    return {'size_mb': round(size / 1024 / 1024), 'layers': int(layers)}
+
+
+def get_model_info(profile: dict, model: str) -> dict | None:
+    # Model size and layers do not change, so they are cached in the profile
+    if model not in profile['models']:
+        model_info = get_ollama_model_info(model)
+        if model_info is None:
+            return None
+        profile['models'][model] = model_info
+
+    return profile['models'][model]
+
+
+def get_gpu_layers_count(profile: dict, model_info: dict | None) -> int:
+    """
+    Number of model layers that fit into the free memory of all GPUs.
+    """
+    free_mb = sum(max(0, gpu['free_mb'] - GPU_RESERVED_MB) for gpu in profile['gpus'])
+    if free_mb <= 0:
+        return 0
+
+    if model_info is None:
+        return math.floor(free_mb / DEFAULT_AI_LAYER_SIZE_MB)
+
+    layer_size_mb = model_info['size_mb'] / model_info['layers']
+    return min(model_info['layers'], math.floor(free_mb / layer_size_mb))
+
+
+def derive_ollama_params(profile: dict, model: str, num_ctx: int, is_max_performance: bool = True, is_gpu_offload: bool = False) -> dict:
+    """
+    Derives Ollama runtime parameters from the hardware profile and the model size.
+
+    Args:
+        profile (dict): Hardware profile.
+        model (str): Ollama model name.
+        num_ctx (int): Configured context window, used as the upper limit.
+        is_max_performance (bool): Use all available physical cores, otherwise half of the logical cores.
+        is_gpu_offload (bool): Predict num_gpu (number of layers offloaded to GPUs).
+
+    Returns:
+        dict: num_thread, num_ctx, num_batch and optionally num_gpu.
+    """
+    physical_cores = get_available_physical_cores(profile)
+    num_thread = physical_cores if is_max_performance else max(1, get_available_logical_cores(profile) // 2)
+    model_info = get_model_info(profile, model)
+
+    params = {
+        'num_thread': num_thread,
+        'num_ctx': num_ctx,
+        # Larger batches speed up prompt processing on GPU, on CPU they only add memory pressure
+        'num_batch': 512 if profile['gpus'] else min(512, max(64, 32 * num_thread)),
+    }
+
+    gpu_layers = get_gpu_layers_count(profile, model_info) if is_gpu_offload else 0
+    if is_gpu_offload:
+        params['num_gpu'] = gpu_layers
+
+    # Layers left on CPU are known only without GPUs or with predicted num_gpu, otherwise Ollama splits the model itself
+    if model_info is not None and (not profile['gpus'] or is_gpu_offload):
+        # Layers left on CPU and the KV cache must fit into RAM, otherwise the context is reduced instead of swapping
+        cpu_layers_mb = model_info['size_mb'] * (1 - gpu_layers / model_info['layers'])
+        kv_cache_mb = profile['available_memory_mb'] - cpu_layers_mb
+        max_num_ctx = math.floor(kv_cache_mb * 1024 * 1024 / KV_CACHE_BYTES_PER_TOKEN / 1024) * 1024
+        params['num_ctx'] = max(MIN_NUM_CTX, min(num_ctx, max_num_ctx))
+        if params['num_ctx'] < num_ctx:
+            logging.info(f"Ollama num_ctx of {model} reduced from {num_ctx} to {params['num_ctx']}: "
+                         f"{profile['available_memory_mb']} MB of available RAM, {round(cpu_layers_mb)} MB of model layers on CPU")
+
+    calibration = profile['calibration'].get(model)
+    if calibration and calibration.get('fingerprint') == profile['fingerprint']:
+        params['num_thread'] = calibration['num_thread']
+        params['num_batch'] = calibration['num_batch']
+
+    return params
+
+
+def get_calibration_candidates(profile: dict) -> list:
+    """
+    Returns (num_thread, num_batch) pairs around the derived values.
+    """
+    physical_cores = get_available_physical_cores(profile)
+    threads = sorted({max(1, physical_cores // 2), max(1, physical_cores - 1), physical_cores})
+    batches = [256, 512] if profile['gpus'] else [128, 512]
+    return [(num_thread, num_batch) for num_thread in threads for num_batch in batches]
+
+
+def measure_tokens_per_second(llm, prompt: str = CALIBRATION_PROMPT) -> float:
+    started_at = time.perf_counter()
+    response = llm.invoke(prompt)
+    elapsed = time.perf_counter() - started_at
+
+    metadata = getattr(response, 'response_metadata', None) or {}
+    # Ollama reports generation time without model loading and prompt processing
+    if metadata.get('eval_count') and metadata.get('eval_duration'):
+        return metadata['eval_count'] / (metadata['eval_duration'] / 1e9)
+
+    usage = getattr(response, 'usage_metadata', None) or {}
+    tokens = usage.get('output_tokens') or max(1, len(str(response.content)) // 4)
+    return tokens / max(elapsed, 1e-6)
+
+
+def calibrate_ollama_params(profile: dict, model: str, llm_factory, candidates: list | None = None) -> dict:
+    """
+    Runs a short generation with every candidate and keeps the parameters with the best tokens/sec in the profile.
+
+    Args:
+        profile (dict): Hardware profile, updated with the calibration result.
+        model (str): Model name the result is stored for.
+        llm_factory: Callable (num_thread, num_batch) -> chat model, e.g. ChatOllama or a local stand-in.
+        candidates (list): (num_thread, num_batch) pairs, None means get_calibration_candidates().
+
+    Returns:
+        dict: Best num_thread, num_batch and tokens_per_second.
+    """
+    results = []
+    for num_thread, num_batch in candidates or get_calibration_candidates(profile):
+        llm = llm_factory(num_thread, num_batch)
+        # The first request loads the model with new parameters, only the second one is measured
+        llm.invoke("Hi")
+        tokens_per_second = measure_tokens_per_second(llm)
+        logging.info(f"Calibration of {model}: num_thread={num_thread} num_batch={num_batch} {tokens_per_second:.1f} tokens/s")
+        results.append((tokens_per_second, num_thread, num_batch))
+
+    tokens_per_second, num_thread, num_batch = max(results)
+    profile['calibration'][model] = {
+        'num_thread': num_thread,
+        'num_batch': num_batch,
+        'tokens_per_second': round(tokens_per_second, 2),
+        'fingerprint': profile['fingerprint'],
+        'calibrated_at': time.time(),
+    }
+    return profile['calibration'][model]
@@ -1,22 +1,55 @@
 import os
 import json
-from typing import Dict
+import threading
+from types import MappingProxyType
+from typing import Dict, Mapping
 
-class Language:
+# Loaded bundles by file path, every bundle is read once per process and shared read-only by all callers
+_bundles: Dict[str, Mapping] = {}
+_bundles_lock = threading.Lock()
+
+
+def get_bundle_path(language_code: str, language_file_name: str) -> str:
+    return os.path.join(os.environ.get('DIR_ROOT') or '', 'nes', 'i18n', language_code, f"{language_file_name}.json")
+
+
+def get_translations(language_code: str, language_file_name: str) -> Mapping:
+    """
+    Returns the translations bundle of the language, the file is read on the first call only.
+
+    Args:
+        language_code (str): Language ISO2 code, e.g. "en".
+        language_file_name (str): Bundle name without extension, e.g. "print-summary".
+
+    Returns:
+        Mapping: Read-only translations of the bundle.
+    """
+    path = get_bundle_path(language_code, language_file_name)
+    bundle = _bundles.get(path)
+    if bundle is not None:
+        return bundle
 
-    translations: Dict = {}
+    with _bundles_lock:
+        # Another thread may have loaded the bundle while this one waited for the lock
+        if path not in _bundles:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Class Language Error -> i18n file not found: {path}")
+
+            with open(path, encoding='utf-8') as f:
+                _bundles[path] = MappingProxyType(json.load(f))
+
+        return _bundles[path]
+
+
+class Language:
 
     def __init__(self, language_iso2: str = 'en'):
         self.language_code = language_iso2
+        # Own translations of the instance, instances of other languages do not see them
+        self.translations: Dict = {}
 
     def load(self, language_file_name: str):
-        path = f"{os.environ.get('DIR_ROOT')}/nes/i18n/{self.language_code}/{language_file_name}.json"
-
-        if not os.path.isfile(path):
-            raise FileNotFoundError(f"Class Language Error -> i18n file not found: {path}")
-
-        with open(path) as f:
-            self.translations.update(json.load(f))
+        self.translations.update(get_translations(self.language_code, language_file_name))
 
     def get(self, key: str):
         if key in self.translations:
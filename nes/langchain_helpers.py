@@ -1,3 +1,25 @@
+import asyncio
+import logging
+import time
+
+# HTTP status codes that are worth retrying: rate limits and temporary server-side failures
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Exception class names raised by httpx, openai and ollama clients on temporary failures
+TRANSIENT_EXCEPTION_NAMES = {
+    'APIConnectionError',
+    'APITimeoutError',
+    'RateLimitError',
+    'InternalServerError',
+    'ConnectError',
+    'ConnectTimeout',
+    'ReadError',
+    'ReadTimeout',
+    'WriteTimeout',
+    'PoolTimeout',
+    'RemoteProtocolError',
+}
+
 def ollama_response_to_dict(ai_response):
     return {
         "content": ai_response.content,
@@ -5,4 +27,137 @@ def ollama_response_to_dict(ai_response):
         "response_metadata": ai_response.response_metadata,
         "id": ai_response.id,
         "usage_metadata": ai_response.usage_metadata
-    }
\ No newline at end of file
+    }
+
+def get_llm_model_name(llm) -> str:
+    # ChatOllama keeps model name in "model", ChatOpenAI in "model_name"
+    return getattr(llm, 'model', None) or getattr(llm, 'model_name', None) or type(llm).__name__
+
+def is_transient_llm_error(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+
+    if getattr(error, 'status_code', None) in TRANSIENT_STATUS_CODES:
+        return True
+
+    return any(cls.__name__ in TRANSIENT_EXCEPTION_NAMES for cls in type(error).__mro__)
+
+def get_retry_delay(attempt: int, backoff_seconds: float) -> float:
+    # Exponential backoff: 1x, 2x, 4x, ... of the base delay
+    return backoff_seconds * (2 ** attempt)
+
+def invoke_with_retry(llm, prompt, max_retries: int = 3, backoff_seconds: float = 1.0):
+    attempt = 0
+    while True:
+        try:
+            return llm.invoke(prompt)
+        except Exception as e:
+            if attempt >= max_retries or not is_transient_llm_error(e):
+                raise
+
+            delay = get_retry_delay(attempt, backoff_seconds)
+            logging.warning(f"LLM call failed with {type(e).__name__}: {e}, retry {attempt + 1}/{max_retries} in {delay}s")
+            time.sleep(delay)
+            attempt += 1
+
+async def ainvoke_with_retry(llm, prompt, max_retries: int = 3, backoff_seconds: float = 1.0):
+    attempt = 0
+    while True:
+        try:
+            return await llm.ainvoke(prompt)
+        except Exception as e:
+            if attempt >= max_retries or not is_transient_llm_error(e):
+                raise
+
+            delay = get_retry_delay(attempt, backoff_seconds)
+            logging.warning(f"LLM call failed with {type(e).__name__}: {e}, retry {attempt + 1}/{max_retries} in {delay}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+def find_repeated_tail(text: str, min_period: int = 16, max_period: int = 512, min_repeats: int = 4) -> int | None:
+    """
+    Detects generation loops: the end of the text is the same fragment repeated at least min_repeats times.
+
+    Returns:
+        int: Length of the repeated fragment, None if the text does not end with a loop.
+    """
+    max_period = min(max_period, len(text) // min_repeats)
+    for period in range(min_period, max_period + 1):
+        fragment = text[-period:]
+        if text.endswith(fragment * min_repeats):
+            return period
+
+    return None
+
+async def astream_with_budget(llm, prompt, max_tokens: int = 0, max_seconds: float = 0, is_repetition_checked: bool = True,
+                              on_chunk=None, max_retries: int = 3, backoff_seconds: float = 1.0) -> tuple:
+    """
+    Streams LLM response and stops the generation when it exceeds the token or time budget or starts repeating itself.
+    Closing the stream closes the HTTP connection, so Ollama aborts the generation as well.
+
+    Args:
+        llm: LangChain chat model.
+        prompt: Prompt value or string.
+        max_tokens (int): Maximum number of streamed chunks (Ollama streams one token per chunk), 0 means unlimited.
+        max_seconds (float): Maximum duration of the whole request including waiting for the first token, 0 means unlimited.
+        is_repetition_checked (bool): Stop the generation looping over the same fragment.
+        on_chunk (callable): Called with the text of every chunk.
+        max_retries (int): Retries of transient failures before the first chunk, failures during streaming are not retried.
+        backoff_seconds (float): Base delay of the exponential backoff.
+
+    Returns:
+        tuple: (message chunk with the whole response or None, time.perf_counter() of the first chunk or None,
+            stop reason: None for complete responses, "token_budget", "time_budget" or "repetition").
+    """
+    attempt = 0
+    while True:
+        state = {'message': None, 'first_chunk_at': None, 'tokens': 0, 'stop_reason': None}
+        try:
+            if max_seconds > 0:
+                await asyncio.wait_for(_consume_stream(llm, prompt, state, max_tokens, is_repetition_checked, on_chunk), max_seconds)
+            else:
+                await _consume_stream(llm, prompt, state, max_tokens, is_repetition_checked, on_chunk)
+        except (asyncio.TimeoutError, TimeoutError):
+            if max_seconds <= 0:
+                raise
+            state['stop_reason'] = 'time_budget'
+        except Exception as e:
+            if state['first_chunk_at'] is not None or attempt >= max_retries or not is_transient_llm_error(e):
+                raise
+
+            delay = get_retry_delay(attempt, backoff_seconds)
+            logging.warning(f"LLM call failed with {type(e).__name__}: {e}, retry {attempt + 1}/{max_retries} in {delay}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        if state['stop_reason']:
+            logging.warning(f"LLM generation stopped after {state['tokens']} tokens: {state['stop_reason']}")
+
+        return state['message'], state['first_chunk_at'], state['stop_reason']
+
+async def _consume_stream(llm, prompt, state: dict, max_tokens: int, is_repetition_checked: bool, on_chunk):
+    stream = llm.astream(prompt)
+    content = ''
+    try:
+        async for chunk in stream:
+            if state['first_chunk_at'] is None:
+                state['first_chunk_at'] = time.perf_counter()
+            state['message'] = chunk if state['message'] is None else state['message'] + chunk
+            state['tokens'] += 1
+
+            text = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+            content += text
+            if on_chunk is not None and text:
+                on_chunk(text)
+
+            if max_tokens and state['tokens'] >= max_tokens:
+                state['stop_reason'] = 'token_budget'
+                break
+
+            # The check is cheap but still not needed after every token
+            if is_repetition_checked and state['tokens'] % 32 == 0 and find_repeated_tail(content) is not None:
+                state['stop_reason'] = 'repetition'
+                break
+    finally:
+        await stream.aclose()
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, BaseMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from nes.fake_llm import get_prompt_text, iter_message_chunks
+
+# Recordings are appended by concurrent requests of the run
+_recordings_lock = threading.Lock()
+
+
+class ReplayMissError(Exception):
+    """
+    Prompt is not found in the recordings, e.g. the log or the prompt template changed since the recording.
+    """
+    pass
+
+
+class RecordingChatModel(BaseChatModel):
+    """
+    Passes requests to the real model and appends every prompt with its complete response (content, usage_metadata,
+    response_metadata and latency) to a JSONL file, so the run can be replayed later by ReplayChatModel.
+    Streams stopped by the consumer are not recorded, like incomplete responses are not cached.
+    """
+
+    llm: BaseChatModel
+    recordings_path: str
+    model: str = ''
+
+    @property
+    def _llm_type(self) -> str:
+        return 'recording-chat-model'
+
+    def record(self, messages: list[BaseMessage], message: BaseMessage, latency: float):
+        prompt = get_prompt_text(messages)
+        record = {
+            'prompt_hash': get_prompt_hash(prompt),
+            'model': self.model,
+            'prompt': prompt,
+            'content': message.content,
+            'usage_metadata': dict(getattr(message, 'usage_metadata', None) or {}),
+            'response_metadata': dict(getattr(message, 'response_metadata', None) or {}),
+            'latency_seconds': round(latency, 6),
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with _recordings_lock:
+            with open(self.recordings_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        started_at = time.perf_counter()
+        message = self.llm.invoke(messages, stop=stop, **kwargs)
+        self.record(messages, message, time.perf_counter() - started_at)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        started_at = time.perf_counter()
+        message = await self.llm.ainvoke(messages, stop=stop, **kwargs)
+        self.record(messages, message, time.perf_counter() - started_at)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        started_at = time.perf_counter()
+        full_message = None
+        for chunk in self.llm.stream(messages, stop=stop, **kwargs):
+            full_message = chunk if full_message is None else full_message + chunk
+            yield ChatGenerationChunk(message=chunk)
+
+        if full_message is not None:
+            self.record(messages, full_message, time.perf_counter() - started_at)
+
+    async def _astream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                       run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        started_at = time.perf_counter()
+        full_message: BaseMessageChunk | None = None
+        stream = self.llm.astream(messages, stop=stop, **kwargs)
+        try:
+            async for chunk in stream:
+                full_message = chunk if full_message is None else full_message + chunk
+                yield ChatGenerationChunk(message=chunk)
+        finally:
+            # The request of the real model is cancelled when the consumer stops the stream
+            await stream.aclose()
+
+        if full_message is not None:
+            self.record(messages, full_message, time.perf_counter() - started_at)
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Answers prompts with responses recorded by RecordingChatModel, without a model: deterministic offline reruns
+    and load tests of concurrency, caching and output sinks at thousands of calls per second.
+    """
+
+    recordings: dict
+    model: str = 'replay'
+    # 0 answers at once, 1 waits the recorded latency, 0.5 twice faster than the recording
+    speed: float = 0.0
+
+    @classmethod
+    def from_file(cls, recordings_path: str, speed: float = 0.0):
+        if not os.path.isfile(recordings_path):
+            raise FileNotFoundError(f"LLM recordings {recordings_path} not found, record them with --llm-backend record")
+
+        recordings = {}
+        with open(recordings_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    # The latest response of a prompt wins
+                    recordings[record['prompt_hash']] = record
+
+        model = next((record['model'] for record in recordings.values() if record.get('model')), 'replay')
+        logging.info(f"Replaying {len(recordings)} recorded LLM responses of {model} from {recordings_path}")
+        return cls(recordings=recordings, model=model, speed=speed)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'replay-chat-model'
+
+    def get_message(self, messages: list[BaseMessage]) -> tuple:
+        """
+        Returns:
+            tuple: (recorded message, latency in seconds)
+        """
+        record = self.recordings.get(get_prompt_hash(get_prompt_text(messages)))
+        if record is None:
+            raise ReplayMissError("Prompt is not found in the LLM recordings")
+
+        message = AIMessage(content=record['content'], usage_metadata=record['usage_metadata'] or None, response_metadata=record['response_metadata'])
+        return message, record['latency_seconds'] * self.speed
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        message, latency = self.get_message(messages)
+        if latency > 0:
+            time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        message, latency = self.get_message(messages)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message, latency = self.get_message(messages)
+        if latency > 0:
+            time.sleep(latency)
+        yield from iter_message_chunks(message)
+
+    async def _astream(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                       run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        message, latency = self.get_message(messages)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        for chunk in iter_message_chunks(message):
+            yield chunk
+
+
+def get_prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Access times of cache hits are written in batches of this size or older than ACCESS_FLUSH_SECONDS
+ACCESS_FLUSH_SIZE = 256
+
+ACCESS_FLUSH_SECONDS = 5.0
+
+
+class LlmResponseCache(object):
+    """
+    Persistent SQLite cache of LLM responses keyed by error fingerprint, model, prompt template and language.
+
+    Access times of hits (for LRU eviction) are kept in memory and written with one commit per batch, on set(),
+    eviction and close, so a hit costs one SELECT. A crash loses only the latest access times.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 100000, is_refresh: bool = False):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file, created if missing.
+            ttl_seconds (int): How long cached response is valid, 0 means forever.
+            max_entries (int): Maximum number of cached responses, least recently used are evicted, 0 means unlimited.
+            is_refresh (bool): Ignore cached responses but store the new ones.
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.is_refresh = is_refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._accessed = {}
+        self._accessed_flushed_at = time.monotonic()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "cache_key TEXT PRIMARY KEY, "
+            "response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed_at ON llm_responses (accessed_at)")
+        self._connection.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(fingerprint: str, model_name: str, prompt_template: str, language: str) -> str:
+        template_hash = hashlib.sha256(prompt_template.encode('utf-8')).hexdigest()
+        key_string = f"{fingerprint}|{model_name}|{template_hash}|{language}"
+        return hashlib.sha256(key_string.encode('utf-8')).hexdigest()
+
+    def get(self, cache_key: str) -> dict | None:
+        if self.is_refresh:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created_at FROM llm_responses WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+
+            if row is None or (self.ttl_seconds and row[1] < now - self.ttl_seconds):
+                self.misses += 1
+                return None
+
+            self._accessed[cache_key] = now
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE or time.monotonic() - self._accessed_flushed_at >= ACCESS_FLUSH_SECONDS:
+                self._flush_accessed()
+                self._connection.commit()
+
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, cache_key: str, response: dict):
+        now = time.time()
+        with self._lock:
+            self._accessed.pop(cache_key, None)
+            self._flush_accessed()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_responses (cache_key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (cache_key, json.dumps(response), now, now)
+            )
+            self._connection.commit()
+
+    def _flush_accessed(self):
+        # Committed by the caller
+        if self._accessed:
+            self._connection.executemany("UPDATE llm_responses SET accessed_at = ? WHERE cache_key = ?",
+                                         [(accessed_at, cache_key) for cache_key, accessed_at in self._accessed.items()])
+            self._accessed = {}
+        self._accessed_flushed_at = time.monotonic()
+
+    def evict(self):
+        """
+        Removes expired responses and the least recently used ones above max_entries.
+        """
+        with self._lock:
+            # Least recently used are found by the latest access times
+            self._flush_accessed()
+            if self.ttl_seconds:
+                self._connection.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+            if self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM llm_responses WHERE cache_key IN ("
+                    "SELECT cache_key FROM llm_responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+            self._connection.commit()
+
+    def close(self):
+        logging.info(f"LLM cache {self.db_path}: {self.hits} hits, {self.misses} misses")
+        self.evict()
+        with self._lock:
+            self._connection.close()
@@ -1,53 +1,582 @@
-from langchain_core.prompts import PromptTemplate
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import TYPE_CHECKING
 from tqdm import tqdm
-from nes.apache_php_log_parser import format_error_item_to_str, save_json_file
+from nes.apache_php_log_parser import format_error_item_to_str, format_past_analyses_to_str, save_json_file
+from nes.fingerprint import get_fingerprinter
 import nes.apache_php_log_parser as parser
-from nes.functions import simple_error_detector
-from nes.langchain_helpers import ollama_response_to_dict
+from nes.langchain_helpers import ollama_response_to_dict, invoke_with_retry, ainvoke_with_retry, astream_with_budget, get_llm_model_name, get_retry_delay
+from nes.llm_cache import LlmResponseCache
+from nes.token_counter import TokenCounter
+from nes.log_filter import ErrorLineMatcher
+from nes.log_templates import LogTemplateMiner, format_log_cluster_to_str
+from nes.metrics import LlmMetrics
+from nes.output_sink import OutputSink, FileOutputSink
+from nes.prompt_compactor import PromptCompactor
+from nes.run_journal import RunJournal
+from nes.scheduler import ErrorScheduler, RunBudget
+
+# How often streamed tokens are flushed to the output sink
+STREAM_FLUSH_SECONDS = 1.0
+
+# langchain_core takes most of the startup time, it is imported only when prompts are built
+if TYPE_CHECKING:
+    from langchain_core.prompts import PromptTemplate
+
+# Per-error section of the batched (packed) LLM response
+ANALYSIS_SECTION_REGEX = re.compile(r'<analysis\s+id="?([^">]+)"?\s*>(.*?)</analysis>', re.DOTALL)
 
 
 class LogAiProcessor(object):
 
-    def __init__(self, llm, parsed_data, args, outputs_dir: str, json_file_name: str):
-        self.llm = llm
+    def __init__(self, llm, parsed_data, args, outputs_dir: str, json_file_name: str,
+                 max_concurrency: int = 1, max_retries: int = 3, retry_backoff_seconds: float = 1.0,
+                 cache: LlmResponseCache | None = None,
+                 pack_token_budget: int = 0, pack_max_errors: int = 20, token_counter: TokenCounter | None = None,
+                 error_line_matcher: ErrorLineMatcher | None = None, template_miner: LogTemplateMiner | None = None,
+                 semantic_grouper=None, knowledge_base=None, llm_factory=None, model_name: str = '',
+                 metrics: LlmMetrics | None = None, output_sink: OutputSink | None = None,
+                 is_streaming: bool = False, stream_max_tokens: int = 0, stream_max_seconds: float = 0,
+                 is_repetition_checked: bool = True, scheduler: ErrorScheduler | None = None, run_budget: RunBudget | None = None,
+                 journal: RunJournal | None = None, failed_retries: int = 0, prompt_compactor: PromptCompactor | None = None):
+        self._llm = llm
+        self.llm_factory = llm_factory
         self.parsed_data = parsed_data
         self.args = args
         self.outputs_dir = outputs_dir
         self.json_file_name = json_file_name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.cache = cache
+        self.model_name = model_name or (get_llm_model_name(llm) if llm is not None else '')
+        self.pack_token_budget = pack_token_budget
+        self.pack_max_errors = pack_max_errors
+        self.token_counter = token_counter or (TokenCounter() if pack_token_budget > 0 else None)
+        self.unanswered_items = []
+        self.error_line_matcher = error_line_matcher or ErrorLineMatcher()
+        self.template_miner = template_miner
+        self.semantic_grouper = semantic_grouper
+        self.semantic_members = {}
+        self.knowledge_base = knowledge_base
+        self.error_texts = {}
+        self.error_trace_keys = {}
+        self.metrics = metrics or LlmMetrics(self.model_name)
+        self.output_sink = output_sink or FileOutputSink(outputs_dir)
+        self.is_streaming = is_streaming
+        self.stream_max_tokens = stream_max_tokens
+        self.stream_max_seconds = stream_max_seconds
+        self.is_repetition_checked = is_repetition_checked
+        self.scheduler = scheduler
+        self.run_budget = run_budget
+        self.journal = journal
+        self.failed_retries = failed_retries
+        self.prompt_compactor = prompt_compactor
+        self.saved_keys = set()
+        if journal is not None:
+            # Errors are journaled as done only when their outputs are on disk, queued outputs may be lost on crash
+            self.output_sink.set_written_callback(lambda output_keys: journal.mark(output_keys, 'done'))
+
+    @property
+    def llm(self):
+        # LLM client is created on the first request, so fully cached runs never load LLM backends
+        if self._llm is None and self.llm_factory is not None:
+            self._llm = self.llm_factory()
+        return self._llm
 
     def process_opencart_logs(self):
         if self.parsed_data and self.args.is_nes_parsing:
-            parser.print_summary(self.parsed_data, self.args.language)
+            parser.print_summary(self.parsed_data, self.args.language, self.args.top, self.args.top_order)
             parser.save_json_file(self.parsed_data, self.json_file_name)
 
             with open(f"prompts/anal-logs-nes-{self.args.language}.prompt") as f:
                 base_template = f.read()
 
+            from langchain_core.prompts import PromptTemplate
             prompt_template = PromptTemplate(input_variables=["error_details"], template=base_template)
 
-            for log_key, log_obj in tqdm(self.parsed_data.items()):
-                prompt = prompt_template.format_prompt(error_details=format_error_item_to_str(log_key, log_obj, self.args.language))
-                response = self.llm.invoke(prompt)
-                save_json_file(ollama_response_to_dict(response), self.outputs_dir + str(log_key) + ".json")
-                with open(self.outputs_dir + str(log_key) + ".txt", 'w') as f:
-                    f.write(response.content)
+            errors_to_analyze = self.get_errors_to_analyze()
+            if self.knowledge_base is not None:
+                self.error_texts = {log_key: f"{log_obj['type']}: {log_obj['message']}" for log_key, log_obj in errors_to_analyze.items()}
+                # Same message in another place of the code is another error, so only analyses of the same trace are reused
+                fingerprinter = get_fingerprinter()
+                self.error_trace_keys = {log_key: fingerprinter.get_trace_key(log_obj.get('stack_trace')) for log_key, log_obj in errors_to_analyze.items()}
+
+            error_details = self.get_error_details(errors_to_analyze)
+            if self.pack_token_budget > 0:
+                items = []
+                for log_key in errors_to_analyze:
+                    items.append((log_key, error_details[log_key], self.get_cache_key(log_key, base_template)))
+
+                self.run_packed_llm_jobs(items, prompt_template)
+                return
+
+            jobs = []
+            for log_key in errors_to_analyze:
+                prompt = prompt_template.format_prompt(error_details=error_details[log_key])
+                jobs.append((log_key, prompt, self.get_cache_key(log_key, base_template)))
+
+            self.run_llm_jobs(jobs)
+
+    def get_error_details(self, errors_to_analyze: dict) -> dict:
+        """
+        Returns error details of prompts by error key, compacted by prompt_compactor if it is set.
+        """
+        if self.prompt_compactor is None:
+            return {log_key: format_error_item_to_str(log_key, log_obj, self.args.language) for log_key, log_obj in errors_to_analyze.items()}
+
+        error_details = {}
+        original_tokens = 0
+        compacted_tokens = 0
+        for log_key, log_obj in errors_to_analyze.items():
+            error_details[log_key], item_original_tokens, item_tokens = self.prompt_compactor.compact_error(
+                log_obj, lambda error_data: format_error_item_to_str(log_key, error_data, self.args.language))
+            original_tokens += item_original_tokens
+            compacted_tokens += item_tokens
+
+        self.metrics.record_prompt_compaction(original_tokens, compacted_tokens)
+        logging.info(f"Prompt compaction: {original_tokens} -> {compacted_tokens} tokens of {len(error_details)} errors, "
+                     f"{original_tokens - compacted_tokens} saved")
+        return error_details
 
     #Processing for not NES/Opencart log files
-    def process_logs(self, log_file_path: str):
+    def process_logs(self, log_file_paths):
+        """
+        Args:
+            log_file_paths (str | list): Log file or several log files (plain, .gz or .bz2), with several files
+                the same error line is sent to LLM only once and outputs are named "<file index>-<line index>".
+        """
+        if isinstance(log_file_paths, str):
+            log_file_paths = [log_file_paths]
+
         if not self.args.is_nes_parsing:
             with open(f"prompts/anal-logs-not-nes-{self.args.language}.prompt") as f:
                 base_template = f.read()
-    
+
+            from langchain_core.prompts import PromptTemplate
             prompt_template = PromptTemplate(input_variables=["error_details"], template=base_template)
-    
-            with open(log_file_path, 'r') as f:
-                line_idx = 0
-                for line in tqdm(f):
-                    if simple_error_detector(line):
-                        prompt = prompt_template.format_prompt(error_details=line)
-                        response = self.llm.invoke(prompt)
-                        save_json_file(ollama_response_to_dict(response), self.outputs_dir + str(line_idx) + ".json")
-                        with open(self.outputs_dir + str(line_idx) + ".txt", 'w') as fs:
-                            fs.write(response.content)
-    
-                    line_idx += 1
\ No newline at end of file
+
+            if self.template_miner is not None:
+                self.process_log_clusters(log_file_paths, base_template, prompt_template)
+                return
+
+            is_multiple_files = len(log_file_paths) > 1
+            file_indexes = {file_path: file_idx for file_idx, file_path in enumerate(log_file_paths)}
+            jobs = []
+            unique_lines = {}
+            severity_counts = {}
+            for file_path, line_idx, line, severity in tqdm(self.scan_log_files(log_file_paths)):
+                severity_counts[severity] = severity_counts.get(severity, 0) + 1
+                fingerprint = hashlib.md5(line.strip().encode('utf-8')).hexdigest()
+                if is_multiple_files:
+                    # Stores share code, so the same error line of all files is analyzed once
+                    unique_line = unique_lines.get(fingerprint)
+                    if unique_line is not None:
+                        unique_line['count'] += 1
+                        unique_line['files'][file_path] = unique_line['files'].get(file_path, 0) + 1
+                        continue
+
+                    output_key = f"{file_indexes[file_path]}-{line_idx}"
+                    unique_lines[fingerprint] = {'output_key': output_key, 'line': line, 'severity': severity, 'count': 1, 'files': {file_path: 1}}
+                else:
+                    output_key = line_idx
+
+                jobs.append((output_key, prompt_template.format_prompt(error_details=line), self.get_cache_key(fingerprint, base_template)))
+
+            if is_multiple_files:
+                save_json_file({'files': log_file_paths, 'lines': unique_lines}, self.json_file_name)
+
+            logging.info(f"Found {sum(severity_counts.values())} lines with errors in {len(log_file_paths)} files, {len(jobs)} unique: {severity_counts}")
+            self.run_llm_jobs(jobs)
+
+    def scan_log_files(self, log_file_paths: list):
+        return self.error_line_matcher.scan_files(log_file_paths, getattr(self.args, 'parser_workers', 1) or os.cpu_count() or 1)
+
+    def get_errors_to_analyze(self) -> dict:
+        """
+        Returns error groups to send to LLM, with semantic grouping only one error of every group of near-duplicates.
+        """
+        errors_to_analyze = self.parsed_data
+        if self.semantic_grouper is not None:
+            self.semantic_members = self.semantic_grouper.group(self.parsed_data)
+            errors_to_analyze = {log_key: self.parsed_data[log_key] for log_key in self.semantic_members}
+
+        # The most important errors first, so a limited run analyzes them before the budget is exhausted
+        if self.scheduler is not None:
+            errors_to_analyze = self.scheduler.order(errors_to_analyze)
+
+        return errors_to_analyze
+
+    def process_log_clusters(self, log_file_paths: list, base_template: str, prompt_template: 'PromptTemplate'):
+        """
+        Groups similar error lines into templates and sends one representative line per cluster,
+        output files are named by the index of the first line of the cluster, or by the template key for several files.
+        """
+        is_multiple_files = len(log_file_paths) > 1
+        lines_count = 0
+        for file_path, line_idx, line, severity in tqdm(self.scan_log_files(log_file_paths)):
+            self.template_miner.add_line(line_idx, line, severity, file_path if is_multiple_files else None)
+            lines_count += 1
+
+        clusters = self.template_miner.get_clusters()
+        logging.info(f"Grouped {lines_count} lines with errors in {len(log_file_paths)} files into {len(clusters)} clusters")
+        save_json_file(clusters, self.json_file_name)
+        if self.scheduler is not None:
+            clusters = self.scheduler.order(clusters)
+
+        jobs = []
+        for template_key, cluster in clusters.items():
+            prompt = prompt_template.format_prompt(error_details=format_log_cluster_to_str(cluster, self.args.language))
+            jobs.append((template_key if is_multiple_files else cluster['first_line_idx'], prompt, self.get_cache_key(template_key, base_template)))
+
+        self.run_llm_jobs(jobs)
+
+    def get_cache_key(self, fingerprint: str, base_template: str) -> str | None:
+        if self.cache is None:
+            return None
+
+        return self.cache.make_key(fingerprint, self.model_name, base_template, self.args.language)
+
+    def run_llm_jobs(self, jobs: list):
+        """
+        Sends prompts to the LLM and saves every response under its own key.
+
+        Args:
+            jobs (list): List of (output_key, prompt, cache_key) tuples, output files are named by output_key,
+                cached responses are reused for jobs with cache_key.
+        """
+        pending_jobs = self.filter_known_jobs(self.filter_cached_jobs(self.filter_journaled_jobs(jobs)))
+        self.dispatch_with_retries(pending_jobs, self.save_llm_response)
+
+    def filter_journaled_jobs(self, jobs: list) -> list:
+        """
+        Returns jobs which are not done in the run journal, new jobs are journaled as pending.
+        """
+        if self.journal is None:
+            return jobs
+
+        pending_jobs = [job for job in jobs if not self.journal.is_done(job[0])]
+        self.journal.mark([job[0] for job in pending_jobs if self.journal.get_state(job[0]) is None], 'pending')
+        logging.info(f"Run journal: {len(jobs) - len(pending_jobs)} errors already done, {len(pending_jobs)} to process")
+        return pending_jobs
+
+    def mark_journal(self, output_key, state: str, error: BaseException | None = None):
+        if self.journal is None:
+            return
+        # Packed requests have the list of batch items as output_key
+        keys = [item[0] for item in output_key] if isinstance(output_key, list) else [output_key]
+        self.journal.mark(keys, state, error)
+
+    def is_job_unfinished(self, job: tuple, unanswered_keys: set) -> bool:
+        if isinstance(job[0], list):
+            # Packed items missing in the answer are already queued as single jobs
+            return any(item[0] not in self.saved_keys and item[0] not in unanswered_keys for item in job[0])
+        return job[0] not in self.saved_keys
+
+    def filter_cached_jobs(self, jobs: list) -> list:
+        """
+        Saves cached responses and returns jobs that still need the LLM, job's last item is its cache_key.
+        """
+        pending_jobs = []
+        for job in jobs:
+            output_key, cache_key = job[0], job[-1]
+            cached_response = self.cache.get(cache_key) if cache_key else None
+            if cached_response is not None:
+                self.save_response_dict(output_key, cached_response)
+            else:
+                pending_jobs.append(job)
+
+        if self.cache is not None:
+            self.metrics.record_cache(len(jobs) - len(pending_jobs), len(pending_jobs))
+            logging.info(f"LLM cache: {len(jobs) - len(pending_jobs)} responses reused, {len(pending_jobs)} to process")
+
+        return pending_jobs
+
+    def filter_known_jobs(self, jobs: list, is_context_added: bool = True) -> list:
+        """
+        Looks up every job's error in the Qdrant knowledge base: saves reused past analyses
+        and adds past analyses of similar errors to prompts of the remaining jobs.
+
+        Args:
+            jobs (list): List of (output_key, prompt, cache_key) tuples.
+            is_context_added (bool): Add context to prompts, jobs of packed requests have no prompts yet.
+        """
+        if self.knowledge_base is None:
+            return jobs
+
+        known_jobs = [job for job in jobs if job[0] in self.error_texts]
+        lookups = dict(zip((job[0] for job in known_jobs), self.knowledge_base.lookup_many(
+            [self.error_texts[job[0]] for job in known_jobs], [self.error_trace_keys.get(job[0], '') for job in known_jobs])))
+
+        pending_jobs = []
+        for job in jobs:
+            reused_payload, context_payloads = lookups.get(job[0], (None, []))
+            if reused_payload is not None:
+                self.save_response_dict(job[0], dict(reused_payload['response'], knowledge_base={'error_key': reused_payload['error_key'], 'score': reused_payload['score']}))
+                continue
+
+            if is_context_added and context_payloads:
+                output_key, prompt, cache_key = job
+                job = (output_key, prompt.to_string() + format_past_analyses_to_str(context_payloads, self.args.language), cache_key)
+
+            pending_jobs.append(job)
+
+        self.metrics.record_knowledge_base_reuses(len(jobs) - len(pending_jobs))
+        logging.info(f"Qdrant knowledge base: {len(jobs) - len(pending_jobs)} past analyses reused, {len(pending_jobs)} to process")
+        return pending_jobs
+
+    def store_analysis(self, output_key, response_dict: dict):
+        if self.knowledge_base is not None and output_key in self.error_texts:
+            self.knowledge_base.add(output_key, self.error_texts[output_key], response_dict, self.model_name, self.error_trace_keys.get(output_key, ''))
+
+    def dispatch_with_retries(self, jobs: list, save_response):
+        """
+        Dispatches jobs, with the run journal the jobs which failed are dispatched again up to failed_retries times,
+        so one failed error doesn't fail the whole run. The last error is raised when jobs still fail.
+        """
+        attempt = 0
+        while True:
+            try:
+                self.dispatch_llm_jobs(jobs, save_response)
+                return
+            except Exception as e:
+                if self.journal is None or attempt >= self.failed_retries:
+                    raise
+
+                unanswered_keys = {item[0] for item in self.unanswered_items}
+                jobs = [job for job in jobs if self.is_job_unfinished(job, unanswered_keys)]
+                if not jobs:
+                    raise
+
+                delay = get_retry_delay(attempt, self.retry_backoff_seconds)
+                logging.warning(f"{len(jobs)} LLM jobs failed ({type(e).__name__}: {e}), retrying them in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def dispatch_llm_jobs(self, jobs: list, save_response):
+        """
+        Args:
+            jobs (list): List of (output_key, prompt, cache_key) tuples.
+            save_response (callable): Called with (output_key, response, cache_key) for every LLM response.
+        """
+        # Streaming always runs in the event loop, so the time budget also cancels requests waiting for the first token
+        if self.is_streaming or (self.max_concurrency > 1 and len(jobs) > 1):
+            asyncio.run(self._arun_llm_jobs(jobs, save_response))
+            return
+
+        enqueued_at = time.perf_counter()
+        for output_key, prompt, cache_key in tqdm(jobs):
+            if not self.acquire_budget():
+                continue
+
+            started_at = time.perf_counter()
+            self.mark_journal(output_key, 'in_flight')
+            try:
+                response = invoke_with_retry(self.llm, prompt, self.max_retries, self.retry_backoff_seconds)
+            except Exception as e:
+                self.record_call(output_key, None, enqueued_at, started_at, e)
+                self.mark_journal(output_key, 'failed', e)
+                raise
+
+            self.record_call(output_key, response, enqueued_at, started_at)
+            save_response(output_key, response, cache_key)
+
+    def acquire_budget(self) -> bool:
+        return self.run_budget is None or self.run_budget.try_acquire()
+
+    def record_call(self, output_key, response, enqueued_at: float, started_at: float, error: BaseException | None = None,
+                    first_token_at: float | None = None):
+        # Packed requests have the list of batch items as output_key
+        batch_size = len(output_key) if isinstance(output_key, list) else 1
+        self.metrics.record_call(output_key, response, enqueued_at, started_at, time.perf_counter(), first_token_at=first_token_at, error=error, batch_size=batch_size)
+
+    async def astream_llm_response(self, output_key, prompt) -> tuple:
+        """
+        Streams the response within the token and time budgets, tokens are flushed to the output sink as they come.
+
+        Returns:
+            tuple: (response message, time of the first token or None), stopped generations have the stop reason
+                in response_metadata['stream_stop_reason'].
+        """
+        buffer = []
+        flushed_at = [time.perf_counter()]
+
+        def flush():
+            if buffer:
+                self.output_sink.write_partial(output_key, "".join(buffer))
+                buffer.clear()
+            flushed_at[0] = time.perf_counter()
+
+        def on_chunk(text: str):
+            # Packed requests are split into errors only when the answer is complete
+            if isinstance(output_key, list):
+                return
+            buffer.append(text)
+            if time.perf_counter() - flushed_at[0] >= STREAM_FLUSH_SECONDS:
+                flush()
+
+        max_seconds = self.stream_max_seconds
+        remaining_seconds = self.run_budget.get_remaining_seconds() if self.run_budget is not None else None
+        if remaining_seconds is not None:
+            # Streamed answer is cut at the end of the run time budget, the part generated so far is kept
+            max_seconds = max(0.001, min(max_seconds, remaining_seconds) if max_seconds > 0 else remaining_seconds)
+
+        message, first_token_at, stop_reason = await astream_with_budget(self.llm, prompt, self.stream_max_tokens, max_seconds,
+                                                                         self.is_repetition_checked, on_chunk, self.max_retries, self.retry_backoff_seconds)
+        flush()
+
+        if message is None:
+            from langchain_core.messages import AIMessage
+            message = AIMessage(content='')
+        if stop_reason:
+            message.response_metadata['stream_stop_reason'] = stop_reason
+
+        return message, first_token_at
+
+    def run_packed_llm_jobs(self, items: list, prompt_template: 'PromptTemplate'):
+        """
+        Packs as many errors into every LLM request as fit the token budget and splits the answer back per error.
+        Errors missing in the batched answer are sent again one by one.
+
+        Args:
+            items (list): List of (output_key, error_details, cache_key) tuples.
+            prompt_template (PromptTemplate): Single error prompt, used for not packed errors.
+        """
+        pending_items = self.filter_known_jobs(self.filter_cached_jobs(self.filter_journaled_jobs(items)), is_context_added=False)
+
+        with open(f"prompts/anal-logs-nes-batch-{self.args.language}.prompt") as f:
+            batch_base_template = f.read()
+
+        from langchain_core.prompts import PromptTemplate
+        batch_prompt_template = PromptTemplate(input_variables=["error_details"], template=batch_base_template)
+
+        batch_jobs = []
+        single_jobs = []
+        for batch_items in self.pack_items(pending_items, batch_base_template):
+            if len(batch_items) == 1:
+                output_key, error_details, cache_key = batch_items[0]
+                single_jobs.append((output_key, prompt_template.format_prompt(error_details=error_details), cache_key))
+            else:
+                batch_jobs.append((batch_items, batch_prompt_template.format_prompt(error_details=format_batch_details(batch_items)), None))
+
+        logging.info(f"Packed {len(pending_items)} errors into {len(batch_jobs)} batched and {len(single_jobs)} single LLM requests")
+
+        self.unanswered_items = []
+        self.dispatch_with_retries(batch_jobs, self.save_batch_response)
+
+        if self.unanswered_items:
+            logging.warning(f"{len(self.unanswered_items)} errors are missing in batched answers, processing them one by one")
+            for output_key, error_details, cache_key in self.unanswered_items:
+                single_jobs.append((output_key, prompt_template.format_prompt(error_details=error_details), cache_key))
+
+        self.dispatch_with_retries(single_jobs, self.save_llm_response)
+
+    def pack_items(self, items: list, batch_base_template: str) -> list:
+        """
+        Splits errors into batches which prompt fits pack_token_budget tokens and has at most pack_max_errors errors.
+        """
+        template_tokens = self.token_counter.count(batch_base_template)
+        batches = []
+        current_batch = []
+        current_tokens = template_tokens
+
+        for item in items:
+            item_tokens = self.token_counter.count(format_batch_item(len(current_batch) + 1, item[1]))
+            if current_batch and (current_tokens + item_tokens > self.pack_token_budget or len(current_batch) >= self.pack_max_errors):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = template_tokens
+
+            current_batch.append(item)
+            current_tokens += item_tokens
+
+        if current_batch:
+            batches.append(current_batch)
+
+        return batches
+
+    def save_batch_response(self, batch_items: list, response, cache_key: str | None = None):
+        sections = {match.group(1).strip(): match.group(2).strip() for match in ANALYSIS_SECTION_REGEX.finditer(response.content)}
+        response_dict = ollama_response_to_dict(response)
+
+        for position, item in enumerate(batch_items, 1):
+            output_key, error_details, item_cache_key = item
+            content = sections.get(str(position))
+            if not content:
+                self.unanswered_items.append(item)
+                continue
+
+            item_response_dict = dict(response_dict, content=content, batch={'id': response_dict['id'], 'size': len(batch_items), 'position': position})
+            self.save_response_dict(output_key, item_response_dict)
+            self.store_analysis(output_key, item_response_dict)
+            if item_cache_key:
+                self.cache.set(item_cache_key, item_response_dict)
+
+    async def _arun_llm_jobs(self, jobs: list, save_response):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        progress = tqdm(total=len(jobs))
+
+        enqueued_at = time.perf_counter()
+
+        async def run_job(output_key, prompt, cache_key):
+            async with semaphore:
+                if not self.acquire_budget():
+                    progress.update(1)
+                    return
+
+                started_at = time.perf_counter()
+                first_token_at = None
+                self.mark_journal(output_key, 'in_flight')
+                try:
+                    if self.is_streaming:
+                        response, first_token_at = await self.astream_llm_response(output_key, prompt)
+                    else:
+                        response = await ainvoke_with_retry(self.llm, prompt, self.max_retries, self.retry_backoff_seconds)
+                except Exception as e:
+                    self.record_call(output_key, None, enqueued_at, started_at, e)
+                    self.mark_journal(output_key, 'failed', e)
+                    raise
+                self.record_call(output_key, response, enqueued_at, started_at, first_token_at=first_token_at)
+            save_response(output_key, response, cache_key)
+            progress.update(1)
+
+        results = await asyncio.gather(*(run_job(*job) for job in jobs), return_exceptions=True)
+        progress.close()
+
+        errors = [(job[0], result) for job, result in zip(jobs, results) if isinstance(result, BaseException)]
+        for output_key, error in errors:
+            logging.error(f"LLM processing failed for {output_key}: {type(error).__name__}: {error}")
+
+        if errors:
+            raise errors[0][1]
+
+    def save_llm_response(self, output_key, response, cache_key: str | None = None):
+        response_dict = ollama_response_to_dict(response)
+        self.save_response_dict(output_key, response_dict)
+        # Truncated answers are kept in outputs only, so the next run asks LLM again
+        if response_dict['response_metadata'].get('stream_stop_reason'):
+            return
+
+        self.store_analysis(output_key, response_dict)
+        if cache_key:
+            self.cache.set(cache_key, response_dict)
+
+    def save_response_dict(self, output_key, response_dict: dict):
+        self.output_sink.write(output_key, response_dict)
+        self.saved_keys.add(output_key)
+
+        # Near-duplicates of the error get the same analysis
+        for member_key, similarity in self.semantic_members.get(output_key, []):
+            self.save_response_dict(member_key, dict(response_dict, semantic_group={'leader': output_key, 'similarity': similarity}))
+
+
+def format_batch_item(position: int, error_details: str) -> str:
+    # Short positional ids are copied by the model more reliably than long hash keys
+    return f'<error id="{position}">\n{error_details}\n</error>\n'
+
+def format_batch_details(batch_items: list) -> str:
+    return "".join(format_batch_item(position, item[1]) for position, item in enumerate(batch_items, 1))
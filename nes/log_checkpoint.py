@@ -0,0 +1,205 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+import nes.apache_php_log_parser as parser
+
+# How many bytes to read at once while searching for the last complete line
+TAIL_SEARCH_BLOCK_SIZE = 64 * 1024
+
+
+class LogCheckpoint(object):
+    """
+    Persistent state of incremental log processing: file identity, processed byte offset,
+    not yet finished last entry and counters of already known error groups.
+    """
+
+    def __init__(self, log_file_path: str, checkpoints_dir: str):
+        self.log_file_path = os.path.abspath(log_file_path)
+        path_hash = hashlib.md5(self.log_file_path.encode('utf-8')).hexdigest()
+        self.checkpoint_path = os.path.join(checkpoints_dir, f"{path_hash}.json")
+        self.inode = None
+        self.offset = 0
+        self.pending_entry = ''
+        self.groups = {}
+
+        if os.path.isfile(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                state = json.load(f)
+
+            self.inode = state.get('inode')
+            self.offset = state.get('offset', 0)
+            self.pending_entry = state.get('pending_entry', '')
+            self.groups = state.get('groups', {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        state = {
+            'log_file_path': self.log_file_path,
+            'inode': self.inode,
+            'offset': self.offset,
+            'pending_entry': self.pending_entry,
+            'groups': self.groups,
+            'updated_at': time.time(),
+        }
+
+        # Write to a temporary file first, so a crash never leaves a broken checkpoint
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def find_rotated_log_file(log_file_path: str, inode: int) -> str | None:
+    """
+    Looks for the file logrotate renamed the log to (error_log.1, error_log-20250829, ...) by its inode.
+    """
+    log_dir, log_file_name = os.path.split(os.path.abspath(log_file_path))
+    for file_name in os.listdir(log_dir):
+        if file_name == log_file_name or not file_name.startswith(log_file_name):
+            continue
+
+        candidate = os.path.join(log_dir, file_name)
+        if os.path.isfile(candidate) and os.stat(candidate).st_ino == inode:
+            return candidate
+
+    return None
+
+
+def find_last_line_end(file_path: str, start: int, end: int) -> int:
+    """
+    Returns the offset right after the last newline in the [start, end) range, or start if there is none.
+    """
+    with open(file_path, 'rb') as f:
+        position = end
+        while position > start:
+            block_start = max(start, position - TAIL_SEARCH_BLOCK_SIZE)
+            f.seek(block_start)
+            block = f.read(position - block_start)
+            newline_idx = block.rfind(b'\n')
+            if newline_idx >= 0:
+                return block_start + newline_idx + 1
+            position = block_start
+
+    return start
+
+
+def iter_new_log_entries(checkpoint: LogCheckpoint, pending_flush_seconds: int = 60):
+    """
+    Yields log entries appended since the checkpoint and moves the checkpoint forward.
+
+    The last entry may still be written (multi-line stack trace), so it is kept in the checkpoint
+    until the next entry starts or the file isn't modified for pending_flush_seconds.
+    Handles logrotate: renamed file is read till the end before the new one, truncated file is read from the start.
+
+    Args:
+        checkpoint (LogCheckpoint): Checkpoint of the log file, updated in place when all entries are read, but not saved.
+        pending_flush_seconds (int): Treat the last entry as finished when the file is older than this.
+
+    Yields:
+        str: Finished log entry text.
+    """
+    log_file_path = checkpoint.log_file_path
+    stat = os.stat(log_file_path)
+    line_sources = [[checkpoint.pending_entry]] if checkpoint.pending_entry else []
+    offset = checkpoint.offset
+
+    if checkpoint.inode is not None and checkpoint.inode != stat.st_ino:
+        rotated_file_path = find_rotated_log_file(log_file_path, checkpoint.inode)
+        if rotated_file_path:
+            logging.info(f"Log file {log_file_path} was rotated to {rotated_file_path}, reading its remainder")
+            rotated_size = os.path.getsize(rotated_file_path)
+            # Rotated file is finished, its partial last line is complete as well
+            line_sources.append(parser.iter_log_lines(rotated_file_path, parser.STREAM_CHUNK_SIZE, offset, rotated_size))
+        else:
+            logging.warning(f"Log file {log_file_path} was replaced, rotated file not found, unread data is lost")
+        offset = 0
+    elif stat.st_size < offset:
+        logging.info(f"Log file {log_file_path} was truncated, reading from the start")
+        offset = 0
+
+    # Only complete lines are read, the line being written right now is left for the next run
+    end = find_last_line_end(log_file_path, offset, stat.st_size)
+    if end > offset:
+        line_sources.append(parser.iter_log_lines(log_file_path, parser.STREAM_CHUNK_SIZE, offset, end))
+
+    # Every entry is yielded only when the next one is read, so the last one can be held back
+    last_entry = None
+    for entry_text in parser.iter_log_entries(itertools.chain.from_iterable(line_sources)):
+        if last_entry is not None:
+            yield last_entry
+        last_entry = entry_text
+
+    if last_entry is not None and time.time() - stat.st_mtime >= pending_flush_seconds:
+        yield last_entry
+        last_entry = None
+
+    checkpoint.inode = stat.st_ino
+    checkpoint.offset = end
+    checkpoint.pending_entry = last_entry or ''
+
+
+def select_groups_to_analyze(checkpoint: LogCheckpoint, window_errors: dict, escalation_factor: float = 2.0) -> dict:
+    """
+    Updates known groups counters and returns new groups and groups which count grew escalation_factor times
+    since their last analysis. Groups stay pending until mark_groups_analyzed is called with their saved analyses,
+    so groups skipped by the run budget or failed are selected again when they occur next time.
+
+    Args:
+        checkpoint (LogCheckpoint): Checkpoint with known groups, updated in place.
+        window_errors (dict): Error groups parsed from the new part of the log.
+        escalation_factor (float): Growth of the total count that triggers a new analysis.
+
+    Returns:
+        dict: Error groups that should be sent to LLM.
+    """
+    selected_errors = {}
+    for unique_key, error_group in window_errors.items():
+        known_group = checkpoint.groups.get(unique_key)
+        if known_group is None:
+            known_group = checkpoint.groups[unique_key] = {'count': 0, 'analyzed_count': 0}
+
+        known_group['count'] += error_group['count']
+        error_group['total_count'] = known_group['count']
+
+        if not known_group['analyzed_count'] or known_group['count'] >= known_group['analyzed_count'] * escalation_factor:
+            selected_errors[unique_key] = error_group
+
+    return selected_errors
+
+
+def mark_groups_analyzed(checkpoint: LogCheckpoint, unique_keys) -> int:
+    """
+    Records the current count of the groups as analyzed, called with keys of the groups which analyses were saved.
+
+    Returns:
+        int: Number of marked groups.
+    """
+    marked_count = 0
+    for unique_key in unique_keys:
+        known_group = checkpoint.groups.get(unique_key)
+        if known_group is not None:
+            known_group['analyzed_count'] = known_group['count']
+            marked_count += 1
+
+    return marked_count
+
+
+def parse_new_log_entries(checkpoint: LogCheckpoint, timestamps_sample_size: int = 0, pending_flush_seconds: int = 60) -> dict:
+    """
+    Parses entries appended since the checkpoint into error groups like parse_log_file_streaming.
+    """
+    window_errors = {}
+    for entry_text in iter_new_log_entries(checkpoint, pending_flush_seconds):
+        parsed_entry = parser.parse_log_entry(entry_text, parser.LOG_ENTRY_REGEX)
+        if parsed_entry:
+            parser.add_entry_to_group(window_errors, parsed_entry, timestamps_sample_size)
+
+    for error_group in window_errors.values():
+        error_group['timestamps'] = list(error_group['timestamps'])
+
+    return window_errors
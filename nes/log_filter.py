@@ -0,0 +1,170 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from nes.log_sources import open_log_file
+
+# Marker -> severity, the order of severities defines their priority (highest first)
+DEFAULT_ERROR_MARKERS = {
+    'EMERGENCY': 'emergency',
+    'CRITICAL': 'critical',
+    'ERROR': 'error',
+    'WARNING': 'warning',
+}
+
+# Size of the byte blocks scanned at once
+SCAN_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+class ErrorLineMatcher(object):
+    """
+    Finds log lines with error markers scanning the file in large byte blocks instead of checking every line in Python.
+
+    Every block is lower-cased once and searched with bytes.find for every marker, which runs at memory speed,
+    candidate lines are then verified with a single precompiled regular expression.
+    """
+
+    def __init__(self, markers: dict = None, is_case_insensitive: bool = False):
+        """
+        Args:
+            markers (dict): Marker -> severity, None means DEFAULT_ERROR_MARKERS.
+            is_case_insensitive (bool): Match markers in any case, otherwise only as is or in lower case
+                (the same as simple_error_detector).
+        """
+        self.markers = dict(markers or DEFAULT_ERROR_MARKERS)
+        self.is_case_insensitive = is_case_insensitive
+        self.severities = list(dict.fromkeys(self.markers.values()))
+
+        self.severity_by_marker = {}
+        for marker, severity in self.markers.items():
+            variants = [marker.lower()] if is_case_insensitive else [marker, marker.lower()]
+            for variant in variants:
+                self.severity_by_marker.setdefault(variant.encode('utf-8'), severity)
+
+        # Longer markers first, so "ERRORS" wins over "ERROR" if both are configured
+        alternatives = sorted(self.severity_by_marker, key=len, reverse=True)
+        self.regex = re.compile(b'|'.join(re.escape(marker) for marker in alternatives), re.IGNORECASE if is_case_insensitive else 0)
+        self.search_markers = list(dict.fromkeys(marker.lower() for marker in alternatives))
+
+    @classmethod
+    def from_config(cls, markers_config: str = '', is_case_insensitive: bool = False):
+        """
+        Creates matcher from "MARKER[=severity],MARKER[=severity]" string, e.g. "FATAL=critical,ERROR,WARNING".
+        Marker without severity uses its lower-cased name as severity.
+        """
+        if not markers_config:
+            return cls(None, is_case_insensitive)
+
+        markers = {}
+        for item in markers_config.split(','):
+            marker, _, severity = item.strip().partition('=')
+            if marker:
+                markers[marker] = severity.strip() or marker.lower()
+
+        return cls(markers, is_case_insensitive)
+
+    def get_severity(self, line: bytes) -> str | None:
+        """
+        Returns the highest severity of the markers found in the line.
+        """
+        found_severities = {self.severity_by_marker[match.lower() if self.is_case_insensitive else match] for match in self.regex.findall(line)}
+        for severity in self.severities:
+            if severity in found_severities:
+                return severity
+
+        return None
+
+    def scan_file(self, file_path: str, block_size: int = SCAN_BLOCK_SIZE):
+        """
+        Yields lines that contain error markers.
+
+        Args:
+            file_path (str): Path to log file.
+            block_size (int): Size of the byte blocks read from the file.
+
+        Yields:
+            tuple: (line_idx, line, severity), line_idx is zero-based, line keeps its line break.
+        """
+        line_idx = 0
+        with open_log_file(file_path, 'rb') as f:
+            tail = b''
+            while True:
+                chunk = f.read(block_size)
+                data = tail + chunk
+                if not chunk:
+                    # The last line without line break
+                    block = data
+                    tail = b''
+                else:
+                    cut = data.rfind(b'\n') + 1
+                    block = data[:cut]
+                    tail = data[cut:]
+
+                counted_position = 0
+                for line_start, line_end in self.find_candidate_lines(block):
+                    line = block[line_start:line_end]
+                    severity = self.get_severity(line)
+                    if severity is None:
+                        continue
+
+                    line_idx += block.count(b'\n', counted_position, line_start)
+                    counted_position = line_start
+                    yield line_idx, decode_line(line), severity
+
+                line_idx += block.count(b'\n', counted_position)
+
+                if not chunk:
+                    break
+
+    def scan_files(self, file_paths: list, workers: int = 1, block_size: int = SCAN_BLOCK_SIZE):
+        """
+        Scans several log files, in parallel processes if workers > 1.
+
+        Yields:
+            tuple: (file_path, line_idx, line, severity) in order of files.
+        """
+        if workers <= 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                for line_idx, line, severity in self.scan_file(file_path, block_size):
+                    yield file_path, line_idx, line, severity
+            return
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(file_paths))) as executor:
+            tasks = [(self, file_path, block_size) for file_path in file_paths]
+            for file_path, lines in zip(file_paths, executor.map(scan_file_task, tasks)):
+                for line_idx, line, severity in lines:
+                    yield file_path, line_idx, line, severity
+
+    def find_candidate_lines(self, block: bytes) -> list:
+        """
+        Returns sorted (start, end) offsets of the block lines that contain any marker in any case.
+        """
+        lower_block = block.lower()
+        block_length = len(block)
+        line_spans = {}
+
+        for marker in self.search_markers:
+            position = lower_block.find(marker)
+            while position >= 0:
+                line_start = lower_block.rfind(b'\n', 0, position) + 1
+                line_end = lower_block.find(b'\n', position + len(marker))
+                line_end = block_length if line_end < 0 else line_end + 1
+                line_spans[line_start] = line_end
+                position = lower_block.find(marker, line_end)
+
+        return sorted(line_spans.items())
+
+
+def scan_file_task(task) -> list:
+    """
+    Scans a single log file, used as a process pool task.
+
+    Args:
+        task (tuple): (matcher, file_path, block_size).
+    """
+    matcher, file_path, block_size = task
+    return list(matcher.scan_file(file_path, block_size))
+
+
+def decode_line(line: bytes) -> str:
+    if line.endswith(b'\r\n'):
+        line = line[:-2] + b'\n'
+    return line.decode('utf-8', errors='replace')
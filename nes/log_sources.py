@@ -0,0 +1,83 @@
+import bz2
+import glob
+import gzip
+import os
+import re
+
+# Compressed rotated logs are read transparently
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+}
+
+# Rotation suffix of logrotate/Apache: error_log.1, error_log.2.gz, error_log-20250829.bz2
+ROTATION_SUFFIX_REGEX = re.compile(r'[.-](\d+)(?:\.(?:gz|bz2))?$')
+
+GLOB_CHARS = ('*', '?', '[')
+
+
+def is_compressed_log(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1] in COMPRESSED_OPENERS
+
+
+def open_log_file(file_path: str, mode: str = 'rb', **kwargs):
+    """
+    Opens plain, .gz or .bz2 log file, compressed files are not seekable.
+    """
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(file_path)[1])
+    if opener is None:
+        return open(file_path, mode, **kwargs)
+
+    # gzip/bz2 open in binary mode by default, text mode must be explicit
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+    return opener(file_path, mode, **kwargs)
+
+
+def get_rotation_sort_key(file_path: str) -> tuple:
+    """
+    Sorts rotated logs from the oldest to the current one: error_log.2.gz, error_log.1, error_log.
+    Date suffixes (error_log-20250829) grow with time, numeric suffixes decrease with time.
+    """
+    file_name = os.path.basename(file_path)
+    match = ROTATION_SUFFIX_REGEX.search(file_name)
+    if not match:
+        return os.path.dirname(file_path), file_name, 1, 0
+
+    base_name = file_name[:match.start()]
+    rotation = int(match.group(1))
+    is_date = len(match.group(1)) >= 8
+    return os.path.dirname(file_path), base_name, 0, rotation if is_date else -rotation
+
+
+def resolve_log_paths(log_path: str) -> list:
+    """
+    Resolves --log argument: a file, a directory (all not hidden files in it and its subdirectories) or a glob pattern (** is recursive).
+
+    Returns:
+        list: Paths of log files, rotated logs of the same file from the oldest to the current one.
+    """
+    if os.path.isfile(log_path):
+        return [log_path]
+
+    if os.path.isdir(log_path):
+        paths = []
+        for dir_path, dir_names, file_names in os.walk(log_path):
+            dir_names[:] = [name for name in dir_names if not name.startswith('.')]
+            paths.extend(os.path.join(dir_path, name) for name in file_names if not name.startswith('.'))
+    elif any(char in log_path for char in GLOB_CHARS):
+        paths = glob.glob(log_path, recursive=True)
+    else:
+        return []
+
+    return sorted((path for path in paths if os.path.isfile(path)), key=get_rotation_sort_key)
+
+
+def get_log_source_name(log_path: str) -> str:
+    """
+    Name of the processed logs for output paths: file or directory name, glob pattern without special characters.
+    """
+    name = os.path.basename(os.path.normpath(log_path))
+    for char in GLOB_CHARS + (']',):
+        name = name.replace(char, '_')
+    return name or 'logs'
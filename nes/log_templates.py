@@ -0,0 +1,192 @@
+import hashlib
+import re
+from nes.error_renderer import get_renderer
+
+# Masking rules applied to every line before template mining, order matters: timestamps before numbers etc.
+MASKING_RULES = [
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), '<TS>'),
+    (re.compile(r'\d{1,2}[/-][A-Za-z]{3}[/-]\d{4}[: ]\d{2}:\d{2}:\d{2}(?:\s*[+-]\d{4}|\s+UTC)?'), '<TS>'),
+    (re.compile(r'\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b'), '<TS>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<UUID>'),
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b'), '<IP>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b'), '<HEX>'),
+    (re.compile(r'(?:[A-Za-z]:)?(?:[/\\][\w.\-@~]+){2,}[/\\]?'), '<PATH>'),
+    (re.compile(r'(?<![\w<])[-+]?\d+(?:\.\d+)?(?![\w>])'), '<NUM>'),
+]
+
+# Timestamp of the line for the first/last appearance statistics
+LINE_TIMESTAMP_REGEX = re.compile(
+    r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'
+    r'|\d{1,2}[/-][A-Za-z]{3}[/-]\d{4}[: ]\d{2}:\d{2}:\d{2}(?:\s*[+-]\d{4}|\s+UTC)?'
+)
+
+WILDCARD = '<*>'
+
+
+def mask_log_line(line: str) -> str:
+    for regex, replacement in MASKING_RULES:
+        line = regex.sub(replacement, line)
+    return line
+
+
+class LogTemplateMiner(object):
+    """
+    Drain-style online template miner: groups log lines that differ only in variable parts into clusters.
+
+    Lines are masked (timestamps, IPs, IDs, paths, numbers), split into tokens and routed by token count
+    and the first prefix tokens, then matched with the most similar cluster template of the route.
+    Tokens that differ between lines of a cluster are replaced with <*>.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.5, prefix_depth: int = 2):
+        """
+        Args:
+            similarity_threshold (float): Minimal share of equal tokens for a line to join a cluster.
+            prefix_depth (int): How many leading tokens are used to route lines, like the tree depth in Drain.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.prefix_depth = prefix_depth
+        self.clusters = []
+        self._routes = {}
+        self._lines_count = 0
+
+    def add_line(self, line_idx: int, line: str, severity: str | None = None, file_path: str | None = None) -> dict:
+        """
+        Adds the line to the most similar cluster or creates a new one.
+        With file_path the cluster counts its lines per log file.
+
+        Returns:
+            dict: Cluster of the line.
+        """
+        tokens = mask_log_line(line.strip()).split()
+        route_key = (len(tokens),) + tuple(self.get_route_token(token) for token in tokens[:self.prefix_depth])
+        route_clusters = self._routes.setdefault(route_key, [])
+
+        cluster = self.find_cluster(route_clusters, tokens)
+        timestamp_match = LINE_TIMESTAMP_REGEX.search(line)
+        timestamp = timestamp_match.group(0) if timestamp_match else None
+
+        if cluster is None:
+            cluster = {
+                'template_tokens': tokens,
+                'count': 0,
+                'severity': severity,
+                'first_line_idx': line_idx,
+                'last_line_idx': line_idx,
+                'first_timestamp': timestamp,
+                'last_timestamp': timestamp,
+                'first_line': line,
+                'first_file': file_path,
+                'files': {},
+            }
+            route_clusters.append(cluster)
+            self.clusters.append(cluster)
+        else:
+            cluster['template_tokens'] = [
+                template_token if template_token == token else WILDCARD
+                for template_token, token in zip(cluster['template_tokens'], tokens)
+            ]
+
+        self._lines_count += 1
+        cluster['count'] += 1
+        cluster['last_line_idx'] = line_idx
+        # Line indexes restart in every file, so the order of lines across files is kept separately
+        cluster['last_line_number'] = self._lines_count
+        if file_path is not None:
+            cluster['files'][file_path] = cluster['files'].get(file_path, 0) + 1
+        if timestamp:
+            cluster['first_timestamp'] = cluster['first_timestamp'] or timestamp
+            cluster['last_timestamp'] = timestamp
+
+        return cluster
+
+    def find_cluster(self, route_clusters: list, tokens: list) -> dict | None:
+        best_cluster = None
+        best_similarity = -1.0
+        for cluster in route_clusters:
+            similarity = get_tokens_similarity(cluster['template_tokens'], tokens)
+            if similarity > best_similarity:
+                best_cluster, best_similarity = cluster, similarity
+
+        if best_cluster is not None and best_similarity >= self.similarity_threshold:
+            return best_cluster
+
+        return None
+
+    @staticmethod
+    def get_route_token(token: str) -> str:
+        # Variable tokens must not split routes
+        if token.startswith('<') or any(char.isdigit() for char in token):
+            return WILDCARD
+        return token
+
+    def get_clusters(self) -> dict:
+        """
+        Clusters of different routes may end up with the same template, such clusters are merged,
+        so the key stays stable between runs and no cluster is lost.
+
+        Returns:
+            dict: Clusters keyed by MD5 of their template, in order of the first appearance.
+        """
+        result = {}
+        last_line_numbers = {}
+        for cluster in self.clusters:
+            template = " ".join(cluster['template_tokens'])
+            template_key = hashlib.md5(template.encode('utf-8')).hexdigest()
+            if template_key in result:
+                merge_cluster(result[template_key], cluster, cluster['last_line_number'] > last_line_numbers[template_key])
+                last_line_numbers[template_key] = max(last_line_numbers[template_key], cluster['last_line_number'])
+                continue
+
+            last_line_numbers[template_key] = cluster['last_line_number']
+            result[template_key] = {
+                'template': template,
+                'count': cluster['count'],
+                'severity': cluster['severity'],
+                'first_line_idx': cluster['first_line_idx'],
+                'last_line_idx': cluster['last_line_idx'],
+                'first_timestamp': cluster['first_timestamp'],
+                'last_timestamp': cluster['last_timestamp'],
+                'line': cluster['first_line'],
+            }
+            if cluster['files']:
+                result[template_key]['first_file'] = cluster['first_file']
+                result[template_key]['files'] = dict(cluster['files'])
+
+        return result
+
+
+def merge_cluster(result_cluster: dict, cluster: dict, is_later: bool):
+    """
+    Adds counters of the cluster to the result cluster of the same template, the result cluster appeared first.
+
+    Args:
+        is_later (bool): The last line of the cluster is later than the last line of the result cluster.
+    """
+    result_cluster['count'] += cluster['count']
+    if is_later:
+        result_cluster['last_line_idx'] = cluster['last_line_idx']
+        result_cluster['last_timestamp'] = cluster['last_timestamp'] or result_cluster['last_timestamp']
+    result_cluster['first_timestamp'] = result_cluster['first_timestamp'] or cluster['first_timestamp']
+    result_cluster['severity'] = result_cluster['severity'] or cluster['severity']
+
+    if cluster['files']:
+        files = result_cluster.setdefault('files', {})
+        result_cluster.setdefault('first_file', cluster['first_file'])
+        for file_path, count in cluster['files'].items():
+            files[file_path] = files.get(file_path, 0) + count
+
+
+def get_tokens_similarity(template_tokens: list, tokens: list) -> float:
+    if not tokens:
+        return 1.0
+
+    equal_tokens = sum(1 for template_token, token in zip(template_tokens, tokens) if template_token == token or template_token == WILDCARD)
+    return equal_tokens / len(tokens)
+
+
+def format_log_cluster_to_str(cluster: dict, language: str) -> str:
+    """
+    Formats a cluster of similar log lines for the LLM prompt: representative line and its statistics.
+    """
+    return get_renderer(language).render_log_cluster(cluster)
@@ -0,0 +1,213 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+# Prefix of the exported Prometheus metrics
+PROMETHEUS_PREFIX = 'nes_log_ai'
+
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LlmMetrics(object):
+    """
+    Per-call LLM metrics of a run: queue wait, time to first token, latency, tokens and cache hits,
+    aggregated into a run summary and optionally exported in Prometheus text format.
+    """
+
+    def __init__(self, model_name: str = ''):
+        self.model_name = model_name
+        self.started_at = time.time()
+        self.calls = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.knowledge_base_reuses = 0
+        self.skipped_by_budget = 0
+        self.prompt_tokens_before_compaction = 0
+        self.prompt_tokens_after_compaction = 0
+        self._lock = threading.Lock()
+
+    def record_call(self, output_key, response, enqueued_at: float, started_at: float, finished_at: float,
+                    first_token_at: float | None = None, error: BaseException | None = None, batch_size: int = 1):
+        """
+        Records one LLM call, times are time.perf_counter() values.
+
+        Args:
+            output_key: Key of the analyzed error, list of errors for packed requests.
+            response: LLM response message, None if the call failed.
+            enqueued_at (float): When the job was queued.
+            started_at (float): When the request was sent, after waiting for a concurrency slot.
+            finished_at (float): When the whole response was received.
+            first_token_at (float): When the first token was received, None for not streamed responses.
+            error (BaseException): Error of the failed call.
+            batch_size (int): Number of errors in the request.
+        """
+        usage = (getattr(response, 'usage_metadata', None) or {}) if response is not None else {}
+        response_metadata = (getattr(response, 'response_metadata', None) or {}) if response is not None else {}
+        latency = finished_at - started_at
+
+        # Ollama reports server-side durations in nanoseconds, they exclude network and client overhead
+        ttft = first_token_at - started_at if first_token_at is not None else None
+        if ttft is None and response_metadata.get('prompt_eval_duration') is not None:
+            ttft = (response_metadata.get('load_duration', 0) + response_metadata['prompt_eval_duration']) / 1e9
+
+        completion_tokens = usage.get('output_tokens') or 0
+        generation_seconds = response_metadata['eval_duration'] / 1e9 if response_metadata.get('eval_duration') else latency - (ttft or 0)
+
+        call = {
+            'output_key': str(output_key) if batch_size == 1 else None,
+            'batch_size': batch_size,
+            'status': 'error' if error is not None else 'ok',
+            'error': f"{type(error).__name__}: {error}" if error is not None else None,
+            'queue_wait_seconds': round(started_at - enqueued_at, 6),
+            'ttft_seconds': round(ttft, 6) if ttft is not None else None,
+            'latency_seconds': round(latency, 6),
+            'prompt_tokens': usage.get('input_tokens') or 0,
+            'completion_tokens': completion_tokens,
+            'tokens_per_second': round(completion_tokens / generation_seconds, 3) if completion_tokens and generation_seconds > 0 else None,
+        }
+        with self._lock:
+            self.calls.append(call)
+
+    def record_cache(self, hits: int, misses: int):
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def record_knowledge_base_reuses(self, count: int):
+        with self._lock:
+            self.knowledge_base_reuses += count
+
+    def record_prompt_compaction(self, original_tokens: int, compacted_tokens: int):
+        with self._lock:
+            self.prompt_tokens_before_compaction += original_tokens
+            self.prompt_tokens_after_compaction += compacted_tokens
+
+    def get_summary(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+
+        ok_calls = [call for call in calls if call['status'] == 'ok']
+        wall_seconds = time.time() - self.started_at
+        llm_seconds = sum(call['latency_seconds'] for call in ok_calls)
+        prompt_tokens = sum(call['prompt_tokens'] for call in ok_calls)
+        completion_tokens = sum(call['completion_tokens'] for call in ok_calls)
+        cache_lookups = self.cache_hits + self.cache_misses
+
+        return {
+            'model': self.model_name,
+            'started_at': self.started_at,
+            'wall_seconds': round(wall_seconds, 3),
+            'calls': len(calls),
+            'failed_calls': len(calls) - len(ok_calls),
+            'requested_errors': sum(call['batch_size'] for call in ok_calls),
+            'calls_per_second': round(len(ok_calls) / wall_seconds, 4) if wall_seconds > 0 else None,
+            'llm_seconds': round(llm_seconds, 3),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'completion_tokens_per_second': round(completion_tokens / llm_seconds, 3) if llm_seconds > 0 else None,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_ratio': round(self.cache_hits / cache_lookups, 4) if cache_lookups else None,
+            'knowledge_base_reuses': self.knowledge_base_reuses,
+            'skipped_by_budget': self.skipped_by_budget,
+            'prompt_tokens_before_compaction': self.prompt_tokens_before_compaction,
+            'prompt_tokens_saved_by_compaction': self.prompt_tokens_before_compaction - self.prompt_tokens_after_compaction,
+            'queue_wait_seconds': get_distribution([call['queue_wait_seconds'] for call in ok_calls]),
+            'ttft_seconds': get_distribution([call['ttft_seconds'] for call in ok_calls if call['ttft_seconds'] is not None]),
+            'latency_seconds': get_distribution([call['latency_seconds'] for call in ok_calls]),
+            'tokens_per_second': get_distribution([call['tokens_per_second'] for call in ok_calls if call['tokens_per_second'] is not None]),
+        }
+
+    def save_summary(self, file_path: str, is_with_calls: bool = True):
+        summary = self.get_summary()
+        if is_with_calls:
+            with self._lock:
+                summary['per_call'] = list(self.calls)
+
+        with open(file_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        logging.info(f"LLM metrics: {summary['calls']} calls ({summary['failed_calls']} failed), {summary['completion_tokens']} completion tokens, "
+                     f"p50 latency {summary['latency_seconds']['p50']}s, cache hits {summary['cache_hits']}/{summary['cache_hits'] + summary['cache_misses']}")
+
+    def save_prometheus(self, file_path: str):
+        """
+        Writes metrics in Prometheus text exposition format, e.g. for the node_exporter textfile collector.
+        The file is replaced atomically, so the collector never reads a partial file.
+        """
+        summary = self.get_summary()
+        with self._lock:
+            calls = list(self.calls)
+        labels = f'model="{escape_label_value(self.model_name)}"'
+
+        lines = []
+        add_metric(lines, 'llm_calls_total', 'counter', 'LLM requests of the run.',
+                   [(f'{labels},status="ok"', summary['calls'] - summary['failed_calls']), (f'{labels},status="error"', summary['failed_calls'])])
+        add_metric(lines, 'llm_requested_errors_total', 'counter', 'Errors sent to LLM, packed requests contain several errors.', [(labels, summary['requested_errors'])])
+        add_metric(lines, 'llm_tokens_total', 'counter', 'Tokens of successful LLM requests.',
+                   [(f'{labels},kind="prompt"', summary['prompt_tokens']), (f'{labels},kind="completion"', summary['completion_tokens'])])
+        add_metric(lines, 'llm_cache_requests_total', 'counter', 'LLM response cache lookups.',
+                   [(f'{labels},result="hit"', summary['cache_hits']), (f'{labels},result="miss"', summary['cache_misses'])])
+        add_metric(lines, 'llm_knowledge_base_reuses_total', 'counter', 'Past analyses reused from the knowledge base.', [(labels, summary['knowledge_base_reuses'])])
+        add_metric(lines, 'llm_prompt_compaction_saved_tokens_total', 'counter', 'Tokens of error details removed by prompt compaction.', [(labels, summary['prompt_tokens_saved_by_compaction'])])
+        add_metric(lines, 'llm_skipped_requests_total', 'counter', 'LLM requests skipped because the run budget was exhausted.', [(labels, summary['skipped_by_budget'])])
+        add_metric(lines, 'run_wall_seconds', 'gauge', 'Duration of the run.', [(labels, summary['wall_seconds'])])
+        add_metric(lines, 'run_timestamp_seconds', 'gauge', 'Start time of the run.', [(labels, summary['started_at'])])
+
+        ok_calls = [call for call in calls if call['status'] == 'ok']
+        for name, help_text in (('queue_wait_seconds', 'Time LLM requests waited for a concurrency slot.'),
+                                ('ttft_seconds', 'Time to the first token of LLM responses.'),
+                                ('latency_seconds', 'Total latency of LLM requests.'),
+                                ('tokens_per_second', 'Completion tokens per second of LLM requests.')):
+            values = [call[name] for call in ok_calls if call[name] is not None]
+            add_summary_metric(lines, f'llm_{name}', help_text, labels, values)
+
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, file_path)
+
+
+def get_percentile(sorted_values: list, quantile: float) -> float:
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(quantile * len(sorted_values)) - 1)]
+
+
+def get_distribution(values: list) -> dict:
+    if not values:
+        return {'count': 0, 'mean': None, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+
+    sorted_values = sorted(values)
+    return {
+        'count': len(sorted_values),
+        'mean': round(sum(sorted_values) / len(sorted_values), 6),
+        'p50': get_percentile(sorted_values, 0.5),
+        'p90': get_percentile(sorted_values, 0.9),
+        'p99': get_percentile(sorted_values, 0.99),
+        'max': sorted_values[-1],
+    }
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def add_metric(lines: list, name: str, metric_type: str, help_text: str, samples: list):
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {metric_type}")
+    for labels, value in samples:
+        lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{labels}}} {value}")
+
+
+def add_summary_metric(lines: list, name: str, help_text: str, labels: str, values: list):
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} summary")
+    sorted_values = sorted(values)
+    for quantile in SUMMARY_QUANTILES:
+        value = get_percentile(sorted_values, quantile) if sorted_values else 'NaN'
+        lines.append(f'{PROMETHEUS_PREFIX}_{name}{{{labels},quantile="{quantile}"}} {value}')
+    lines.append(f"{PROMETHEUS_PREFIX}_{name}_sum{{{labels}}} {sum(sorted_values)}")
+    lines.append(f"{PROMETHEUS_PREFIX}_{name}_count{{{labels}}} {len(sorted_values)}")
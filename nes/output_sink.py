@@ -0,0 +1,353 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from nes.apache_php_log_parser import save_json_file
+
+# Available output sinks, "files" is the classic <key>.json + <key>.txt layout
+OUTPUT_SINK_TYPES = ['files', 'jsonl', 'jsonl.zst', 'sqlite']
+
+# Maximum number of responses written by the background writer at once (one zstd frame / one SQLite transaction)
+WRITE_BATCH_SIZE = 256
+
+ZSTD_COMPRESSION_LEVEL = 6
+
+
+class OutputSink(object):
+    """
+    Destination of LLM analyses, one record per error key.
+    """
+
+    # Called with the list of error keys which records are written and flushed
+    written_callback = None
+
+    def set_written_callback(self, callback):
+        self.written_callback = callback
+
+    def write(self, output_key, response_dict: dict):
+        raise NotImplementedError
+
+    def write_partial(self, output_key, text: str):
+        """
+        Appends streamed text of the response being generated, the complete response is passed to write() later.
+        Append-only single-file sinks keep only complete responses, so they ignore partial text.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class FileOutputSink(OutputSink):
+    """
+    Classic layout: <key>.json with the whole response and <key>.txt with its content in the run directory.
+    """
+
+    def __init__(self, outputs_dir: str):
+        self.outputs_dir = outputs_dir
+
+    def write(self, output_key, response_dict: dict):
+        save_output_files(self.outputs_dir, output_key, response_dict)
+        if self.written_callback is not None:
+            self.written_callback([str(output_key)])
+
+    def write_partial(self, output_key, text: str):
+        # <key>.txt shows the answer while it is generated and is overwritten by the complete answer
+        with open(os.path.join(self.outputs_dir, str(output_key) + ".txt"), 'a') as f:
+            f.write(text)
+
+
+class QueuedOutputSink(OutputSink):
+    """
+    Base of the single-file sinks: responses are queued and written in batches by a background writer thread,
+    so LLM processing never waits for the (network) file system.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._queue = queue.Queue()
+        self._error = None
+        self._writer = threading.Thread(target=self._run_writer, name=f"{type(self).__name__}-writer", daemon=True)
+        self._writer.start()
+
+    def write(self, output_key, response_dict: dict):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((str(output_key), response_dict))
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run_writer(self):
+        is_closed = False
+        try:
+            self.open()
+            while not is_closed:
+                records = [self._queue.get()]
+                while len(records) < WRITE_BATCH_SIZE:
+                    try:
+                        records.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if records[-1] is None:
+                    is_closed = True
+                    records.pop()
+
+                if records:
+                    self.write_batch(records)
+                    if self.written_callback is not None:
+                        self.written_callback([output_key for output_key, _ in records])
+        except Exception as e:
+            logging.error(f"Output sink {self.file_path} failed: {type(e).__name__}: {e}")
+            self._error = e
+        finally:
+            self.finish()
+
+    def open(self):
+        pass
+
+    def write_batch(self, records: list):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class JsonlOutputSink(QueuedOutputSink):
+    """
+    Append-only JSONL file of {"key", "response"} records, optionally zstd-compressed (one frame per written batch).
+
+    The index <file>.index.json maps error key to the record position, for compressed files it is
+    (frame offset, frame size, record offset in frame, record size), so one record is read by decompressing one frame.
+    """
+
+    def __init__(self, file_path: str, is_compressed: bool = False):
+        self.is_compressed = is_compressed
+        self.index = {}
+        self._file = None
+        self._compressor = None
+        super().__init__(file_path)
+
+    def open(self):
+        if self.is_compressed:
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL)
+
+        if os.path.isfile(self.file_path) and os.path.getsize(self.file_path):
+            self.index = load_jsonl_index(self.file_path)
+            # Records appended after a torn record would be unreadable, so the torn tail is cut off
+            records_end = get_jsonl_records_end(self.index)
+            if os.path.getsize(self.file_path) > records_end:
+                logging.warning(f"Output file {self.file_path} has a torn last record, truncating it to {records_end} bytes")
+                os.truncate(self.file_path, records_end)
+
+        self._file = open(self.file_path, 'ab')
+
+    def write_batch(self, records: list):
+        data = bytearray()
+        positions = []
+        for output_key, response_dict in records:
+            line = (json.dumps({'key': output_key, 'response': response_dict}, ensure_ascii=False) + "\n").encode('utf-8')
+            positions.append((output_key, len(data), len(line)))
+            data += line
+
+        offset = self._file.tell()
+        if self.is_compressed:
+            frame = self._compressor.compress(bytes(data))
+            self._file.write(frame)
+            for output_key, record_offset, record_size in positions:
+                self.index[output_key] = [offset, len(frame), record_offset, record_size]
+        else:
+            self._file.write(data)
+            for output_key, record_offset, record_size in positions:
+                self.index[output_key] = [offset + record_offset, record_size]
+
+        self._file.flush()
+
+    def finish(self):
+        if self._file is None:
+            return
+
+        self._file.close()
+        save_json_file_atomic(self.index, get_jsonl_index_path(self.file_path))
+
+
+class SqliteOutputSink(QueuedOutputSink):
+    """
+    SQLite database with one row per error key, the primary key is the index.
+    """
+
+    def __init__(self, db_path: str):
+        self._connection = None
+        super().__init__(db_path)
+
+    def open(self):
+        # The connection is used only by the writer thread
+        self._connection = sqlite3.connect(self.file_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            "output_key TEXT PRIMARY KEY, "
+            "content TEXT NOT NULL, "
+            "response TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def write_batch(self, records: list):
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO outputs (output_key, content, response, created_at) VALUES (?, ?, ?, ?)",
+                [(output_key, response_dict['content'], json.dumps(response_dict, ensure_ascii=False), now) for output_key, response_dict in records]
+            )
+
+    def finish(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+def create_output_sink(sink_type: str, outputs_dir: str) -> OutputSink:
+    """
+    Args:
+        sink_type (str): One of OUTPUT_SINK_TYPES.
+        outputs_dir (str): Run directory, single-file sinks create outputs.jsonl[.zst] or outputs.sqlite in it.
+    """
+    if sink_type in ('', 'files'):
+        return FileOutputSink(outputs_dir)
+    if sink_type == 'jsonl':
+        return JsonlOutputSink(os.path.join(outputs_dir, 'outputs.jsonl'))
+    if sink_type == 'jsonl.zst':
+        return JsonlOutputSink(os.path.join(outputs_dir, 'outputs.jsonl.zst'), is_compressed=True)
+    if sink_type == 'sqlite':
+        return SqliteOutputSink(os.path.join(outputs_dir, 'outputs.sqlite'))
+
+    raise Exception(f"Unknown output sink {sink_type}, available: {', '.join(OUTPUT_SINK_TYPES)}")
+
+
+def save_output_files(outputs_dir: str, output_key, response_dict: dict):
+    save_json_file(response_dict, os.path.join(outputs_dir, str(output_key) + ".json"))
+    with open(os.path.join(outputs_dir, str(output_key) + ".txt"), 'w') as f:
+        f.write(response_dict['content'])
+
+
+def save_json_file_atomic(content, file_path: str):
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(content, f)
+    os.replace(tmp_path, file_path)
+
+
+def get_jsonl_index_path(file_path: str) -> str:
+    return f"{file_path}.index.json"
+
+
+def load_jsonl_index(file_path: str) -> dict:
+    """
+    Loads the index of JSONL output file, rebuilds it if the writer was interrupted before saving the index.
+    """
+    index_path = get_jsonl_index_path(file_path)
+    if os.path.isfile(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(file_path):
+        with open(index_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    index = {}
+    for output_key, _, position in iter_jsonl_records(file_path, is_with_positions=True):
+        index[output_key] = position
+    return index
+
+
+def get_jsonl_records_end(index: dict) -> int:
+    # Both index layouts start with the offset and size of the record (or its frame)
+    return max((position[0] + position[1] for position in index.values()), default=0)
+
+
+def iter_jsonl_records(file_path: str, is_with_positions: bool = False):
+    """
+    Yields (output_key, response_dict, position) of JSONL output file, the latest record of a key wins on export.
+
+    The last record (frame of compressed files) is torn if the writer was killed while writing it,
+    such record is skipped with a warning.
+    """
+    with open(file_path, 'rb') as f:
+        if not file_path.endswith('.zst'):
+            offset = 0
+            for line in f:
+                # Every complete record ends with a newline, only the last one can miss it
+                if not line.endswith(b'\n'):
+                    logging.warning(f"Output file {file_path} has a torn last record at {offset}, skipping it")
+                    return
+                record = json.loads(line)
+                yield record['key'], record['response'], [offset, len(line)] if is_with_positions else None
+                offset += len(line)
+            return
+
+        import zstandard
+        data = memoryview(f.read())
+        frame_offset = 0
+        while frame_offset < len(data):
+            # Every written batch is a separate frame, its size is known only after decompression
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+            frame = decompressor.decompress(data[frame_offset:])
+            if not decompressor.eof:
+                logging.warning(f"Output file {file_path} has a torn last frame at {frame_offset}, skipping it")
+                return
+            frame_size = len(data) - frame_offset - len(decompressor.unused_data)
+            record_offset = 0
+            for line in frame.splitlines(keepends=True):
+                record = json.loads(line)
+                position = [frame_offset, frame_size, record_offset, len(line)] if is_with_positions else None
+                yield record['key'], record['response'], position
+                record_offset += len(line)
+            frame_offset += frame_size
+
+
+def read_output(file_path: str, output_key) -> dict | None:
+    """
+    Reads one response by error key from outputs.jsonl[.zst] or outputs.sqlite.
+    """
+    if file_path.endswith('.sqlite'):
+        connection = sqlite3.connect(file_path)
+        try:
+            row = connection.execute("SELECT response FROM outputs WHERE output_key = ?", (str(output_key),)).fetchone()
+        finally:
+            connection.close()
+        return json.loads(row[0]) if row else None
+
+    position = load_jsonl_index(file_path).get(str(output_key))
+    if position is None:
+        return None
+
+    with open(file_path, 'rb') as f:
+        f.seek(position[0])
+        data = f.read(position[1])
+
+    if len(position) == 4:
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompress(data)[position[2]:position[2] + position[3]]
+
+    return json.loads(data)['response']
+
+
+def iter_outputs(file_path: str):
+    """
+    Yields (output_key, response_dict) of outputs.jsonl[.zst] or outputs.sqlite.
+    """
+    if file_path.endswith('.sqlite'):
+        connection = sqlite3.connect(file_path)
+        try:
+            for output_key, response in connection.execute("SELECT output_key, response FROM outputs ORDER BY created_at"):
+                yield output_key, json.loads(response)
+        finally:
+            connection.close()
+        return
+
+    for output_key, response_dict, _ in iter_jsonl_records(file_path):
+        yield output_key, response_dict
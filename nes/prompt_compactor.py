@@ -0,0 +1,196 @@
+import os
+import re
+from nes.token_counter import TokenCounter
+
+STACK_TRACE_HEADER = 'Stack trace:'
+
+# Frame line of PHP stack traces: "#3 /path/Loader.php(254): ModelDesignSeoUrl->getSeoUrlsByKeyword()"
+FRAME_REGEX = re.compile(r'^#(\d+) (.*)$')
+
+# File path of the frame, "[internal function]" frames have none
+FRAME_PATH_REGEX = re.compile(r'^(/[^(]+)\(\d+\)')
+
+# Frames of the framework and libraries, other frames are frames of the store code (catalog, admin, extensions)
+DEFAULT_VENDOR_FRAMES_REGEX = r'(^|/)(vendor|system/(library|engine|framework|startup|helper))/|^\[internal function\]'
+
+# Longest sequence of frames collapsed when it repeats (recursion, nested controllers)
+MAX_REPEATED_FRAMES = 4
+
+# Shorter common path prefixes are not worth the note about them
+MIN_PATH_PREFIX_LENGTH = 8
+
+# Messages are never cut shorter than this number of characters
+MIN_MESSAGE_LENGTH = 200
+
+
+class PromptCompactor(object):
+    """
+    Shortens error details of prompts, most of the tokens of NES/OpenCart errors are stack trace frames with long paths.
+
+    Every trace is compacted without losing information first: the common path prefix is stated once, repeated
+    sequences of frames are collapsed and the "{main}" frame is dropped. Errors still exceeding item_token_budget
+    keep only the top frames of the trace and the first frames of the store code, then fewer of them,
+    and long messages are cut as the last resort. Tokens are counted with TokenCounter on the rendered error.
+    """
+
+    def __init__(self, token_counter: TokenCounter, item_token_budget: int = 0, head_frames: int = 3, app_frames: int = 5,
+                 vendor_frames_regex: str = DEFAULT_VENDOR_FRAMES_REGEX):
+        """
+        Args:
+            token_counter (TokenCounter): Counter of prompt tokens.
+            item_token_budget (int): Maximum tokens of the rendered error, 0 means only lossless compaction.
+            head_frames (int): Frames of the top of the trace kept when the error exceeds the budget.
+            app_frames (int): Frames of the store code (not matching vendor_frames_regex) kept when the error exceeds the budget.
+            vendor_frames_regex (str): Frames of the framework and libraries.
+        """
+        self.token_counter = token_counter
+        self.item_token_budget = item_token_budget
+        self.head_frames = head_frames
+        self.app_frames = app_frames
+        self.vendor_frames_regex = re.compile(vendor_frames_regex)
+
+    def compact_error(self, error_data: dict, render) -> tuple:
+        """
+        Args:
+            error_data (dict): Error group with "message" and "stack_trace".
+            render (callable): Renders error group to error details of the prompt, e.g. format_error_item_to_str.
+
+        Returns:
+            tuple: (error details, tokens of not compacted error details, tokens of error details).
+        """
+        original_text = render(error_data)
+        original_tokens = self.token_counter.count(original_text)
+        if not error_data.get('stack_trace') and (self.item_token_budget <= 0 or original_tokens <= self.item_token_budget):
+            return original_text, original_tokens, original_tokens
+
+        prefix, frames, tail_lines = self.parse_trace(error_data.get('stack_trace') or '')
+        message = shorten_paths(error_data['message'], prefix)
+
+        # Frames of every next level are the subset of the previous one
+        levels = [None, (self.head_frames, self.app_frames), (1, 1), (0, 0)] if self.item_token_budget > 0 else [None]
+        for level in levels:
+            text = render(dict(error_data, message=message, stack_trace=self.format_trace(prefix, frames, tail_lines, level)))
+            tokens = self.token_counter.count(text)
+            if self.item_token_budget <= 0 or tokens <= self.item_token_budget:
+                return self.get_shorter(text, tokens, original_text, original_tokens)
+
+        # Message is cut in proportion to the tokens over the budget
+        stack_trace = self.format_trace(prefix, frames, tail_lines, levels[-1])
+        while tokens > self.item_token_budget:
+            cut_length = max(MIN_MESSAGE_LENGTH, int(len(message) * self.item_token_budget / tokens) - 1)
+            # Message already cut to MIN_MESSAGE_LENGTH stays over the budget
+            if cut_length + 1 >= len(message):
+                break
+            message = message[:cut_length] + '…'
+            text = render(dict(error_data, message=message, stack_trace=stack_trace))
+            tokens = self.token_counter.count(text)
+
+        return self.get_shorter(text, tokens, original_text, original_tokens)
+
+    @staticmethod
+    def get_shorter(text: str, tokens: int, original_text: str, original_tokens: int) -> tuple:
+        # Notes about the prefix and omitted frames cost tokens too, short traces may get longer
+        if tokens < original_tokens:
+            return text, original_tokens, tokens
+        return original_text, original_tokens, original_tokens
+
+    def parse_trace(self, stack_trace: str) -> tuple:
+        """
+        Returns:
+            tuple: (common path prefix or '', frames without numbers and the common prefix, lines after the frames).
+        """
+        frames = []
+        tail_lines = []
+        paths = []
+        # Parser keeps the first frame on the line of the "Stack trace:" header
+        if stack_trace.startswith(STACK_TRACE_HEADER):
+            stack_trace = stack_trace[len(STACK_TRACE_HEADER):]
+        for line in stack_trace.strip('\n').split('\n'):
+            match = FRAME_REGEX.match(line)
+            if match is None:
+                tail_lines.append(line)
+                continue
+            if match.group(2) == '{main}':
+                continue
+
+            frames.append(match.group(2))
+            path_match = FRAME_PATH_REGEX.match(match.group(2))
+            if path_match:
+                paths.append(os.path.dirname(path_match.group(1)))
+
+        prefix = get_common_path_prefix(paths)
+        frames = [shorten_paths(frame, prefix) for frame in frames]
+        tail_lines = [shorten_paths(line, prefix) for line in tail_lines]
+        return prefix, collapse_repeated_frames(frames), tail_lines
+
+    def format_trace(self, prefix: str, frames: list, tail_lines: list, level: tuple | None) -> str:
+        """
+        Args:
+            level (tuple | None): (head frames, store code frames) to keep, None keeps all frames.
+        """
+        lines = [f"Stack trace (paths relative to {prefix}/):" if prefix else STACK_TRACE_HEADER]
+        kept_frames = self.select_frames(frames, *level) if level is not None else set(range(len(frames)))
+
+        omitted_count = 0
+        for frame_idx, (frame_number, frame) in enumerate(frames):
+            if frame_idx not in kept_frames:
+                # Notes about repeats of omitted frames are omitted with them
+                omitted_count += frame_number is not None
+                continue
+            if omitted_count:
+                lines.append(f"... omitted frames: {omitted_count}")
+                omitted_count = 0
+            lines.append(f"#{frame_number} {frame}" if frame_number is not None else frame)
+        if omitted_count:
+            lines.append(f"... omitted frames: {omitted_count}")
+
+        return '\n'.join(lines + tail_lines)
+
+    def select_frames(self, frames: list, head_frames: int, app_frames: int) -> set:
+        kept_frames = set(range(min(head_frames, len(frames))))
+        for frame_idx, (frame_number, frame) in enumerate(frames):
+            if app_frames <= 0:
+                break
+            if frame_number is not None and not self.vendor_frames_regex.search(frame):
+                kept_frames.add(frame_idx)
+                app_frames -= 1
+        return kept_frames
+
+
+def get_common_path_prefix(paths: list) -> str:
+    if not paths:
+        return ''
+
+    prefix = os.path.commonpath(paths)
+    return prefix if len(prefix) >= MIN_PATH_PREFIX_LENGTH else ''
+
+
+def shorten_paths(text: str, prefix: str) -> str:
+    return text.replace(prefix + '/', '') if prefix else text
+
+
+def collapse_repeated_frames(frames: list) -> list:
+    """
+    Collapses directly repeated sequences of up to MAX_REPEATED_FRAMES frames into the first sequence and a note.
+
+    Returns:
+        list: (frame number or None for notes, frame) tuples, numbers are the numbers of the original trace.
+    """
+    collapsed = []
+    frame_idx = 0
+    while frame_idx < len(frames):
+        for size in range(1, MAX_REPEATED_FRAMES + 1):
+            sequence = frames[frame_idx:frame_idx + size]
+            repeats = 1
+            while frames[frame_idx + repeats * size:frame_idx + (repeats + 1) * size] == sequence:
+                repeats += 1
+            if repeats > 1:
+                collapsed += [(frame_idx + offset, frame) for offset, frame in enumerate(sequence)]
+                collapsed.append((None, f"... {size} frames above repeated {repeats - 1} more times"))
+                frame_idx += repeats * size
+                break
+        else:
+            collapsed.append((frame_idx, frames[frame_idx]))
+            frame_idx += 1
+
+    return collapsed
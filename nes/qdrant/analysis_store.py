@@ -0,0 +1,148 @@
+import logging
+import time
+import uuid
+from qdrant_client import QdrantClient, models
+from nes.qdrant.qdrant_hybrid_search import QdrantHybridSearchClient, QDRANT_EMB_DENSE_VECTOR_NAME, QDRANT_EMB_SPARSE_VECTOR_NAME, QDRANT_EMB_DENSE_MODEL_NAME, QDRANT_EMB_SPARSE_MODEL_NAME
+from nes.qdrant.fastembed_functions import get_dense_model_vector_size
+
+
+class AnalysisKnowledgeBase(object):
+    """
+    Qdrant collection of past LLM analyses with dense and sparse vectors of the analyzed error.
+
+    Before LLM request the error is looked up: very similar past analysis of the error with the same normalized
+    stack trace is reused as is, otherwise the best hybrid (RRF) matches are added to the prompt as a context.
+    """
+
+    def __init__(self, client: QdrantClient, collection_name: str, reuse_threshold: float = 0.97,
+                 context_limit: int = 3, batch_size: int = 64):
+        """
+        Args:
+            client (QdrantClient): Qdrant client, local mode QdrantClient(path=...) works without a server.
+            collection_name (str): Collection of analyses, use one collection per language.
+            reuse_threshold (float): Minimal dense cosine similarity to reuse a past analysis without LLM request.
+            context_limit (int): How many past analyses to add to the prompt, 0 disables prompt context.
+            batch_size (int): Number of new analyses embedded and upserted at once.
+        """
+        self.client = client
+        self.collection_name = collection_name
+        self.reuse_threshold = reuse_threshold
+        self.context_limit = context_limit
+        self.batch_size = batch_size
+        self.reused_count = 0
+        self._pending_points = []
+        self._dense_model = None
+        self._sparse_model = None
+
+        self.search_client = QdrantHybridSearchClient(client, collection_name)
+        self.search_client.is_with_payload = True
+        self.search_client.results_limit = max(1, context_limit)
+
+        self.ensure_collection()
+
+    def ensure_collection(self):
+        if self.client.collection_exists(self.collection_name):
+            return
+
+        self.client.create_collection(
+            self.collection_name,
+            vectors_config={
+                QDRANT_EMB_DENSE_VECTOR_NAME: models.VectorParams(
+                    size=get_dense_model_vector_size(QDRANT_EMB_DENSE_MODEL_NAME),
+                    distance=models.Distance.COSINE,
+                ),
+            },
+            sparse_vectors_config={
+                QDRANT_EMB_SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF),
+            },
+        )
+
+    def embed(self, texts: list) -> tuple:
+        if self._dense_model is None:
+            from fastembed import TextEmbedding, SparseTextEmbedding
+            self._dense_model = TextEmbedding(model_name=QDRANT_EMB_DENSE_MODEL_NAME)
+            self._sparse_model = SparseTextEmbedding(model_name=QDRANT_EMB_SPARSE_MODEL_NAME)
+
+        dense_vectors = [vector.tolist() for vector in self._dense_model.embed(texts, batch_size=self.batch_size)]
+        sparse_vectors = list(self._sparse_model.embed(texts, batch_size=self.batch_size))
+        return dense_vectors, sparse_vectors
+
+    def lookup_many(self, texts: list, trace_keys: list | None = None) -> list:
+        """
+        Looks up past analyses of the errors, embeddings of all errors are computed in one batch.
+
+        Args:
+            texts (list): Error texts.
+            trace_keys (list | None): Hashes of normalized stack traces of the errors, analyses are reused only for the same trace.
+
+        Returns:
+            list: (reused analysis payload or None, list of context payloads) for every text.
+        """
+        if not texts or self.client.count(self.collection_name).count == 0:
+            return [(None, []) for _ in texts]
+
+        dense_vectors, sparse_vectors = self.embed(texts)
+        results = []
+        for dense_vector, sparse_vector, trace_key in zip(dense_vectors, sparse_vectors, trace_keys or [''] * len(texts)):
+            # RRF scores are rank based, so the reuse decision is made on the dense cosine similarity
+            best_match = self.client.query_points(
+                self.collection_name,
+                query=dense_vector,
+                using=QDRANT_EMB_DENSE_VECTOR_NAME,
+                query_filter=models.Filter(must=[models.FieldCondition(key='trace_key', match=models.MatchValue(value=trace_key))]),
+                with_payload=True,
+                limit=1,
+            ).points
+            if best_match and best_match[0].score >= self.reuse_threshold:
+                self.reused_count += 1
+                results.append((dict(best_match[0].payload, score=best_match[0].score), []))
+                continue
+
+            context = []
+            if self.context_limit:
+                context = [point.payload for point in self.search_client.rrf_prefetch(dense_vector, sparse_vector).points]
+            results.append((None, context))
+
+        return results
+
+    def add(self, error_key: str, error_text: str, response: dict, model_name: str, trace_key: str = ''):
+        """
+        Queues the analysis for upsert, queued analyses are written in batches of batch_size.
+        """
+        self._pending_points.append((error_key, error_text, response, model_name, trace_key))
+        if len(self._pending_points) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending_points:
+            return
+
+        dense_vectors, sparse_vectors = self.embed([item[1] for item in self._pending_points])
+        points = []
+        for (error_key, error_text, response, model_name, trace_key), dense_vector, sparse_vector in zip(self._pending_points, dense_vectors, sparse_vectors):
+            points.append(models.PointStruct(
+                # Repeated analysis of the same error with the same model replaces the old one
+                id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{error_key}|{model_name}")),
+                vector={
+                    QDRANT_EMB_DENSE_VECTOR_NAME: dense_vector,
+                    QDRANT_EMB_SPARSE_VECTOR_NAME: models.SparseVector(**sparse_vector.as_object()),
+                },
+                payload={
+                    'error_key': str(error_key),
+                    'error_text': error_text,
+                    'trace_key': trace_key,
+                    'analysis': response['content'],
+                    'response': response,
+                    'model': model_name,
+                    'created_at': time.time(),
+                },
+            ))
+
+        self.client.upsert(self.collection_name, points=points)
+        logging.info(f"Stored {len(points)} analyses in Qdrant collection {self.collection_name}")
+        self._pending_points = []
+
+    def close(self):
+        self.flush()
+        logging.info(f"Qdrant knowledge base {self.collection_name}: {self.reused_count} analyses reused")
+
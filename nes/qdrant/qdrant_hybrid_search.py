@@ -3,11 +3,11 @@ import logging
 import os
 
 # Щільні (Dense) вектори - для семантичного розуміння.
-QDRANT_EMB_DENSE_MODEL_NAME = os.environ.get("QDRANT_EMB_DENSE_MODEL_NAME")
+QDRANT_EMB_DENSE_MODEL_NAME = os.environ.get("QDRANT_EMB_DENSE_MODEL_NAME") or "BAAI/bge-small-en-v1.5"
 # Розріджені (Sparse) вектори - для пошуку за ключовими словами.
-QDRANT_EMB_SPARSE_MODEL_NAME = os.environ.get("QDRANT_EMB_SPARSE_MODEL_NAME")
+QDRANT_EMB_SPARSE_MODEL_NAME = os.environ.get("QDRANT_EMB_SPARSE_MODEL_NAME") or "Qdrant/bm25"
 # Мульти-вектори  - для точного зіставлення на рівні токенів.
-QDRANT_EMB_LATE_ITER_MODEL_NAME = os.environ.get("QDRANT_EMB_LATE_ITER_MODEL_NAME")
+QDRANT_EMB_LATE_ITER_MODEL_NAME = os.environ.get("QDRANT_EMB_LATE_ITER_MODEL_NAME") or "colbert-ir/colbertv2.0"
 
 """"""
 QDRANT_EMB_DENSE_VECTOR_NAME = QDRANT_EMB_DENSE_MODEL_NAME.replace("/", "-").replace(":", "-")
@@ -0,0 +1,94 @@
+import logging
+import numpy as np
+
+# Default dense model, small and fast enough to embed tens of thousands of error messages on CPU
+DEFAULT_DENSE_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+
+
+class SemanticErrorGrouper(object):
+    """
+    Merges near-duplicate error groups (differing only by product ID, file path etc.) by cosine similarity
+    of their fastembed dense embeddings, so only one error of every semantic group is sent to LLM.
+    """
+
+    def __init__(self, model_name: str = '', similarity_threshold: float = 0.92, batch_size: int = 256):
+        """
+        Args:
+            model_name (str): fastembed dense model name.
+            similarity_threshold (float): Minimal cosine similarity of an error to its group leader.
+            batch_size (int): Number of texts embedded at once.
+        """
+        self.model_name = model_name or DEFAULT_DENSE_MODEL_NAME
+        self.similarity_threshold = similarity_threshold
+        self.batch_size = batch_size
+        self._model = None
+
+    def embed_texts(self, texts: list) -> np.ndarray:
+        if self._model is None:
+            from fastembed import TextEmbedding
+            self._model = TextEmbedding(model_name=self.model_name)
+
+        return np.array(list(self._model.embed(texts, batch_size=self.batch_size)), dtype=np.float32)
+
+    def group(self, aggregated_errors: dict) -> dict:
+        """
+        Groups errors by semantic similarity of their type and message.
+
+        Args:
+            aggregated_errors (dict): Error groups of the parser.
+
+        Returns:
+            dict: Leader key -> list of (member key, similarity) of the errors merged into the leader,
+                leaders keep the order of aggregated_errors.
+        """
+        keys = list(aggregated_errors.keys())
+        if not keys:
+            return {}
+
+        texts = [f"{aggregated_errors[key]['type']}: {aggregated_errors[key]['message']}" for key in keys]
+        vectors = self.embed_texts(texts)
+        leader_indexes = cluster_by_similarity(vectors, self.similarity_threshold)
+
+        groups = {}
+        for idx, (leader_idx, similarity) in enumerate(leader_indexes):
+            if leader_idx == idx:
+                groups[keys[idx]] = []
+            else:
+                groups[keys[leader_idx]].append((keys[idx], similarity))
+
+        logging.info(f"Semantic grouping merged {len(keys)} errors into {len(groups)} groups")
+        return groups
+
+
+def cluster_by_similarity(vectors: np.ndarray, similarity_threshold: float) -> list:
+    """
+    Greedy leader clustering: every vector joins the most similar earlier leader if the cosine similarity
+    reaches the threshold, otherwise it becomes a leader itself.
+
+    Args:
+        vectors (np.ndarray): Matrix of embeddings, one row per item.
+        similarity_threshold (float): Minimal cosine similarity to join a leader.
+
+    Returns:
+        list: (leader index, similarity) for every vector, leaders point to themselves with similarity 1.0.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    normalized = vectors / np.where(norms == 0, 1, norms)
+
+    leaders = np.empty_like(normalized)
+    leader_indexes = []
+    result = []
+
+    for idx, vector in enumerate(normalized):
+        if leader_indexes:
+            similarities = leaders[:len(leader_indexes)] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= similarity_threshold:
+                result.append((leader_indexes[best], float(similarities[best])))
+                continue
+
+        leaders[len(leader_indexes)] = vector
+        leader_indexes.append(idx)
+        result.append((idx, 1.0))
+
+    return result
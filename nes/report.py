@@ -0,0 +1,174 @@
+import heapq
+import logging
+import json
+import math
+import re
+from datetime import datetime, timezone
+from nes.scheduler import DEFAULT_SEVERITY, ERROR_TYPE_SEVERITY, parse_timestamp
+
+TOP_ORDERS = ['count', 'severity']
+
+HISTOGRAM_BUCKETS = {
+    'minute': (60, '%Y-%m-%d %H:%M'),
+    'hour': (3600, '%Y-%m-%d %H:00'),
+}
+
+REPORT_FORMATS = ['json', 'jsonl']
+
+# Distinct minutes remembered by TimeBucketer, entries of the same minute share the parsed bucket
+BUCKET_CACHE_SIZE = 65536
+
+# Seconds of the timestamp time, they never change minute and hour buckets
+TIMESTAMP_SECONDS_REGEX = re.compile(r'(\d{1,2}:\d{2}):\d{2}(?:[.,]\d+)?')
+
+# Write buffer of report files, the report is written group by group
+REPORT_WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def get_top_groups(aggregated_errors: dict, top: int = 0, order: str = 'count') -> list:
+    """
+    Returns the most important error groups without sorting all of them.
+
+    Args:
+        aggregated_errors (dict): Error groups by their key.
+        top (int): Number of groups, 0 means all groups sorted.
+        order (str): "count" (the most frequent first) or "severity" (the most severe first, then the most frequent).
+
+    Returns:
+        list: Error groups, the most important first, groups of equal rank keep their order.
+    """
+    if order == 'count':
+        key = get_group_count
+    elif order == 'severity':
+        key = get_group_severity_rank
+    else:
+        raise Exception(f"Unknown top order {order}, available: {', '.join(TOP_ORDERS)}")
+
+    if top <= 0 or top >= len(aggregated_errors):
+        return sorted(aggregated_errors.values(), key=key, reverse=True)
+    # heapq.nlargest keeps only top groups in memory: O(n log top) instead of sorting all groups
+    return heapq.nlargest(top, aggregated_errors.values(), key=key)
+
+
+def get_group_count(group: dict) -> int:
+    return group['count']
+
+
+def get_group_severity_rank(group: dict) -> tuple:
+    return ERROR_TYPE_SEVERITY.get(group.get('type'), DEFAULT_SEVERITY), group['count']
+
+
+class TimeBucketer(object):
+    """
+    Maps entry timestamps to time buckets of histograms ("2025-06-29 10:05" for minute buckets).
+    Buckets are in UTC, entries with timestamps which can't be parsed get no bucket, they are counted
+    in unparsed_count and reported by log_unparsed.
+    """
+
+    def __init__(self, bucket: str = 'minute'):
+        if bucket not in HISTOGRAM_BUCKETS:
+            raise Exception(f"Unknown histogram bucket {bucket}, available: {', '.join(HISTOGRAM_BUCKETS)}")
+
+        self.bucket = bucket
+        self.bucket_seconds, self.bucket_format = HISTOGRAM_BUCKETS[bucket]
+        self.unparsed_count = 0
+        self.unparsed_example = None
+        self._cache = {}
+
+    def get_bucket(self, timestamp: str) -> str | None:
+        # Timestamps are parsed once per minute, parsing is much slower than the cache lookup
+        timestamp = TIMESTAMP_SECONDS_REGEX.sub(r'\1:00', timestamp, 1)
+        bucket = self._cache.get(timestamp)
+        if bucket is not None or timestamp in self._cache:
+            return bucket
+
+        parsed = parse_timestamp(timestamp)
+        if parsed is not None:
+            bucket_start = math.floor(parsed / self.bucket_seconds) * self.bucket_seconds
+            bucket = datetime.fromtimestamp(bucket_start, timezone.utc).strftime(self.bucket_format)
+        elif self.unparsed_example is None:
+            self.unparsed_example = timestamp
+
+        if len(self._cache) >= BUCKET_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[timestamp] = bucket
+        return bucket
+
+    def add(self, group: dict, timestamp: str):
+        """
+        Counts the entry in the "histogram" of the error group.
+        """
+        bucket = self.get_bucket(timestamp)
+        if bucket is None:
+            self.unparsed_count += 1
+            return
+
+        histogram = group.get('histogram')
+        if histogram is None:
+            histogram = group['histogram'] = {}
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+
+    def log_unparsed(self, file_path: str):
+        if self.unparsed_count:
+            logging.warning(f"Histogram of {file_path}: {self.unparsed_count} entries are not counted, "
+                            f"their timestamps can't be parsed, e.g. \"{self.unparsed_example}\"")
+
+
+def get_time_bucketer(bucket: str = '') -> TimeBucketer | None:
+    return TimeBucketer(bucket) if bucket else None
+
+
+def merge_histograms(error_group: dict, other_group: dict):
+    """
+    Adds histogram of other_group to error_group, buckets stay in time order.
+    """
+    if not other_group.get('histogram'):
+        return
+
+    histogram = error_group.get('histogram') or {}
+    for bucket, count in other_group['histogram'].items():
+        histogram[bucket] = histogram.get(bucket, 0) + count
+    error_group['histogram'] = dict(sorted(histogram.items()))
+
+
+def get_histogram_peak(histogram: dict) -> tuple:
+    """
+    Returns:
+        tuple: (bucket, count) of the bucket with the most entries, the earliest of equal ones.
+    """
+    return max(histogram.items(), key=lambda item: item[1])
+
+
+def write_json_dict(content: dict, file_path: str, indent: int = 4):
+    """
+    Writes the dict to a JSON file item by item, the output is the same as json.dumps(content, indent=indent),
+    but only a single item is serialized in memory at a time.
+    """
+    padding = ' ' * indent
+    with open(file_path, 'w', encoding='utf-8', buffering=REPORT_WRITE_BUFFER_SIZE) as f:
+        if not content:
+            f.write('{}')
+            return
+
+        f.write('{')
+        separator = "\n"
+        for key, value in content.items():
+            value_json = json.dumps(value, indent=indent).replace("\n", "\n" + padding)
+            f.write(f"{separator}{padding}{json.dumps(get_json_key(key))}: {value_json}")
+            separator = ",\n"
+        f.write("\n}")
+
+
+def write_jsonl(content: dict, file_path: str):
+    """
+    Writes the dict to a JSONL file, one line per item: the item dict with its "key", other values as {"key", "value"}.
+    """
+    with open(file_path, 'w', encoding='utf-8', buffering=REPORT_WRITE_BUFFER_SIZE) as f:
+        for key, value in content.items():
+            record = {'key': key, **value} if isinstance(value, dict) else {'key': key, 'value': value}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def get_json_key(key) -> str:
+    # json.dumps converts keys of dicts to strings the same way
+    return key if isinstance(key, str) else json.dumps(key)
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+import time
+
+JOURNAL_STATES = ['pending', 'in_flight', 'done', 'failed']
+
+JOURNAL_FILE_NAME = 'journal.jsonl'
+
+
+class RunJournal(object):
+    """
+    Append-only JSONL journal of the run: every state change of an error group (pending, in_flight, done, failed)
+    is a {"key", "state", "time"[, "error"]} record, the latest record of a key wins.
+
+    Records are buffered and written with one fsync per batch (fsync_batch_size records or fsync_interval_seconds),
+    so journaling costs one disk sync per batch instead of one per LLM call. A crash loses at most the last batch,
+    groups of the lost records are processed again (their responses are usually in the LLM cache).
+    """
+
+    def __init__(self, file_path: str, fsync_batch_size: int = 64, fsync_interval_seconds: float = 1.0):
+        self.file_path = file_path
+        self.fsync_batch_size = max(1, fsync_batch_size)
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self.states = {}
+        self.attempts = {}
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._synced_at = time.monotonic()
+
+        if os.path.isfile(file_path):
+            self.load()
+        self._file = open(file_path, 'a', encoding='utf-8')
+
+    def load(self):
+        with open(self.file_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last record is torn if the process was killed while writing it
+                    continue
+
+                self.states[record['key']] = record['state']
+                if record['state'] == 'in_flight':
+                    self.attempts[record['key']] = self.attempts.get(record['key'], 0) + 1
+
+        logging.info(f"Run journal {self.file_path}: {self.get_counts()}")
+
+    def get_state(self, key) -> str | None:
+        return self.states.get(str(key))
+
+    def is_done(self, key) -> bool:
+        return self.states.get(str(key)) == 'done'
+
+    def mark(self, keys: list, state: str, error: BaseException | None = None):
+        """
+        Records the new state of the error groups, the records are written to disk with the batch.
+        """
+        now = round(time.time(), 3)
+        with self._lock:
+            for key in keys:
+                key = str(key)
+                self.states[key] = state
+                record = {'key': key, 'state': state, 'time': now}
+                if state == 'in_flight':
+                    self.attempts[key] = self.attempts.get(key, 0) + 1
+                if error is not None:
+                    record['error'] = f"{type(error).__name__}: {error}"
+                self._buffer.append(json.dumps(record, ensure_ascii=False))
+
+            if len(self._buffer) >= self.fsync_batch_size or time.monotonic() - self._synced_at >= self.fsync_interval_seconds:
+                self._sync()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer = []
+        self._synced_at = time.monotonic()
+
+    def get_counts(self) -> dict:
+        with self._lock:
+            states = list(self.states.values())
+        return {state: states.count(state) for state in JOURNAL_STATES}
+
+    def get_unfinished_count(self) -> int:
+        counts = self.get_counts()
+        return counts['pending'] + counts['in_flight'] + counts['failed']
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            self._file.close()
@@ -0,0 +1,228 @@
+import functools
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+# Severity of NES/OpenCart (PHP) error types of LOG_ENTRY_REGEX and of generic log markers, 1.0 is the most important
+ERROR_TYPE_SEVERITY = {
+    'PHP Fatal error': 1.0,
+    'PHP Parse error': 1.0,
+    'PHP Core error': 1.0,
+    'PHP Compile error': 1.0,
+    'PHP User error': 0.8,
+    'PHP Warning': 0.5,
+    'PHP Core warning': 0.5,
+    'PHP Compile warning': 0.5,
+    'PHP User warning': 0.4,
+    'PHP Notice': 0.2,
+    'PHP User notice': 0.2,
+    'PHP Strict Standards': 0.15,
+    'PHP Deprecated': 0.1,
+    'PHP User deprecated': 0.1,
+    'emergency': 1.0,
+    'critical': 0.9,
+    'error': 0.7,
+    'warning': 0.4,
+}
+
+DEFAULT_SEVERITY = 0.5
+
+DEFAULT_WEIGHTS = {
+    'severity': 4.0,
+    'count': 2.0,
+    'recency': 1.0,
+    'novelty': 1.0,
+}
+
+TIMESTAMP_FORMATS = [
+    '%d-%b-%Y %H:%M:%S %Z',
+    '%d-%b-%Y %H:%M:%S',
+    '%d/%b/%Y:%H:%M:%S %z',
+    '%d/%b/%Y %H:%M:%S',
+]
+
+# Formats of timestamps followed by a named time zone of PHP date.timezone, e.g. "28-Aug-2025 13:45:06 Europe/Kiev"
+ZONED_TIMESTAMP_FORMATS = [
+    '%d-%b-%Y %H:%M:%S',
+    '%d/%b/%Y %H:%M:%S',
+]
+
+
+class ErrorScheduler(object):
+    """
+    Orders error groups by priority, so the most important errors are analyzed first:
+    severity of the error type, number of occurrences, recency of the last occurrence and novelty
+    (how late in the log the error appeared first).
+    """
+
+    def __init__(self, weights: dict = None):
+        """
+        Args:
+            weights (dict): Weights of severity, count, recency and novelty, None means DEFAULT_WEIGHTS.
+        """
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+    @classmethod
+    def from_config(cls, weights_config: str = ''):
+        """
+        Creates scheduler from "name=weight,name=weight" string, e.g. "severity=4,count=2,recency=1,novelty=1".
+        """
+        weights = {}
+        for item in weights_config.split(','):
+            name, _, weight = item.strip().partition('=')
+            if name and weight:
+                if name not in DEFAULT_WEIGHTS:
+                    raise Exception(f"Unknown scheduler weight {name}, available: {', '.join(DEFAULT_WEIGHTS)}")
+                weights[name] = float(weight)
+
+        return cls(weights)
+
+    def get_scores(self, error_groups: dict) -> dict:
+        """
+        Args:
+            error_groups (dict): NES/OpenCart error groups of the parser or log clusters of LogTemplateMiner.
+
+        Returns:
+            dict: Key -> priority score.
+        """
+        first_times = {key: parse_timestamp(get_group_timestamp(group, 'first')) for key, group in error_groups.items()}
+        last_times = {key: parse_timestamp(get_group_timestamp(group, 'last')) for key, group in error_groups.items()}
+        known_times = [value for value in list(first_times.values()) + list(last_times.values()) if value is not None]
+        min_time = min(known_times, default=None)
+        time_range = (max(known_times) - min_time) if known_times else 0
+        max_count_log = math.log1p(max((group.get('count', 1) for group in error_groups.values()), default=1))
+
+        scores = {}
+        for key, group in error_groups.items():
+            severity = ERROR_TYPE_SEVERITY.get(group.get('type') or group.get('severity'), DEFAULT_SEVERITY)
+            count = math.log1p(group.get('count', 1)) / max_count_log if max_count_log else 0
+            recency = get_time_position(last_times[key], min_time, time_range)
+            novelty = get_time_position(first_times[key], min_time, time_range)
+            scores[key] = (self.weights['severity'] * severity + self.weights['count'] * count
+                           + self.weights['recency'] * recency + self.weights['novelty'] * novelty)
+
+        return scores
+
+    def order(self, error_groups: dict) -> dict:
+        """
+        Returns error groups sorted by priority, highest first, equal scores keep the original order.
+        """
+        scores = self.get_scores(error_groups)
+        ordered_keys = sorted(error_groups, key=lambda key: scores[key], reverse=True)
+        return {key: error_groups[key] for key in ordered_keys}
+
+
+class RunBudget(object):
+    """
+    Limits LLM requests of a run by wall-clock time and number of calls, the run stops gracefully:
+    requests in progress are finished, not started ones are skipped.
+    """
+
+    def __init__(self, max_seconds: float = 0, max_calls: int = 0, started_at: float | None = None):
+        """
+        Args:
+            max_seconds (float): Time budget from started_at, 0 means unlimited.
+            max_calls (int): Maximum number of LLM requests, 0 means unlimited.
+            started_at (float | None): time.monotonic() of the run start, so parsing counts against the budget too,
+                None means the creation of the budget.
+        """
+        self.max_seconds = max_seconds
+        self.max_calls = max_calls
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.calls = 0
+        self.skipped = 0
+
+    def get_remaining_seconds(self) -> float | None:
+        if self.max_seconds <= 0:
+            return None
+        return self.max_seconds - (time.monotonic() - self.started_at)
+
+    def try_acquire(self) -> bool:
+        """
+        Reserves one LLM request, returns False and counts the request as skipped if the budget is exhausted.
+        """
+        remaining_seconds = self.get_remaining_seconds()
+        if (self.max_calls and self.calls >= self.max_calls) or (remaining_seconds is not None and remaining_seconds <= 0):
+            if self.skipped == 0:
+                logging.warning(f"Run budget exhausted after {self.calls} LLM requests, remaining errors are skipped")
+            self.skipped += 1
+            return False
+
+        self.calls += 1
+        return True
+
+
+def get_group_timestamp(group: dict, position: str) -> str | None:
+    timestamp = group.get(f'{position}_timestamp')
+    if timestamp:
+        return timestamp
+
+    timestamps = group.get('timestamps') or []
+    if not timestamps:
+        return None
+    return timestamps[0] if position == 'first' else timestamps[-1]
+
+
+def parse_timestamp(timestamp: str | None) -> float | None:
+    if not timestamp:
+        return None
+
+    timestamp = timestamp.strip('[] ')
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace(',', '.'))
+    except ValueError:
+        parsed = None
+
+    for timestamp_format in TIMESTAMP_FORMATS:
+        if parsed is not None:
+            break
+        try:
+            parsed = datetime.strptime(timestamp, timestamp_format)
+        except ValueError:
+            continue
+
+    if parsed is None:
+        parsed = parse_zoned_timestamp(timestamp)
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_zoned_timestamp(timestamp: str) -> datetime | None:
+    """
+    Parses timestamp with a named time zone as its last token, %Z of TIMESTAMP_FORMATS accepts only UTC and GMT.
+    """
+    local_timestamp, _, zone_name = timestamp.rpartition(' ')
+    zone = get_time_zone(zone_name) if local_timestamp else None
+    if zone is None:
+        return None
+
+    for timestamp_format in ZONED_TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(local_timestamp, timestamp_format).replace(tzinfo=zone)
+        except ValueError:
+            continue
+
+    return None
+
+
+@functools.lru_cache(maxsize=64)
+def get_time_zone(zone_name: str) -> ZoneInfo | None:
+    try:
+        return ZoneInfo(zone_name)
+    except (KeyError, ValueError, OSError):
+        # ZoneInfoNotFoundError is a KeyError, malformed names raise ValueError
+        return None
+
+
+def get_time_position(value: float | None, min_time: float | None, time_range: float) -> float:
+    # Position of the time in the log time range: 0 is the beginning, 1 is the end, unknown time is in the middle
+    if value is None or min_time is None:
+        return 0.5
+    if time_range <= 0:
+        return 1.0
+    return (value - min_time) / time_range
@@ -0,0 +1,47 @@
+import logging
+import math
+
+# Average number of characters per token, used only when no tokenizer is available
+APPROXIMATE_CHARS_PER_TOKEN = 4
+
+
+class TokenCounter(object):
+    """
+    Counts prompt tokens with the best available tokenizer:
+    Hugging Face tokenizer of the model (tokenizers package is installed with fastembed), tiktoken, or a rough estimate.
+    """
+
+    def __init__(self, tokenizer_name: str = ''):
+        """
+        Args:
+            tokenizer_name (str): Hugging Face model name with tokenizer, e.g. Qwen/Qwen3-Coder-30B-A3B-Instruct.
+        """
+        self.tokenizer_name = tokenizer_name
+        self.backend = 'approximate'
+        self._encode = None
+
+        if tokenizer_name:
+            try:
+                from tokenizers import Tokenizer
+                tokenizer = Tokenizer.from_pretrained(tokenizer_name)
+                self._encode = lambda text: tokenizer.encode(text, add_special_tokens=False).ids
+                self.backend = f"tokenizers:{tokenizer_name}"
+            except Exception as e:
+                logging.warning(f"Tokenizer {tokenizer_name} is not available: {e}")
+
+        if self._encode is None:
+            try:
+                import tiktoken
+                encoding = tiktoken.get_encoding('cl100k_base')
+                self._encode = lambda text: encoding.encode(text, disallowed_special=())
+                self.backend = 'tiktoken:cl100k_base'
+            except Exception as e:
+                logging.warning(f"No tokenizer available, token counts are approximated: {e}")
+
+        logging.info(f"Token counter backend: {self.backend}")
+
+    def count(self, text: str) -> int:
+        if self._encode is None:
+            return math.ceil(len(text) / APPROXIMATE_CHARS_PER_TOKEN)
+
+        return len(self._encode(text))
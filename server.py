@@ -0,0 +1,88 @@
+from datetime import datetime
+import argparse
+import os
+import logging
+import dotenv
+from nes.functions import init_llm_backend, get_configured_llm_model, LLM_BACKENDS
+from nes.analysis_server import AnalysisService, create_http_server
+from nes.llm_cache import LlmResponseCache
+from nes.log_filter import ErrorLineMatcher
+from nes.output_sink import OUTPUT_SINK_TYPES
+from nes.scheduler import ErrorScheduler
+
+# Environment is read once, the server keeps the LLM client, prompts, translations and cache for all jobs
+dotenv.load_dotenv()
+
+DIR_CURRENT = os.getenv("DIR_ROOT")
+DIR_LOGS = os.environ.get('DIR_LOGS')
+os.makedirs(DIR_LOGS, exist_ok=True)
+
+current_log_level = logging.DEBUG if bool(os.environ.get("IS_DEBUG")) else logging.INFO
+logging.basicConfig(level=current_log_level,
+                    format='[%(asctime)s][%(levelname)s][%(threadName)s] - %(message)s',
+                    filename=f"{DIR_LOGS}server-{datetime.now().strftime(format='%Y%m%d-%H%M%S')}.log",
+                    filemode='a'
+                    )
+
+args = argparse.ArgumentParser(description='Long-running analyzer of NES/OpenCart and other log files, accepts jobs over HTTP or Unix socket')
+args.add_argument('--host', type=str, dest='host', default=os.environ.get('SERVER_HOST') or '127.0.0.1', required=False, help='Address to listen on')
+args.add_argument('--port', type=int, dest='port', default=int(os.environ.get('SERVER_PORT') or 8089), required=False, help='Port to listen on')
+args.add_argument('--socket', type=str, dest='socket_path', default=os.environ.get('SERVER_SOCKET') or '', required=False, help='Listen on this Unix socket instead of host and port')
+args.add_argument('--lang', type=str, dest='language', default="en", required=False, help='Default processing language of jobs, available: uk, en')
+args.add_argument('--model', type=str, dest='model', default="", required=False, help='LLM Model for log processing')
+args.add_argument('--oc', type=bool, dest='is_nes_parsing', default=True, required=False, help='Parse jobs as NES/OpenCart logs unless the job says otherwise')
+args.add_argument('--concurrency', type=int, dest='concurrency', default=int(os.environ.get('LLM_MAX_CONCURRENCY') or 1), required=False, help='Maximum number of parallel LLM requests of all jobs')
+args.add_argument('--job-workers', type=int, dest='job_workers', default=int(os.environ.get('SERVER_JOB_WORKERS') or 2), required=False, help='Number of jobs parsed and processed at the same time')
+args.add_argument('--workers', type=int, dest='parser_workers', default=int(os.environ.get('LOG_PARSER_WORKERS') or 1), required=False, help='Number of processes to parse log files of a job')
+args.add_argument('--sink', type=str, dest='output_sink', default=os.environ.get('OUTPUT_SINK') or 'files', choices=OUTPUT_SINK_TYPES, required=False, help='Where to save AI analyses of every job, see main.py --sink')
+args.add_argument('--llm-backend', type=str, dest='llm_backend', default=os.environ.get('LLM_BACKEND') or 'live', choices=LLM_BACKENDS, required=False, help='live, record, replay or synthetic, see main.py --llm-backend')
+args.add_argument('--llm-recordings', type=str, dest='llm_recordings', default='', required=False, help='JSONL file of recorded prompts and responses for record and replay backends')
+args.add_argument('--no-cache', dest='is_cache_disabled', action='store_true', help='Do not read or write persistent LLM response cache')
+args = args.parse_args()
+
+CURRENT_LLM_MODEL = os.environ.get('LOCAL_OLLAMA_MODEL_CODER')
+CURRENT_LLM_NUM_CTX = int(os.environ.get('LOCAL_OLLAMA_MODEL_CODER_NUM_CTX'))
+if args.model != "":
+    CURRENT_LLM_MODEL = args.model
+    CURRENT_LLM_NUM_CTX = int(os.environ.get('LOCAL_OLLAMA_MODEL_DEFAULT_NUM_CTX'))
+
+# Unlike main.py the client is created at once, so the first job does not wait for it
+llm = init_llm_backend(args.llm_backend, CURRENT_LLM_MODEL, CURRENT_LLM_NUM_CTX, recordings_path=args.llm_recordings)
+LLM_MODEL_NAME = 'synthetic' if args.llm_backend == 'synthetic' else get_configured_llm_model(args.model)
+
+llm_cache = None
+if not args.is_cache_disabled:
+    llm_cache = LlmResponseCache(os.environ.get('LLM_CACHE_PATH') or f"{DIR_CURRENT}/cache/llm-cache.sqlite",
+                                 ttl_seconds=int(os.environ.get('LLM_CACHE_TTL_SECONDS') or 7 * 24 * 3600),
+                                 max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES') or 100000))
+
+service = AnalysisService(llm, LLM_MODEL_NAME, os.environ.get('SERVER_OUTPUTS_DIR') or f"{DIR_CURRENT}/outputs/server",
+                          cache=llm_cache,
+                          max_concurrency=args.concurrency,
+                          job_workers=args.job_workers,
+                          max_retries=int(os.environ.get('LLM_MAX_RETRIES') or 3),
+                          retry_backoff_seconds=float(os.environ.get('LLM_RETRY_BACKOFF_SECONDS') or 1.0),
+                          default_language=args.language,
+                          is_nes_parsing=args.is_nes_parsing,
+                          output_sink=args.output_sink,
+                          error_line_matcher=ErrorLineMatcher.from_config(os.environ.get('LOG_ERROR_MARKERS') or '', bool(os.environ.get('LOG_ERROR_MARKERS_CASE_INSENSITIVE'))),
+                          scheduler=ErrorScheduler.from_config(os.environ.get('SCHEDULER_WEIGHTS') or ''),
+                          log_roots=[log_root.strip() for log_root in (os.environ.get('SERVER_LOG_ROOTS') or '').split(',') if log_root.strip()],
+                          max_finished_jobs=int(os.environ.get('SERVER_MAX_FINISHED_JOBS') or 1000),
+                          parser_workers=args.parser_workers)
+service.start(sorted(name for name in os.listdir(os.path.join(DIR_CURRENT, 'nes', 'i18n')) if os.path.isdir(os.path.join(DIR_CURRENT, 'nes', 'i18n', name)) and not name.startswith('_')))
+
+http_server = create_http_server(service, args.host, args.port, args.socket_path)
+address = args.socket_path or f"http://{args.host}:{args.port}"
+logging.info(f"Serving log analysis with {LLM_MODEL_NAME} on {address}")
+print(f"Serving log analysis with {LLM_MODEL_NAME} on {address}, press Ctrl+C to stop")
+
+try:
+    http_server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    http_server.server_close()
+    service.stop()
+    if llm_cache:
+        llm_cache.close()
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import pytest
+from langchain_core.messages import AIMessage
+from nes.analysis_server import AnalysisService, create_http_server
+from nes.llm_cache import LlmResponseCache
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRIES = (
+    "[29-Jun-2025 18:35:49 UTC] PHP Warning:  Undefined array key \"name\" in /var/www/catalog/controller/product/product.php on line 120\n"
+    "[29-Jun-2025 18:35:50 UTC] PHP Notice:  Undefined index: title in /var/www/catalog/view/theme/default/template/common/header.php on line 15\n"
+    "[29-Jun-2025 18:35:51 UTC] PHP Warning:  Undefined array key \"name\" in /var/www/catalog/controller/product/product.php on line 120\n"
+    "[29-Jun-2025 18:35:52 UTC] PHP Fatal error:  Allowed memory size of 134217728 bytes exhausted in /var/www/system/library/db.php on line 45\n"
+)
+
+
+class GatedLlm(object):
+    """
+    Answers prompts after the gate is opened, counts the calls.
+    """
+
+    def __init__(self, is_open: bool = True):
+        self.gate = threading.Event()
+        if is_open:
+            self.gate.set()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.calls += 1
+        self.gate.wait(10)
+        return AIMessage(content='analysis', id=f"run-{self.calls}")
+
+
+@pytest.fixture
+def create_service(tmp_path, monkeypatch):
+    # Prompt templates are read relative to the working directory
+    monkeypatch.chdir(REPO_DIR)
+    services = []
+
+    def create(llm, **kwargs) -> AnalysisService:
+        service = AnalysisService(llm, 'fake', str(tmp_path / 'outputs'), **kwargs)
+        service.start(['en'])
+        services.append(service)
+        return service
+
+    yield create
+    for service in services:
+        service.stop()
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_jobs_with_the_same_errors_share_llm_requests(create_service):
+    llm = GatedLlm(is_open=False)
+    service = create_service(llm, max_concurrency=4, job_workers=2)
+
+    jobs = [service.submit({'entries': ENTRIES}) for _ in range(2)]
+    # Both jobs wait for the same 3 requests
+    wait_for(lambda: service.coalesced_requests == 3)
+    llm.gate.set()
+    for job in jobs:
+        assert job.finished.wait(10)
+
+    assert llm.calls == 3
+    # Jobs run at the same time, every error is analyzed for one of them and coalesced for the other
+    assert [(job.status, job.groups_total, job.analyzed + job.coalesced) for job in jobs] == [('done', 3, 3)] * 2
+    assert sum(job.analyzed for job in jobs) == sum(job.coalesced for job in jobs) == 3
+    assert jobs[0].get_results()['results'] == jobs[1].get_results()['results']
+    assert service.get_status()['llm_requests_in_flight'] == 0
+
+
+def test_cached_analyses_are_reused(create_service, tmp_path):
+    llm = GatedLlm()
+    cache = LlmResponseCache(str(tmp_path / 'llm_cache.sqlite'))
+    service = create_service(llm, cache=cache)
+
+    for expected_cached in (0, 3):
+        job = service.submit({'entries': ENTRIES})
+        assert job.finished.wait(10)
+        assert (job.status, job.cached, len(job.get_results()['results'])) == ('done', expected_cached, 3)
+    assert llm.calls == 3
+    cache.close()
+
+
+def test_log_paths_outside_of_log_roots(create_service, tmp_path):
+    service = create_service(GatedLlm())
+    with pytest.raises(ValueError, match='Log paths are not allowed'):
+        service.submit({'log': str(tmp_path)})
+
+    log_root = tmp_path / 'logs'
+    log_root.mkdir()
+    (log_root / 'error_log').write_text(ENTRIES)
+    (tmp_path / 'secret_log').write_text(ENTRIES)
+    service = create_service(GatedLlm(), log_roots=[str(log_root)])
+
+    with pytest.raises(ValueError, match='outside of allowed directories'):
+        service.submit({'log': str(tmp_path / 'secret_log')})
+
+    # Symlink leads outside of the log root only when the glob is resolved
+    (log_root / 'linked_log').symlink_to(tmp_path / 'secret_log')
+    job = service.submit({'log': str(log_root / '*')})
+    assert job.finished.wait(10)
+    assert job.status == 'failed' and job.error.startswith('PermissionError')
+
+    job = service.submit({'log': str(log_root / 'error_*')})
+    assert job.finished.wait(10)
+    assert (job.status, job.groups_total) == ('done', 3)
+
+
+def request_json(url: str, body: dict | list | None = None) -> tuple:
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_api(create_service):
+    service = create_service(GatedLlm())
+    server = create_http_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        status, job = request_json(f"{base_url}/jobs", {'entries': ENTRIES, 'language': 'en'})
+        assert status == 202 and job['status'] in ('queued', 'running', 'done')
+
+        status, job = request_json(f"{base_url}/jobs/{job['id']}?wait=10")
+        assert (status, job['status'], job['groups_done']) == (200, 'done', 3)
+        status, results = request_json(f"{base_url}/jobs/{job['id']}/results")
+        assert status == 200 and len(results['results']) == 3
+
+        assert request_json(f"{base_url}/health")[1]['jobs']['done'] == 1
+        assert request_json(f"{base_url}/jobs/{job['id']}?wait=soon")[0] == 400
+        assert request_json(f"{base_url}/jobs/unknown")[0] == 404
+        assert request_json(f"{base_url}/jobs", ['not', 'an', 'object'])[0] == 400
+        assert request_json(f"{base_url}/jobs", {'entries': ENTRIES, 'language': 'xx'})[0] == 400
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,93 @@
+import os
+import pytest
+import nes.apache_php_log_parser as parser
+from nes.fingerprint import FINGERPRINT_RULES, Fingerprinter, hash_text
+
+EXAMPLE_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example', 'error_log')
+
+TRACE = ("Stack trace:\n"
+         "#0 /home/store1/public_html/system/engine/loader.php(48): ModelCatalogProduct->getProduct('{id}')\n"
+         "#1 /home/store1/public_html/catalog/controller/product/product.php({line}): Loader->model('catalog/product')\n"
+         "#2 {{main}}\n"
+         "  thrown in /home/store1/public_html/catalog/model/catalog/product.php on line {line}")
+
+
+def read_example_entries() -> list:
+    entries = []
+    for entry_text in parser.iter_log_entries(parser.iter_log_lines(EXAMPLE_LOG_PATH)):
+        match = parser.LOG_ENTRY_REGEX.match(entry_text)
+        if match:
+            entries.append((match.group(2).strip(), match.group(3).strip()))
+    return entries
+
+
+def get_reference_key(fingerprinter: Fingerprinter, error_type: str, message_and_trace: str) -> str:
+    # The rules applied to the whole message and trace, without caches and without splitting them into parts
+    error_message, separator, stack_trace = message_and_trace.partition('Stack trace:')
+    if separator:
+        error_message, stack_trace = error_message.strip(), separator + stack_trace.strip()
+    normalized_trace = fingerprinter.apply_rules(stack_trace) if separator else ''
+    return hash_text('|'.join([error_type, fingerprinter.apply_rules(error_message), normalized_trace]))
+
+
+@pytest.mark.parametrize('disabled_rules', [[], ['path'], ['number'], ['hex', 'uuid', 'ip']])
+def test_cached_keys_equal_keys_of_the_rules(disabled_rules):
+    fingerprinter = Fingerprinter(disabled_rules=disabled_rules)
+    reference_fingerprinter = Fingerprinter(disabled_rules=disabled_rules)
+
+    entries = read_example_entries()
+    # The second pass is served from the caches
+    for error_type, message_and_trace in entries + entries:
+        unique_key = fingerprinter.fingerprint(error_type, message_and_trace)[0]
+        assert unique_key == get_reference_key(reference_fingerprinter, error_type, message_and_trace)
+
+
+def test_same_error_of_different_stores_and_ids_has_the_same_key():
+    fingerprinter = Fingerprinter()
+    keys = {
+        fingerprinter.fingerprint('PHP Fatal error', f"Uncaught Exception: Product {product_id} not found in "
+                                                     f"{store_path}/catalog/model/catalog/product.php:{line} "
+                                                     + TRACE.format(id=product_id, line=line).replace('/home/store1/public_html', store_path))[0]
+        for product_id, store_path, line in [(12345, '/home/store1/public_html', 120), (67890, '/var/www/store2', 131)]
+    }
+    assert len(keys) == 1
+
+
+def test_different_errors_have_different_keys():
+    fingerprinter = Fingerprinter()
+    message = "Uncaught Exception: Product not found in /var/www/catalog/model/catalog/product.php:120 "
+    trace = TRACE.format(id=1, line=120)
+    keys = [
+        fingerprinter.fingerprint('PHP Fatal error', message + trace)[0],
+        fingerprinter.fingerprint('PHP Warning', message + trace)[0],
+        fingerprinter.fingerprint('PHP Fatal error', message + trace.replace('getProduct', 'getProducts'))[0],
+        fingerprinter.fingerprint('PHP Fatal error', message.replace('Product', 'Category') + trace)[0],
+    ]
+    assert len(set(keys)) == len(keys)
+
+
+def test_short_numbers_are_kept_by_the_shape_cache():
+    fingerprinter = Fingerprinter()
+    # Messages of the same digit shape, 1-2 digit numbers are a part of the error, longer numbers are IDs
+    keys = [fingerprinter.fingerprint('PHP Notice', f"Undefined offset: {offset} in /var/www/system/library/cart.php on line 7")[0]
+            for offset in (5, 7, 5, 42, 43)]
+    assert keys[0] == keys[2]
+    assert len({keys[0], keys[1], keys[3], keys[4]}) == 4
+
+    id_keys = {fingerprinter.fingerprint('PHP Notice', f"Order {order_id} has no products in /var/www/system/library/cart.php on line 7")[0]
+               for order_id in (100, 4567, 98765)}
+    assert len(id_keys) == 1
+
+
+def test_line_numbers_are_kept_with_disabled_line_rule():
+    message = "Undefined variable: x in /var/www/catalog/controller/common/header.php on line {line}"
+    assert Fingerprinter().fingerprint('PHP Notice', message.format(line=5))[0] == Fingerprinter().fingerprint('PHP Notice', message.format(line=6))[0]
+
+    fingerprinter = Fingerprinter(disabled_rules=['line'])
+    assert fingerprinter.fingerprint('PHP Notice', message.format(line=5))[0] != fingerprinter.fingerprint('PHP Notice', message.format(line=6))[0]
+
+
+def test_unknown_rule():
+    with pytest.raises(Exception, match='Unknown fingerprint rules'):
+        Fingerprinter(disabled_rules=['line', 'nothing'])
+    assert 'line' in FINGERPRINT_RULES
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import pytest
+from nes.fake_llm import FakeChatModel
+from nes.llm_backends import RecordingChatModel, ReplayChatModel, ReplayMissError
+
+
+def record_prompts(recordings_path: str, prompts: list, response_tokens: int = 8) -> list:
+    llm = RecordingChatModel(llm=FakeChatModel(response_tokens=response_tokens), recordings_path=recordings_path, model='fake')
+    return [llm.invoke(prompt).content for prompt in prompts]
+
+
+def test_replay_answers_recorded_prompts(tmp_path):
+    recordings_path = str(tmp_path / 'recordings.jsonl')
+    contents = record_prompts(recordings_path, ['first prompt', 'second prompt'])
+
+    llm = ReplayChatModel.from_file(recordings_path)
+    assert llm.model == 'fake'
+    assert [llm.invoke(prompt).content for prompt in ['first prompt', 'second prompt']] == contents
+    assert asyncio.run(llm.ainvoke('second prompt')).content == contents[1]
+    assert ''.join(chunk.content for chunk in llm.stream('first prompt')) == contents[0]
+
+    with pytest.raises(ReplayMissError):
+        llm.invoke('changed prompt')
+
+
+def test_latest_recording_wins(tmp_path):
+    recordings_path = str(tmp_path / 'recordings.jsonl')
+    record_prompts(recordings_path, ['prompt'], response_tokens=4)
+    content = record_prompts(recordings_path, ['prompt'], response_tokens=6)[0]
+
+    with open(recordings_path) as f:
+        assert len([json.loads(line) for line in f]) == 2
+    assert ReplayChatModel.from_file(recordings_path).invoke('prompt').content == content
+
+
+def test_missing_recordings(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ReplayChatModel.from_file(str(tmp_path / 'missing.jsonl'))
+
+
+@pytest.mark.parametrize('latency_distribution', ['fixed', 'uniform', 'exponential', 'lognormal'])
+def test_synthetic_latency_is_deterministic(latency_distribution):
+    llm = FakeChatModel(latency_seconds=0.05, latency_distribution=latency_distribution, seed=1)
+    latencies = [llm.get_latency(f"prompt {idx}") for idx in range(20)]
+
+    assert latencies == [FakeChatModel(latency_seconds=0.05, latency_distribution=latency_distribution, seed=1).get_latency(f"prompt {idx}")
+                         for idx in range(20)]
+    assert all(latency >= 0 for latency in latencies)
+    assert (len(set(latencies)) == 1) == (latency_distribution == 'fixed')
+
+
+def test_synthetic_answers_every_packed_error():
+    content = FakeChatModel(response_tokens=4).invoke('<error id="1">\na\n</error>\n<error id="2">\nb\n</error>\n').content
+    assert content.count('<analysis id="1">') == content.count('<analysis id="2">') == 1
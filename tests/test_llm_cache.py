@@ -0,0 +1,130 @@
+import sqlite3
+import pytest
+import nes.llm_cache as llm_cache
+from nes.llm_cache import LlmResponseCache
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_time = FakeTime()
+    monkeypatch.setattr(llm_cache, 'time', fake_time)
+    return fake_time
+
+
+def get_accessed_at(db_path, cache_key: str) -> float | None:
+    # Separate connection sees only committed access times
+    connection = sqlite3.connect(db_path)
+    try:
+        row = connection.execute("SELECT accessed_at FROM llm_responses WHERE cache_key = ?", (cache_key,)).fetchone()
+        return row[0] if row else None
+    finally:
+        connection.close()
+
+
+def test_hits_and_misses_persist(tmp_path, clock):
+    db_path = str(tmp_path / 'cache' / 'llm_cache.sqlite')
+    cache_key = LlmResponseCache.make_key('fingerprint', 'model', 'template', 'en')
+    assert cache_key != LlmResponseCache.make_key('fingerprint', 'model', 'template', 'uk')
+
+    cache = LlmResponseCache(db_path)
+    assert cache.get(cache_key) is None
+    cache.set(cache_key, {'analysis': 'Missing table'})
+    assert cache.get(cache_key) == {'analysis': 'Missing table'}
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+    cache = LlmResponseCache(db_path)
+    assert cache.get(cache_key) == {'analysis': 'Missing table'}
+    cache.close()
+
+
+def test_access_times_are_flushed_in_batches(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'ACCESS_FLUSH_SIZE', 3)
+    db_path = str(tmp_path / 'llm_cache.sqlite')
+    cache = LlmResponseCache(db_path)
+    for key in 'abcd':
+        cache.set(key, {'key': key})
+
+    clock.now += 1
+    cache.get('a')
+    cache.get('b')
+    assert get_accessed_at(db_path, 'a') == 1000.0
+
+    # Third hit fills the batch
+    cache.get('c')
+    assert [get_accessed_at(db_path, key) for key in 'abc'] == [1001.0] * 3
+
+    # Batch older than ACCESS_FLUSH_SECONDS
+    clock.now += 1
+    cache.get('a')
+    assert get_accessed_at(db_path, 'a') == 1001.0
+    clock.now += llm_cache.ACCESS_FLUSH_SECONDS - 1
+    cache.get('b')
+    assert get_accessed_at(db_path, 'a') == 1002.0
+    assert get_accessed_at(db_path, 'b') == clock.now
+
+    # set() and close() write pending access times too
+    cache.get('c')
+    cache.set('e', {'key': 'e'})
+    assert get_accessed_at(db_path, 'c') == clock.now
+    clock.now += 1
+    cache.get('d')
+    cache.close()
+    assert get_accessed_at(db_path, 'd') == clock.now
+
+
+def test_least_recently_used_are_evicted(tmp_path, clock):
+    db_path = str(tmp_path / 'llm_cache.sqlite')
+    cache = LlmResponseCache(db_path, max_entries=2)
+    for key in 'abc':
+        clock.now += 1
+        cache.set(key, {'key': key})
+
+    # Access time of the hit is not flushed yet but is used by the eviction
+    clock.now += 1
+    assert cache.get('a') == {'key': 'a'}
+    cache.evict()
+    assert [cache.get(key) is not None for key in 'abc'] == [True, False, True]
+    cache.close()
+
+
+def test_expired_responses(tmp_path, clock):
+    db_path = str(tmp_path / 'llm_cache.sqlite')
+    cache = LlmResponseCache(db_path, ttl_seconds=60)
+    cache.set('a', {'key': 'a'})
+
+    clock.now += 60
+    assert cache.get('a') == {'key': 'a'}
+    clock.now += 1
+    assert cache.get('a') is None
+    cache.evict()
+    assert get_accessed_at(db_path, 'a') is None
+    cache.close()
+
+
+def test_refresh_ignores_cached_responses(tmp_path, clock):
+    db_path = str(tmp_path / 'llm_cache.sqlite')
+    cache = LlmResponseCache(db_path)
+    cache.set('a', {'analysis': 'old'})
+    cache.close()
+
+    cache = LlmResponseCache(db_path, is_refresh=True)
+    assert cache.get('a') is None
+    assert cache.misses == 1
+    cache.set('a', {'analysis': 'new'})
+    cache.close()
+
+    cache = LlmResponseCache(db_path)
+    assert cache.get('a') == {'analysis': 'new'}
+    cache.close()
@@ -0,0 +1,89 @@
+import json
+import os
+import re
+import types
+import pytest
+from langchain_core.messages import AIMessage
+from nes.log_ai_processor import LogAiProcessor, format_batch_item
+from nes.output_sink import FileOutputSink
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ERROR_ID_REGEX = re.compile(r'<error id="(\d+)">\n(.*?)\n</error>', re.DOTALL)
+
+
+class CharTokenCounter(object):
+    def count(self, text: str) -> int:
+        return len(text)
+
+
+class FakeBatchLlm(object):
+    """
+    Answers every error of batched prompts except the errors with details in skipped_details.
+    """
+
+    def __init__(self, skipped_details: set = frozenset()):
+        self.skipped_details = skipped_details
+        self.prompts = []
+
+    def invoke(self, prompt):
+        prompt_text = prompt.to_string()
+        self.prompts.append(prompt_text)
+        errors = ERROR_ID_REGEX.findall(prompt_text)
+        if not errors:
+            return AIMessage(content='single analysis', id=f"run-{len(self.prompts)}")
+
+        content = ''.join(f'<analysis id="{position}">analysis of {details}</analysis>\n'
+                          for position, details in errors if details not in self.skipped_details)
+        return AIMessage(content=content, id=f"run-{len(self.prompts)}")
+
+
+def create_processor(outputs_dir: str, llm, pack_token_budget: int, pack_max_errors: int = 20) -> LogAiProcessor:
+    return LogAiProcessor(llm=llm, parsed_data={}, args=types.SimpleNamespace(language='en'), outputs_dir=outputs_dir,
+                          json_file_name=os.path.join(outputs_dir, 'run.json'), max_retries=0, retry_backoff_seconds=0,
+                          model_name='fake', output_sink=FileOutputSink(outputs_dir), pack_token_budget=pack_token_budget,
+                          pack_max_errors=pack_max_errors, token_counter=CharTokenCounter())
+
+
+def make_items(count: int) -> list:
+    return [(f"error{idx}", f"details {idx}", None) for idx in range(count)]
+
+
+def test_batches_fit_the_token_budget(tmp_path):
+    template = 'x' * 100
+    item_tokens = len(format_batch_item(1, 'details 0'))
+
+    processor = create_processor(str(tmp_path), None, pack_token_budget=len(template) + 2 * item_tokens)
+    batches = processor.pack_items(make_items(5), template)
+    assert [[item[0] for item in batch] for batch in batches] == [['error0', 'error1'], ['error2', 'error3'], ['error4']]
+
+    processor = create_processor(str(tmp_path), None, pack_token_budget=10000, pack_max_errors=3)
+    assert [len(batch) for batch in processor.pack_items(make_items(7), template)] == [3, 3, 1]
+
+    # Errors exceeding the budget alone are sent alone
+    processor = create_processor(str(tmp_path), None, pack_token_budget=len(template))
+    assert [len(batch) for batch in processor.pack_items(make_items(3), template)] == [1, 1, 1]
+
+
+def test_batched_answers_are_split_per_error(tmp_path, monkeypatch):
+    # Prompt templates are read relative to the working directory
+    monkeypatch.chdir(REPO_DIR)
+    outputs_dir = str(tmp_path)
+    llm = FakeBatchLlm(skipped_details={'details 1'})
+    processor = create_processor(outputs_dir, llm, pack_token_budget=10000, pack_max_errors=3)
+
+    from langchain_core.prompts import PromptTemplate
+    processor.run_packed_llm_jobs(make_items(4), PromptTemplate(input_variables=['error_details'], template='{error_details}'))
+    processor.output_sink.close()
+
+    # Batch of 3 errors, the last error alone and the unanswered error again alone
+    assert len(llm.prompts) == 3
+    assert llm.prompts[1:] == ['details 3', 'details 1']
+    assert processor.saved_keys == {'error0', 'error1', 'error2', 'error3'}
+
+    with open(os.path.join(outputs_dir, 'error2.json')) as f:
+        response_dict = json.load(f)
+    assert response_dict['content'] == 'analysis of details 2'
+    assert response_dict['batch'] == {'id': 'run-1', 'size': 3, 'position': 3}
+    with open(os.path.join(outputs_dir, 'error1.txt')) as f:
+        assert 'single analysis' in f.read()
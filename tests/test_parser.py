@@ -0,0 +1,73 @@
+import os
+import pytest
+import nes.apache_php_log_parser as parser
+
+EXAMPLE_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example', 'error_log')
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    # The example log is smaller than one default shard
+    monkeypatch.setattr(parser, 'PARALLEL_MIN_SHARD_SIZE', 64 * 1024)
+
+
+def test_parallel_parse_equals_sequential(small_shards):
+    sequential_errors = parser.parse_log_file(EXAMPLE_LOG_PATH)
+    parallel_errors = parser.parse_log_file_parallel(EXAMPLE_LOG_PATH, workers=4)
+
+    assert sequential_errors
+    assert list(parallel_errors) == list(sequential_errors)
+    assert parallel_errors == sequential_errors
+
+
+def test_parallel_streaming_parse_equals_streaming(small_shards):
+    streaming_errors = parser.parse_log_file_streaming(EXAMPLE_LOG_PATH, timestamps_sample_size=5)
+    parallel_errors = parser.parse_log_file_parallel(EXAMPLE_LOG_PATH, workers=4, is_streaming=True, timestamps_sample_size=5)
+
+    assert streaming_errors
+    assert list(parallel_errors) == list(streaming_errors)
+    assert parallel_errors == streaming_errors
+
+
+def test_invalid_utf8_is_parsed_the_same_way(tmp_path, small_shards):
+    with open(EXAMPLE_LOG_PATH, 'rb') as f:
+        data = f.read()
+    log_path = tmp_path / 'error_log'
+    log_path.write_bytes(data.replace(b'PHP Warning:  ', b'PHP Warning:  \xff', 3))
+
+    sequential_errors = parser.parse_log_file(str(log_path))
+    assert sequential_errors
+    assert parser.parse_log_file_parallel(str(log_path), workers=4) == sequential_errors
+
+
+def write_log(log_path, timestamps: list):
+    log_path.write_text(''.join(f"[{timestamp}] PHP Warning:  Undefined variable $x in /var/www/shop/a.php on line 3\n" for timestamp in timestamps))
+    return str(log_path)
+
+
+def test_merge_of_files_compares_named_zone_timestamps(tmp_path):
+    # The second file is older, Europe/Kiev is UTC+3 in summer
+    first_log = write_log(tmp_path / 'error_log', ['28-Aug-2025 13:00:00 Europe/Kiev', '28-Aug-2025 13:30:00 Europe/Kiev'])
+    second_log = write_log(tmp_path / 'error_log.1', ['28-Aug-2025 09:00:00 UTC', '28-Aug-2025 10:45:00 UTC'])
+
+    for timestamps_sample_size in (0, 3):
+        error_group, = parser.parse_log_files([first_log, second_log], workers=1, timestamps_sample_size=timestamps_sample_size).values()
+        assert error_group['count'] == 4
+        assert error_group['first_timestamp'] == '28-Aug-2025 09:00:00 UTC'
+        assert error_group['last_timestamp'] == '28-Aug-2025 10:45:00 UTC'
+
+    assert error_group['timestamps'] == ['28-Aug-2025 13:00:00 Europe/Kiev', '28-Aug-2025 13:30:00 Europe/Kiev', '28-Aug-2025 10:45:00 UTC']
+
+
+@pytest.mark.parametrize('line_break', [b'\r', b'\r\n'])
+def test_line_breaks_are_parsed_like_text_mode(tmp_path, small_shards, line_break):
+    with open(EXAMPLE_LOG_PATH, 'rb') as f:
+        data = f.read()
+    log_path = tmp_path / 'error_log'
+    log_path.write_bytes(data.replace(b'\n', line_break))
+
+    sequential_errors = parser.parse_log_file(str(log_path))
+    assert sequential_errors == parser.parse_log_file(EXAMPLE_LOG_PATH)
+    # Small blocks split \r\n between blocks
+    assert parser.parse_log_file_streaming(str(log_path), chunk_size=4097) == parser.parse_log_file_streaming(EXAMPLE_LOG_PATH)
+    assert parser.parse_log_file_parallel(str(log_path), workers=4) == sequential_errors
@@ -0,0 +1,109 @@
+import pytest
+from nes.prompt_compactor import MIN_MESSAGE_LENGTH, PromptCompactor
+
+ROOT = '/home/customer/www/store.example.com/public_html'
+
+FRAMES = [
+    f"{ROOT}/system/library/db/mysqli.php(40): DB\\MySQLi->query('SELECT * FROM...')",
+    f"{ROOT}/system/library/db.php(45): DB\\MySQLi->query('SELECT * FROM...')",
+    f"{ROOT}/catalog/model/catalog/product.php(120): DB->query('SELECT * FROM...')",
+    f"{ROOT}/system/engine/loader.php(248): ModelCatalogProduct->getProduct(42)",
+    f"{ROOT}/system/engine/proxy.php(47): Loader->{{closure}}(Array, Array)",
+    f"{ROOT}/catalog/controller/product/product.php(210): Proxy->__call('getProduct', Array)",
+    f"{ROOT}/system/engine/action.php(79): ControllerProductProduct->index()",
+    f"{ROOT}/system/engine/action.php(79): Action->execute(Object(Registry))",
+    f"{ROOT}/system/engine/action.php(79): Action->execute(Object(Registry))",
+    f"{ROOT}/system/engine/action.php(79): Action->execute(Object(Registry))",
+    f"{ROOT}/catalog/controller/startup/router.php(25): Action->execute(Object(Registry))",
+    f"{ROOT}/index.php(19): start('catalog')",
+    "{main}",
+]
+
+
+class CharTokenCounter(object):
+    # One token per character keeps the budgets of the tests exact
+    def count(self, text: str) -> int:
+        return len(text)
+
+
+def render(error_data: dict) -> str:
+    return f"Message: {error_data['message']}\n{error_data['stack_trace']}"
+
+
+def make_error(message: str = f"Uncaught Exception: Error: Table 'oc_product' doesn't exist in {ROOT}/system/library/db/mysqli.php:40") -> dict:
+    stack_trace = 'Stack trace:\n' + '\n'.join(f"#{frame_idx} {frame}" for frame_idx, frame in enumerate(FRAMES))
+    return {'message': message, 'stack_trace': stack_trace + f"\n  thrown in {ROOT}/system/library/db/mysqli.php on line 40"}
+
+
+def compact(item_token_budget: int, error_data: dict = None) -> tuple:
+    compactor = PromptCompactor(CharTokenCounter(), item_token_budget=item_token_budget)
+    return compactor.compact_error(error_data or make_error(), render)
+
+
+def get_frame_numbers(text: str) -> list:
+    return [int(line.split(' ', 1)[0][1:]) for line in text.split('\n') if line.startswith('#')]
+
+
+def test_lossless_compaction_keeps_every_frame():
+    error_data = make_error()
+    text, original_tokens, tokens = compact(0, error_data)
+
+    assert original_tokens == len(render(error_data))
+    assert tokens == len(text) < original_tokens
+    assert f"Stack trace (paths relative to {ROOT}/):" in text
+    assert ROOT + '/' not in text.split('\n', 2)[2]
+    assert '{main}' not in text
+    # Frames 8 and 9 repeat frame 7
+    assert get_frame_numbers(text) == [0, 1, 2, 3, 4, 5, 6, 7, 10, 11]
+    assert '... 1 frames above repeated 2 more times' in text
+    assert 'thrown in system/library/db/mysqli.php on line 40' in text
+    assert 'omitted frames' not in text
+
+
+def test_budget_levels_keep_fewer_frames():
+    lossless_text = compact(0)[0]
+
+    # Top 3 frames and the first 5 frames of the store code, vendor frames are under system/
+    text, _, tokens = compact(len(lossless_text) - 1)
+    assert tokens <= len(lossless_text) - 1
+    assert get_frame_numbers(text) == [0, 1, 2, 5, 10, 11]
+    assert '... omitted frames: 2' in text
+    assert '... 1 frames above repeated' not in text
+
+    # Top frame and the first frame of the store code
+    text, _, tokens = compact(tokens - 1)
+    assert get_frame_numbers(text) == [0, 2]
+    assert text.count('... omitted frames:') == 2
+
+    # No frames, the message is kept whole
+    text, _, tokens = compact(tokens - 1)
+    assert get_frame_numbers(text) == []
+    assert make_error()['message'].replace(ROOT + '/', '') in text
+    assert text.endswith('thrown in system/library/db/mysqli.php on line 40')
+
+
+def test_long_message_is_cut_last():
+    message = 'Uncaught Exception: ' + 'x' * 2000
+    text, original_tokens, tokens = compact(400, make_error(message))
+
+    assert get_frame_numbers(text) == []
+    assert tokens <= 400
+    cut_message = text.split('\n', 1)[0][len('Message: '):]
+    assert cut_message.endswith('…')
+    assert MIN_MESSAGE_LENGTH < len(cut_message) < len(message)
+
+    # Messages are not cut shorter than MIN_MESSAGE_LENGTH even when the budget is exceeded
+    text, _, tokens = compact(50, make_error(message))
+    assert len(text.split('\n', 1)[0][len('Message: '):]) == MIN_MESSAGE_LENGTH + 1
+    assert tokens > 50
+
+
+@pytest.mark.parametrize('error_data', [
+    {'message': 'Undefined variable: x in /var/www/header.php on line 5', 'stack_trace': None},
+    {'message': 'Short', 'stack_trace': 'Stack trace:\n#0 /a/b.php(1): c()\n#1 {main}'},
+])
+@pytest.mark.parametrize('item_token_budget', [0, 10, 1000])
+def test_compacted_error_is_never_longer(error_data, item_token_budget):
+    text, original_tokens, tokens = compact(item_token_budget, error_data)
+    assert tokens <= original_tokens == len(render(error_data))
+    assert tokens == len(text)
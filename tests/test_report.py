@@ -0,0 +1,27 @@
+import logging
+from nes.report import TimeBucketer
+
+
+def test_histogram_of_named_zone_timestamps():
+    bucketer = TimeBucketer('minute')
+    group = {}
+    for timestamp in ['28-Aug-2025 13:45:06 Europe/Kiev', '28-Aug-2025 13:45:59 Europe/Kiev', '28-Aug-2025 10:46:00 UTC']:
+        bucketer.add(group, timestamp)
+
+    assert group['histogram'] == {'2025-08-28 10:45': 2, '2025-08-28 10:46': 1}
+    assert bucketer.unparsed_count == 0
+
+
+def test_unparsed_timestamps_are_counted_and_logged(caplog):
+    bucketer = TimeBucketer('hour')
+    group = {}
+    for timestamp in ['28-Aug-2025 13:45:06 UTC', 'yesterday', 'yesterday']:
+        bucketer.add(group, timestamp)
+
+    assert group['histogram'] == {'2025-08-28 13:00': 1}
+    assert bucketer.unparsed_count == 2
+
+    with caplog.at_level(logging.WARNING):
+        bucketer.log_unparsed('error_log')
+    assert '2 entries are not counted' in caplog.text
+    assert 'yesterday' in caplog.text
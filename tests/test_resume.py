@@ -0,0 +1,74 @@
+import os
+import types
+import pytest
+from langchain_core.messages import AIMessage
+from nes.log_ai_processor import LogAiProcessor
+from nes.output_sink import create_output_sink, iter_outputs
+from nes.run_journal import RunJournal, JOURNAL_FILE_NAME
+
+ERROR_KEYS = [f"error{idx}" for idx in range(5)]
+
+
+class FakeLlm(object):
+    """
+    Answers every prompt, the calls with numbers in failed_calls (starting from 1) fail.
+    """
+
+    def __init__(self, failed_calls: set = frozenset()):
+        self.failed_calls = failed_calls
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if len(self.prompts) in self.failed_calls:
+            raise ValueError(f"call {len(self.prompts)} failed")
+        return AIMessage(content=f"analysis of {prompt}", id=f"run-{len(self.prompts)}")
+
+
+def run_jobs(outputs_dir: str, output_sink: str, llm: FakeLlm, failed_retries: int = 0):
+    journal = RunJournal(os.path.join(outputs_dir, JOURNAL_FILE_NAME))
+    processor = LogAiProcessor(llm=llm, parsed_data={}, args=types.SimpleNamespace(language='en'), outputs_dir=outputs_dir,
+                               json_file_name=os.path.join(outputs_dir, 'run.json'), max_retries=0, retry_backoff_seconds=0,
+                               model_name='fake', output_sink=create_output_sink(output_sink, outputs_dir), journal=journal,
+                               failed_retries=failed_retries)
+    try:
+        processor.run_llm_jobs([(error_key, error_key, None) for error_key in ERROR_KEYS])
+    finally:
+        processor.output_sink.close()
+        journal.close()
+    return journal
+
+
+def get_saved_keys(outputs_dir: str, output_sink: str) -> set:
+    if output_sink == 'files':
+        return {file_name[:-len('.json')] for file_name in os.listdir(outputs_dir) if file_name.startswith('error') and file_name.endswith('.json')}
+    return {output_key for output_key, _ in iter_outputs(os.path.join(outputs_dir, 'outputs.jsonl'))}
+
+
+@pytest.mark.parametrize('output_sink', ['files', 'jsonl'])
+def test_resume_after_partial_run(tmp_path, output_sink):
+    outputs_dir = str(tmp_path)
+
+    with pytest.raises(ValueError):
+        run_jobs(outputs_dir, output_sink, FakeLlm(failed_calls={3}))
+
+    journal = RunJournal(os.path.join(outputs_dir, JOURNAL_FILE_NAME))
+    journal.close()
+    assert [journal.get_state(error_key) for error_key in ERROR_KEYS] == ['done', 'done', 'failed', 'pending', 'pending']
+    assert get_saved_keys(outputs_dir, output_sink) == {'error0', 'error1'}
+
+    # Resumed run sends only the errors without saved analyses
+    llm = FakeLlm()
+    journal = run_jobs(outputs_dir, output_sink, llm)
+    assert llm.prompts == ['error2', 'error3', 'error4']
+    assert journal.get_unfinished_count() == 0
+    assert get_saved_keys(outputs_dir, output_sink) == set(ERROR_KEYS)
+
+
+def test_failed_errors_are_retried_in_the_same_run(tmp_path):
+    outputs_dir = str(tmp_path)
+    llm = FakeLlm(failed_calls={2})
+
+    journal = run_jobs(outputs_dir, 'files', llm, failed_retries=1)
+    assert llm.prompts == ['error0', 'error1', 'error1', 'error2', 'error3', 'error4']
+    assert journal.get_unfinished_count() == 0
@@ -0,0 +1,23 @@
+from nes.scheduler import ErrorScheduler, parse_timestamp
+
+
+def test_parse_timestamp_with_named_zone():
+    # Europe/Kiev is UTC+3 in summer
+    assert parse_timestamp('[28-Aug-2025 13:45:06 Europe/Kiev]') == parse_timestamp('[28-Aug-2025 10:45:06 UTC]')
+    assert parse_timestamp('28-Aug-2025 13:45:06 America/New_York') == parse_timestamp('28-Aug-2025 17:45:06 UTC')
+    assert parse_timestamp('28-Aug-2025 13:45:06') == parse_timestamp('28-Aug-2025 13:45:06 UTC')
+
+
+def test_parse_timestamp_with_unknown_zone():
+    assert parse_timestamp('28-Aug-2025 13:45:06 Nowhere/City') is None
+    assert parse_timestamp('not a timestamp') is None
+
+
+def test_recency_with_named_zone_timestamps():
+    error_groups = {
+        'old': {'type': 'PHP Warning', 'count': 1, 'timestamps': ['28-Aug-2025 10:00:00 Europe/Kiev']},
+        'new': {'type': 'PHP Warning', 'count': 1, 'timestamps': ['28-Aug-2025 13:45:06 Europe/Kiev']},
+    }
+
+    scores = ErrorScheduler({'severity': 0, 'count': 0, 'recency': 1, 'novelty': 0}).get_scores(error_groups)
+    assert scores == {'old': 0.0, 'new': 1.0}